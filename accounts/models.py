@@ -1,8 +1,10 @@
 from django.conf import settings
 from django.db import models
-from common.models import TimeStampedModel
+from common.models import TimeStampedModel, DerivedFieldsModel
+
+class Customer(DerivedFieldsModel):
+    DERIVED_FIELDS = ('balance',)
 
-class Customer(TimeStampedModel):
     STATUS_REGISTERED = "registered"
     STATUS_VIP = "vip"
     STATUS_CHOICES = [
@@ -16,6 +18,7 @@ class Customer(TimeStampedModel):
     total_spent = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     orders_count = models.PositiveIntegerField(default=0)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_REGISTERED)
+    # Only changed by payments.ledger.post(), together with its Transactions entry
     balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
     def can_place_order(self):
@@ -25,7 +28,7 @@ class Customer(TimeStampedModel):
         # BRR-2.1: spend > $100 OR 3 orders without outstanding complaints
         if (self.total_spent > 100) or (self.orders_count >= 3 and self.warnings == 0):
             self.status = self.STATUS_VIP
-            self.save()
+            self.save(update_fields=['status', 'updated_at'])
 
     def consider_vip_demotion(self):
         # BRR-2.5: VIP demoted at 2 warnings (warnings cleared)
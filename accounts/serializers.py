@@ -41,6 +41,7 @@ class CustomerSerializer(serializers.ModelSerializer):
         model = Customer
         fields = ['id','user','address','is_blacklisted','warnings','total_spent','orders_count',
                   'status','balance','status', 'status_display', 'average_order_value']
+        read_only_fields = ['balance']
 
 class ManagerSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
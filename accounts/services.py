@@ -1,11 +1,146 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db.models import F, Q
+
 from .models import Customer
 
-def update_customer_after_completed_order(customer: Customer, order_total: float):
+def update_customer_after_completed_order(customer: Customer, order_total):
     """
     Call this from orders app when an order is COMPLETED.
     It updates total_spent, order_count and checks VIP promotion
     """
-    customer.total_spent += order_total
-    customer.orders_count += 1
-    customer.save()
-    customer.consider_vip_promotion()
\ No newline at end of file
+    # F() so a concurrent balance or warning update on the same row is not overwritten
+    Customer.objects.filter(pk=customer.pk).update(
+        total_spent=F('total_spent') + order_total,
+        orders_count=F('orders_count') + 1,
+    )
+    customer.refresh_from_db()
+    customer.consider_vip_promotion()
+
+
+class CustomerResolver:
+    """
+    Maps the customer identifiers clients send (username, or pk as a
+    fallback) to Customer pks. Only the identity mapping is cached, never
+    the row itself: balance, status and counters change through F()
+    updates that fire no signals. Entries are dropped on Customer/User
+    save and delete (accounts/signals.py), together with any entry keyed
+    by the user's username, since a new username that spells an existing
+    pk must win over it. Other processes keep theirs until evicted, which
+    only matters if a username is renamed or reused.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or getattr(settings, 'CUSTOMER_RESOLVER_CACHE_SIZE', 4096)
+        self._entries = OrderedDict()  # identifier -> (customer pk, user pk)
+        self._lock = threading.Lock()
+
+    def _lookup(self, identifier):
+        lookup = Q(user__username=identifier)
+        if identifier.isdigit():
+            lookup |= Q(pk=int(identifier))
+        matches = list(Customer.objects.filter(lookup).select_related('user')[:2])
+        # Usernames win over pks, as they always have
+        for customer in matches:
+            if customer.user.username == identifier:
+                return customer
+        return matches[0] if matches else None
+
+    def _remember(self, identifier, customer):
+        with self._lock:
+            self._entries[identifier] = (customer.pk, customer.user_id)
+            self._entries.move_to_end(identifier)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def resolve_pk(self, identifier) -> Optional[int]:
+        """Customer pk for a username or pk; no query when cached."""
+        if identifier in (None, ''):
+            return None
+        identifier = str(identifier)
+        with self._lock:
+            entry = self._entries.get(identifier)
+            if entry is not None:
+                self._entries.move_to_end(identifier)
+                return entry[0]
+        customer = self._lookup(identifier)
+        if customer is None:
+            return None
+        self._remember(identifier, customer)
+        return customer.pk
+
+    def resolve_many(self, identifiers) -> Dict[str, int]:
+        """resolve_pk() for a batch: identifier -> customer pk, unknown ones left out. One query for all misses."""
+        found, missing = {}, set()
+        with self._lock:
+            for identifier in {str(i) for i in identifiers if i not in (None, '')}:
+                entry = self._entries.get(identifier)
+                if entry is None:
+                    missing.add(identifier)
+                else:
+                    self._entries.move_to_end(identifier)
+                    found[identifier] = entry[0]
+        if not missing:
+            return found
+
+        digits = [int(i) for i in missing if i.isdigit()]
+        by_username, by_pk = {}, {}
+        for customer in Customer.objects.filter(Q(user__username__in=missing) | Q(pk__in=digits)).select_related('user'):
+            by_username[customer.user.username] = customer
+            by_pk[str(customer.pk)] = customer
+        for identifier in missing:
+            # Usernames win over pks, as in resolve_pk()
+            customer = by_username.get(identifier) or by_pk.get(identifier)
+            if customer is not None:
+                self._remember(identifier, customer)
+                found[identifier] = customer.pk
+        return found
+
+    def resolve(self, identifier) -> Optional[Customer]:
+        """The Customer row for a username or pk, fetched fresh in one query."""
+        if identifier in (None, ''):
+            return None
+        identifier = str(identifier)
+        with self._lock:
+            entry = self._entries.get(identifier)
+        if entry is not None:
+            customer = Customer.objects.filter(pk=entry[0]).first()
+            if customer is not None:
+                return customer
+            self.forget(customer_pk=entry[0])
+        customer = self._lookup(identifier)
+        if customer is not None:
+            self._remember(identifier, customer)
+        return customer
+
+    def forget(self, customer_pk=None, user_pk=None, identifier=None) -> None:
+        """Drops entries pointing at customer_pk or user_pk, and the one keyed by identifier (a username that may now shadow a pk)."""
+        with self._lock:
+            stale = [key for key, (c_pk, u_pk) in self._entries.items()
+                     if (customer_pk is not None and c_pk == customer_pk) or (user_pk is not None and u_pk == user_pk)]
+            if identifier is not None:
+                stale.append(str(identifier))
+            for key in stale:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+customer_resolver = CustomerResolver()
+
+
+def resolve_customer(identifier) -> Optional[Customer]:
+    return customer_resolver.resolve(identifier)
+
+
+def resolve_customer_pk(identifier) -> Optional[int]:
+    return customer_resolver.resolve_pk(identifier)
+
+
+def resolve_customer_pks(identifiers) -> Dict[str, int]:
+    return customer_resolver.resolve_many(identifiers)
@@ -0,0 +1,23 @@
+"""
+Keeps accounts.services.customer_resolver in step with Customer/User writes.
+"""
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Customer
+from .services import customer_resolver
+
+
+@receiver([post_save, post_delete], sender=Customer)
+def customer_changed(sender, instance, **kwargs):
+    # The user row is usually already loaded here; don't query for it just to evict
+    username = instance.user.username if Customer.user.is_cached(instance) else None
+    customer_resolver.forget(customer_pk=instance.pk, user_pk=instance.user_id, identifier=username)
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    # A username like "5" may have been cached as customer pk 5; usernames win
+    customer_resolver.forget(user_pk=instance.pk, identifier=instance.get_username())
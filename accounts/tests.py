@@ -1,3 +1,101 @@
+from decimal import Decimal
+
 from django.test import TestCase
 
-# Create your tests here.
+from common.models import DerivedFieldWriteError, User
+from payments import ledger
+from payments.models import Transactions
+from .models import Customer
+from .services import customer_resolver
+
+
+class CustomerResolverTests(TestCase):
+    def setUp(self):
+        customer_resolver.clear()
+        self.alice = Customer.objects.create(user=User.objects.create(username='alice'))
+
+    def test_resolves_username_and_pk_then_serves_from_cache(self):
+        self.assertEqual(customer_resolver.resolve_pk('alice'), self.alice.pk)
+        self.assertEqual(customer_resolver.resolve_pk(self.alice.pk), self.alice.pk)
+        self.assertIsNone(customer_resolver.resolve_pk('nobody'))
+        with self.assertNumQueries(0):
+            self.assertEqual(customer_resolver.resolve_pk('alice'), self.alice.pk)
+            self.assertEqual(customer_resolver.resolve_many(['alice', str(self.alice.pk)]),
+                             {'alice': self.alice.pk, str(self.alice.pk): self.alice.pk})
+
+    def test_new_username_spelling_a_cached_pk_wins(self):
+        pk = str(self.alice.pk)
+        self.assertEqual(customer_resolver.resolve_pk(pk), self.alice.pk)
+
+        shadow = Customer.objects.create(user=User.objects.create(username=pk))
+
+        self.assertEqual(customer_resolver.resolve_pk(pk), shadow.pk)
+        self.assertEqual(customer_resolver.resolve(pk), shadow)
+        self.assertEqual(customer_resolver.resolve_many([pk]), {pk: shadow.pk})
+
+    def test_username_cached_between_user_and_customer_creation_is_dropped(self):
+        pk = str(self.alice.pk)
+        user = User.objects.create(username=pk)
+        self.assertEqual(customer_resolver.resolve_pk(pk), self.alice.pk)
+
+        shadow = Customer.objects.create(user=user)
+
+        self.assertEqual(customer_resolver.resolve_pk(pk), shadow.pk)
+
+    def test_rename_and_delete_evict(self):
+        self.assertEqual(customer_resolver.resolve_pk('alice'), self.alice.pk)
+        self.alice.user.username = 'alicia'
+        self.alice.user.save()
+        self.assertIsNone(customer_resolver.resolve_pk('alice'))
+        self.assertEqual(customer_resolver.resolve_pk('alicia'), self.alice.pk)
+
+        self.alice.delete()
+        self.assertIsNone(customer_resolver.resolve_pk('alicia'))
+        self.assertIsNone(customer_resolver.resolve('alicia'))
+
+
+class DerivedFieldsTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(user=User.objects.create(username='bob'))
+
+    def test_stale_instance_keeps_ledger_balance(self):
+        stale = Customer.objects.get(pk=self.customer.pk)
+        ledger.post(self.customer.pk, Transactions.TYPE_DEPOSIT, Decimal('20.00'))
+
+        stale.warnings = 1
+        stale.save()
+
+        self.customer.refresh_from_db()
+        self.assertEqual((self.customer.balance, self.customer.warnings), (Decimal('20.00'), 1))
+
+    def test_assigning_a_derived_field_raises_instead_of_dropping(self):
+        customer = Customer.objects.get(pk=self.customer.pk)
+        customer.balance = Decimal('99.00')
+
+        with self.assertRaises(DerivedFieldWriteError):
+            customer.save()
+        self.assertEqual(Customer.objects.get(pk=customer.pk).balance, Decimal('0'))
+
+        customer.save(update_fields=['balance'])
+        self.assertEqual(Customer.objects.get(pk=customer.pk).balance, Decimal('99.00'))
+        customer.save()
+
+    def test_refresh_resyncs_derived_fields(self):
+        ledger.post(self.customer.pk, Transactions.TYPE_DEPOSIT, Decimal('5.00'))
+        self.customer.refresh_from_db(fields=['warnings'])
+        self.customer.balance = Decimal('1.00')
+        with self.assertRaises(DerivedFieldWriteError):
+            self.customer.save()
+
+        self.customer.refresh_from_db()
+        self.customer.save()
+        self.assertEqual(self.customer.balance, Decimal('5.00'))
+
+    def test_save_of_a_row_deleted_elsewhere_inserts_it_again(self):
+        customer = Customer.objects.get(pk=self.customer.pk)
+        Customer.objects.filter(pk=customer.pk).delete()
+
+        customer.warnings = 2
+        customer.save()
+
+        self.assertEqual(Customer.objects.get(pk=customer.pk).warnings, 2)
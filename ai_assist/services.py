@@ -3,6 +3,7 @@ from django.db import transaction
 from django.db.models import Q
 from .models import KBEntry, AIAnswer, AIRating, KBFlag
 from accounts.models import Customer
+from accounts.services import resolve_customer_pk
 
 class AIService:
     @staticmethod
@@ -98,9 +99,8 @@ class AIService:
                 return False, "Stars must be between 0 and 5"
             
 
-            try:
-                customer = Customer.objects.get(user__username=str(customer_id))
-            except (Customer.DoesNotExist, ValueError):
+            customer_pk = resolve_customer_pk(customer_id)
+            if customer_pk is None:
                 return False, f"Customer '{customer_id}' not found."
 
             try:
@@ -108,20 +108,20 @@ class AIService:
             except AIAnswer.DoesNotExist:
                 return False, "AI Answer record not found."
 
-            existing_rating = AIRating.objects.filter(customer_id=customer, ai_answer_id=ai_answer).first()
+            existing_rating = AIRating.objects.filter(customer_id_id=customer_pk, ai_answer_id=ai_answer).first()
             if existing_rating:
                 existing_rating.stars = stars
                 existing_rating.save()
             else:
                 AIRating.objects.create(
-                    customer_id=customer,
+                    customer_id_id=customer_pk,
                     ai_answer_id=ai_answer,
                     stars=stars
                 )
 
             if stars == 0 and ai_answer.source == "kb" and ai_answer.kb_id:
                 KBFlag.objects.get_or_create(
-                    customer_id=customer,
+                    customer_id_id=customer_pk,
                     report_id=ai_answer.kb_id, 
                     defaults={'reason': "Rated 0 stars by user"}
                 )
@@ -1,3 +1,5 @@
+import copy
+
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 from django.db import models
@@ -9,6 +11,67 @@ class TimeStampedModel(models.Model):
     class Meta:
         abstract = True
 
+class DerivedFieldWriteError(ValueError):
+    """Raised by DerivedFieldsModel.save() when a derived field was assigned on the instance."""
+
+
+class DerivedFieldsModel(TimeStampedModel):
+    """
+    Columns listed in DERIVED_FIELDS are maintained elsewhere through queryset
+    updates (menu.signals, menu.images, the payments ledger). A plain save()
+    of an instance loaded earlier must not write its stale copy of them back,
+    so they are left out of it; assigning one and then calling save() raises
+    DerivedFieldWriteError rather than dropping the write. Code that owns the
+    column names it explicitly in save(update_fields=...).
+    """
+    DERIVED_FIELDS = ()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_derived()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._remember_derived(None if fields is None else [f for f in self.DERIVED_FIELDS if f in fields])
+
+    def _remember_derived(self, names=None):
+        """Records the values of derived fields as they now are in the database."""
+        loaded = self.__dict__.setdefault('_derived_loaded', {})
+        for name in self.DERIVED_FIELDS if names is None else names:
+            attname = self._meta.get_field(name).attname
+            if attname in self.__dict__:
+                loaded[name] = copy.deepcopy(self.__dict__[attname])
+
+    def dirty_derived_fields(self):
+        """Derived fields assigned on this instance since it was loaded or saved."""
+        loaded = self.__dict__.get('_derived_loaded', {})
+        return [name for name, value in loaded.items()
+                if getattr(self, self._meta.get_field(name).attname) != value]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            dirty = self.dirty_derived_fields()
+            if dirty:
+                raise DerivedFieldWriteError(
+                    f"{type(self).__name__}.{', '.join(dirty)} is maintained outside save(); "
+                    f"write it through its owner or name it in update_fields."
+                )
+        super().save(*args, **kwargs)
+        written = kwargs.get('update_fields')
+        self._remember_derived(None if written is None else [f for f in self.DERIVED_FIELDS if f in written])
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        # A plain save() leaves the derived columns out of its UPDATE. If the row
+        # is gone, Django's INSERT fallback still writes every column, as before.
+        if update_fields is None:
+            values = [value for value in values if value[0].name not in self.DERIVED_FIELDS]
+        return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+
 class User(AbstractUser):
     class Meta:
         verbose_name = _('user')
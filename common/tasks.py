@@ -0,0 +1,49 @@
+"""
+In-process background jobs.
+
+Work that should not hold up a request (image processing, projections,
+sweeps) is handed to a small thread pool once the surrounding transaction
+commits, so jobs never see uncommitted or rolled-back rows. Set
+BACKGROUND_TASKS_EAGER = True to run jobs inline (tests, management shells).
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'BACKGROUND_WORKERS', 4),
+                thread_name_prefix='restaurant-bg'
+            )
+        return _executor
+
+
+def _run(fn, args, kwargs):
+    try:
+        fn(*args, **kwargs)
+    except Exception:
+        logger.exception("Background job %s failed", getattr(fn, '__qualname__', fn))
+    finally:
+        # Worker threads keep their own DB connection; don't leak it between jobs
+        close_old_connections()
+
+
+def run_in_background(fn, *args, **kwargs) -> None:
+    """Schedules fn(*args, **kwargs) on the worker pool after the current transaction commits."""
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        transaction.on_commit(lambda: fn(*args, **kwargs))
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run, fn, args, kwargs))
@@ -4,16 +4,30 @@ Handles all API requests for UC06, UC07, UC19
 """
 import requests
 import streamlit as st
+from collections import OrderedDict
 from typing import Tuple, Optional, Dict, Any
 
 # Configuration
 API_BASE_URL = st.secrets.get("API_BASE_URL", "http://localhost:8000/api")
+VALIDATOR_CACHE_SIZE = 32
 
 class APIClient:
     """API Client for Django Backend Communication"""
+
+    # (url, params) -> (etag, body). Shared across reruns so If-None-Match
+    # lets the backend answer unchanged menu reads with a bodiless 304.
+    _validators: "OrderedDict[Tuple, Tuple[str, Any]]" = OrderedDict()
+
     def __init__(self):
         self.base_url = API_BASE_URL
 
+    @classmethod
+    def _remember(cls, key: Tuple, etag: str, body: Any):
+        cls._validators[key] = (etag, body)
+        cls._validators.move_to_end(key)
+        while len(cls._validators) > VALIDATOR_CACHE_SIZE:
+            cls._validators.popitem(last=False)
+
     def _request(
         self,
         method: str,
@@ -23,9 +37,15 @@ class APIClient:
     ) -> Tuple[bool, Any]:
         """Make API request"""
         url = f"{self.base_url}/{endpoint}"
+        cache_key = (url, tuple(sorted((params or {}).items())))
         try:
             if method == 'GET':
-                response = requests.get(url, params=params, timeout=10)
+                cached = self._validators.get(cache_key)
+                headers = {'If-None-Match': cached[0]} if cached else None
+                response = requests.get(url, params=params, headers=headers, timeout=10)
+                if response.status_code == 304 and cached:
+                    self._validators.move_to_end(cache_key)
+                    return (True, cached[1])
             elif method == 'POST':
                 response = requests.post(url, json=data, timeout=10)
             elif method == 'PUT':
@@ -39,7 +59,11 @@ class APIClient:
                 return (False, "Invalid method")
 
             if response.status_code in [200, 201]:
-                return (True, response.json())
+                body = response.json()
+                etag = response.headers.get('ETag')
+                if method == 'GET' and etag:
+                    self._remember(cache_key, etag, body)
+                return (True, body)
             elif response.status_code == 204: # For successful DELETE with no content
                 return (True, {})
             else:
@@ -90,18 +114,22 @@ class APIClient:
 
     def update_cart_item(self, item_id: str, quantity: int, customer_id: str) -> Tuple[bool, Any]:
         """UC07: Update cart item quantity"""
-        # Endpoint: apps.orders.urls -> 'cart/update/' (orders.views.update_cart_item)
-        return self._request('POST', 'orders/cart/update/', data={
-            'item_id': item_id,
-            'quantity': quantity,
-            'customer_id': customer_id
-        })
+        return self.batch_update_cart(customer_id, [
+            {'op': 'update', 'item_id': item_id, 'quantity': quantity}
+        ])
 
     def remove_cart_item(self, item_id: str, customer_id: str) -> Tuple[bool, Any]:
         """UC07: Remove item from cart"""
-        # Endpoint: apps.orders.urls -> 'cart/remove/<uuid:item_id>/' (orders.views.remove_cart_item)
-        return self._request('DELETE', f'orders/cart/remove/{item_id}/', params={
-             'customer_id': customer_id
+        return self.batch_update_cart(customer_id, [
+            {'op': 'remove', 'item_id': item_id}
+        ])
+
+    def batch_update_cart(self, customer_id: str, operations: list) -> Tuple[bool, Any]:
+        """UC07: Apply several add/update/remove operations in one round trip; returns the cart"""
+        # Endpoint: apps.orders.urls -> 'cart/batch/' (orders.views.cart_batch)
+        return self._request('POST', 'orders/cart/batch/', data={
+            'customer_id': customer_id,
+            'operations': operations
         })
 
     def checkout(self, customer_id: str) -> Tuple[bool, Any]:
@@ -111,6 +139,17 @@ class APIClient:
             'customer_id': customer_id
         })
 
+    def get_order_history(self, customer_id: str, cursor: Optional[str] = None,
+                          status: Optional[str] = None) -> Tuple[bool, Any]:
+        """UC07: One page of past orders; pass the returned next_cursor to get the next page"""
+        params = {'customer_id': customer_id}
+        if cursor:
+            params['cursor'] = cursor
+        if status:
+            params['status'] = status
+        # Endpoint: apps.orders.urls -> 'history/' (orders.views.history)
+        return self._request('GET', 'orders/history/', params=params)
+
     # ============ Dishes Endpoints (UC19) ============
     def get_chef_dishes(self, chef_id: str) -> Tuple[bool, Any]:
         """UC19: Get all dishes by chef"""
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class KitchenConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'kitchen'
+
+    def ready(self):
+        from . import projections  # noqa: F401
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('menu', '0005_dish_picture_variants'),
+        ('orders', '0004_orderevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KitchenTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('in_progress', 'In progress'), ('ready', 'Ready')], default='queued', max_length=20)),
+                ('priority', models.PositiveSmallIntegerField(default=1)),
+                ('items', models.JSONField(default=list)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('ready_at', models.DateTimeField(blank=True, null=True)),
+                ('wait_seconds', models.FloatField(blank=True, null=True)),
+                ('prep_seconds', models.FloatField(blank=True, null=True)),
+                ('chef_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kitchen_tickets', to='menu.chef')),
+                ('order_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kitchen_tickets', to='orders.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['chef_id', 'status', 'priority', 'created_at'], name='ticket_chef_queue'), models.Index(fields=['status', 'ready_at'], name='ticket_status_ready')],
+                'constraints': [models.UniqueConstraint(fields=('order_id', 'chef_id'), name='unique_ticket_per_order_chef')],
+            },
+        ),
+    ]
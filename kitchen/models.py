@@ -0,0 +1,50 @@
+from django.db import models
+from common.models import TimeStampedModel
+from menu.models import Chef
+from orders.models import Order
+
+
+class KitchenTicket(TimeStampedModel):
+    """
+    The part of a paid order one chef has to cook. Tickets are queued per
+    chef and claimed in priority order: VIP orders first, then oldest first.
+    """
+    STATUS_QUEUED = "queued"
+    STATUS_IN_PROGRESS = "in_progress"
+    STATUS_READY = "ready"
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_IN_PROGRESS, "In progress"),
+        (STATUS_READY, "Ready"),
+    ]
+
+    # Lower is served first
+    PRIORITY_VIP = 0
+    PRIORITY_REGULAR = 1
+
+    order_id = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='kitchen_tickets')
+    chef_id = models.ForeignKey(Chef, on_delete=models.CASCADE, related_name='kitchen_tickets')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    priority = models.PositiveSmallIntegerField(default=PRIORITY_REGULAR)
+    # [{"dish_id": 3, "name": "Soup", "quantity": 2}, ...]
+    items = models.JSONField(default=list)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    ready_at = models.DateTimeField(null=True, blank=True)
+    # Filled when the ticket is marked ready, so metrics are plain aggregates
+    wait_seconds = models.FloatField(null=True, blank=True)
+    prep_seconds = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order_id', 'chef_id'], name='unique_ticket_per_order_chef'),
+        ]
+        indexes = [
+            # claim-next: a chef's queued tickets in (priority, age) order
+            models.Index(fields=['chef_id', 'status', 'priority', 'created_at'], name='ticket_chef_queue'),
+            # throughput: tickets finished in a time window
+            models.Index(fields=['status', 'ready_at'], name='ticket_status_ready'),
+        ]
+
+    def __str__(self):
+        return f"Ticket {self.pk}: order {self.order_id_id} for chef {self.chef_id_id} ({self.status})"
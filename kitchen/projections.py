@@ -0,0 +1,10 @@
+"""Routes paid orders into the kitchen queue (see orders/lifecycle.py)."""
+
+from orders.lifecycle import projection
+from orders.models import Order
+from .services import KitchenService
+
+
+@projection(Order.STATUS_PAID)
+def kitchen_tickets(event):
+    KitchenService.create_tickets(event.order_id)
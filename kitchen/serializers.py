@@ -0,0 +1,14 @@
+from rest_framework import serializers
+from .models import KitchenTicket
+
+
+class KitchenTicketSerializer(serializers.ModelSerializer):
+    chef_name = serializers.CharField(source='chef_id.name', read_only=True)
+
+    class Meta:
+        model = KitchenTicket
+        fields = [
+            'id', 'order_id', 'chef_id', 'chef_name', 'status', 'priority', 'items',
+            'created_at', 'claimed_at', 'ready_at', 'wait_seconds', 'prep_seconds',
+        ]
+        read_only_fields = fields
@@ -0,0 +1,135 @@
+"""
+Kitchen Services - routes paid orders to chefs (UC07/UC19).
+
+A paid order is split into one KitchenTicket per chef who owns one of its
+dishes. Each chef's queue is the (priority, created_at) order over their
+queued tickets, served from the ticket_chef_queue index; claiming uses a
+status-guarded UPDATE so two cooks never take the same ticket.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Tuple
+
+from django.db.models import Avg, Count, Min, Q
+from django.utils import timezone
+
+from accounts.models import Customer
+from orders.models import Order, OrderItem
+from .models import KitchenTicket
+
+
+class KitchenService:
+    THROUGHPUT_WINDOW_MINUTES = 60
+    CLAIM_RETRIES = 5
+
+    @staticmethod
+    def create_tickets(order: Order) -> int:
+        """
+        Splits a paid order into per-chef tickets and returns how many were
+        created. Running it twice creates nothing new (and returns 0).
+        """
+        tickets = KitchenTicket.objects.filter(order_id=order)
+        existing = set(tickets.values_list('chef_id', flat=True))
+        by_chef = defaultdict(list)
+        rows = OrderItem.objects.filter(order_id=order).values_list(
+            'dish_id', 'dish_id__name', 'dish_id__chef_id', 'quantity'
+        ).order_by('pk')
+        for dish_id, name, chef_id, quantity in rows:
+            by_chef[chef_id].append({'dish_id': dish_id, 'name': name, 'quantity': quantity})
+
+        is_vip = order.customer_id.status == Customer.STATUS_VIP
+        priority = KitchenTicket.PRIORITY_VIP if is_vip else KitchenTicket.PRIORITY_REGULAR
+        KitchenTicket.objects.bulk_create([
+            KitchenTicket(order_id=order, chef_id_id=chef_id, priority=priority, items=items)
+            for chef_id, items in by_chef.items() if chef_id not in existing
+        ], ignore_conflicts=True)
+        # bulk_create returns every object it was given, inserted or not
+        return tickets.count() - len(existing)
+
+    @classmethod
+    def claim_next(cls, chef_id) -> Tuple[bool, str, Dict]:
+        """Hands the chef their highest-priority queued ticket and starts its prep clock."""
+        queue = KitchenTicket.objects.filter(chef_id=chef_id, status=KitchenTicket.STATUS_QUEUED)
+        for _ in range(cls.CLAIM_RETRIES):
+            ticket_pk = queue.order_by('priority', 'created_at', 'pk').values_list('pk', flat=True).first()
+            if ticket_pk is None:
+                return (False, "No tickets waiting.", {})
+
+            now = timezone.now()
+            claimed = KitchenTicket.objects.filter(pk=ticket_pk, status=KitchenTicket.STATUS_QUEUED).update(
+                status=KitchenTicket.STATUS_IN_PROGRESS, claimed_at=now, updated_at=now
+            )
+            if claimed:
+                return (True, "Ticket claimed.", {'ticket': KitchenTicket.objects.get(pk=ticket_pk)})
+            # Someone else took it between the select and the update; try the next one
+
+        return (False, "Queue is busy, please try again.", {'retry': True})
+
+    @staticmethod
+    def mark_ready(ticket_id, chef_id) -> Tuple[bool, str, Dict]:
+        """Closes a claimed ticket and records its wait and prep times."""
+        ticket = KitchenTicket.objects.filter(
+            pk=ticket_id, chef_id=chef_id, status=KitchenTicket.STATUS_IN_PROGRESS
+        ).first()
+        if ticket is None:
+            return (False, "Ticket not found or not in progress for this chef.", {})
+
+        ticket.ready_at = timezone.now()
+        ticket.wait_seconds = (ticket.claimed_at - ticket.created_at).total_seconds()
+        ticket.prep_seconds = (ticket.ready_at - ticket.claimed_at).total_seconds()
+        ticket.status = KitchenTicket.STATUS_READY
+        ticket.save(update_fields=['status', 'ready_at', 'wait_seconds', 'prep_seconds', 'updated_at'])
+        return (True, "Ticket ready.", {'ticket': ticket})
+
+    @classmethod
+    def metrics(cls, window_minutes=None) -> Tuple[bool, str, Dict]:
+        """
+        Per-chef queue depth (queued / in progress, oldest waiting ticket) and
+        throughput over the last window (tickets finished, average wait and
+        prep seconds). Two aggregate queries regardless of ticket volume.
+        """
+        try:
+            window_minutes = max(int(window_minutes or cls.THROUGHPUT_WINDOW_MINUTES), 1)
+        except (ValueError, TypeError):
+            return (False, "window must be an integer number of minutes.", {})
+        since = timezone.now() - timedelta(minutes=window_minutes)
+
+        chefs = {}
+
+        def row(chef_id, name):
+            return chefs.setdefault(chef_id, {
+                'chef_id': chef_id, 'chef_name': name, 'queued': 0, 'in_progress': 0,
+                'oldest_queued_at': None, 'completed': 0, 'avg_wait_seconds': None, 'avg_prep_seconds': None,
+            })
+
+        depth = KitchenTicket.objects.filter(
+            status__in=[KitchenTicket.STATUS_QUEUED, KitchenTicket.STATUS_IN_PROGRESS]
+        ).values('chef_id', 'chef_id__name').annotate(
+            queued=Count('pk', filter=Q(status=KitchenTicket.STATUS_QUEUED)),
+            in_progress=Count('pk', filter=Q(status=KitchenTicket.STATUS_IN_PROGRESS)),
+            oldest_queued_at=Min('created_at', filter=Q(status=KitchenTicket.STATUS_QUEUED)),
+        )
+        for entry in depth:
+            row(entry['chef_id'], entry['chef_id__name']).update(
+                queued=entry['queued'], in_progress=entry['in_progress'], oldest_queued_at=entry['oldest_queued_at']
+            )
+
+        throughput = KitchenTicket.objects.filter(
+            status=KitchenTicket.STATUS_READY, ready_at__gte=since
+        ).values('chef_id', 'chef_id__name').annotate(
+            completed=Count('pk'), avg_wait_seconds=Avg('wait_seconds'), avg_prep_seconds=Avg('prep_seconds'),
+        )
+        for entry in throughput:
+            row(entry['chef_id'], entry['chef_id__name']).update(
+                completed=entry['completed'],
+                avg_wait_seconds=entry['avg_wait_seconds'],
+                avg_prep_seconds=entry['avg_prep_seconds'],
+            )
+
+        ranked = sorted(chefs.values(), key=lambda r: (-r['queued'], -r['in_progress'], r['chef_id']))
+        return (True, "Kitchen metrics", {
+            'window_minutes': window_minutes,
+            'queue_depth': sum(r['queued'] for r in ranked),
+            'chefs': ranked,
+        })
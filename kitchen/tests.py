@@ -0,0 +1,74 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from accounts.models import Customer
+from common.models import User
+from menu.models import Chef, Dish
+from orders.models import Order, OrderItem
+from .models import KitchenTicket
+from .services import KitchenService
+
+
+class KitchenTicketTests(TestCase):
+    def setUp(self):
+        self.anna = Chef.objects.create(user=User.objects.create(username='anna'), name='Anna')
+        self.ben = Chef.objects.create(user=User.objects.create(username='ben'), name='Ben')
+        self.soup = Dish.objects.create(chef=self.anna, name='Soup', price=Decimal('4.00'))
+        self.cake = Dish.objects.create(chef=self.anna, name='Cake', price=Decimal('3.00'))
+        self.stew = Dish.objects.create(chef=self.ben, name='Stew', price=Decimal('6.00'))
+        self.regular = Customer.objects.create(user=User.objects.create(username='alice'))
+        self.vip = Customer.objects.create(user=User.objects.create(username='victor'), status=Customer.STATUS_VIP)
+
+    def order(self, customer, *dishes):
+        order = Order.objects.create(customer_id=customer, status=Order.STATUS_PAID)
+        for dish in dishes:
+            OrderItem.objects.create(order_id=order, dish_id=dish, quantity=2, unit_price=dish.price)
+        return order
+
+    def test_order_is_split_per_chef_once(self):
+        order = self.order(self.regular, self.soup, self.stew, self.cake)
+
+        self.assertEqual(KitchenService.create_tickets(order), 2)
+        self.assertEqual(KitchenService.create_tickets(order), 0)
+
+        tickets = {t.chef_id_id: t.items for t in KitchenTicket.objects.filter(order_id=order)}
+        self.assertEqual(tickets, {
+            self.anna.pk: [{'dish_id': self.soup.pk, 'name': 'Soup', 'quantity': 2},
+                           {'dish_id': self.cake.pk, 'name': 'Cake', 'quantity': 2}],
+            self.ben.pk: [{'dish_id': self.stew.pk, 'name': 'Stew', 'quantity': 2}],
+        })
+
+    def test_claim_next_serves_vip_first_then_oldest(self):
+        first = self.order(self.regular, self.soup)
+        second = self.order(self.regular, self.cake)
+        vip = self.order(self.vip, self.soup)
+        for order in (first, second, vip):
+            KitchenService.create_tickets(order)
+
+        claimed = [KitchenService.claim_next(self.anna.pk)[2]['ticket'].order_id_id for _ in range(3)]
+
+        self.assertEqual(claimed, [vip.pk, first.pk, second.pk])
+        self.assertEqual(KitchenService.claim_next(self.anna.pk), (False, "No tickets waiting.", {}))
+        self.assertEqual(KitchenTicket.objects.filter(status=KitchenTicket.STATUS_IN_PROGRESS).count(), 3)
+
+    def test_mark_ready_records_times(self):
+        KitchenService.create_tickets(self.order(self.regular, self.stew))
+        ticket = KitchenService.claim_next(self.ben.pk)[2]['ticket']
+
+        self.assertFalse(KitchenService.mark_ready(ticket.pk, self.anna.pk)[0])
+        success, _, data = KitchenService.mark_ready(ticket.pk, self.ben.pk)
+
+        self.assertTrue(success)
+        self.assertEqual(data['ticket'].status, KitchenTicket.STATUS_READY)
+        self.assertGreaterEqual(data['ticket'].prep_seconds, 0)
+        self.assertEqual(KitchenService.metrics()[2]['chefs'][0]['completed'], 1)
+
+    def test_malformed_ids_are_bad_requests(self):
+        self.assertEqual(self.client.get('/kitchen/tickets/?chef_id=abc').status_code, 400)
+        self.assertEqual(self.client.post('/kitchen/tickets/claim-next/', {'chef_id': 'abc'},
+                                          content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post('/kitchen/tickets/abc/ready/', {'chef_id': self.anna.pk},
+                                          content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post('/kitchen/tickets/claim-next/', {'chef_id': self.anna.pk},
+                                          content_type='application/json').status_code, 404)
@@ -0,0 +1,68 @@
+from rest_framework import viewsets, status, permissions, decorators
+from rest_framework.exceptions import ParseError
+from rest_framework.response import Response
+from .models import KitchenTicket
+from .serializers import KitchenTicketSerializer
+from .services import KitchenService
+
+
+class KitchenTicketViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Kitchen queue: per-chef tickets for paid orders.
+    """
+    queryset = KitchenTicket.objects.select_related('chef_id').order_by('priority', 'created_at', 'pk')
+    serializer_class = KitchenTicketSerializer
+    permission_classes = [permissions.AllowAny]
+
+    @staticmethod
+    def _parse_id(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def get_queryset(self):
+        """Allow filtering tickets by chef_id and status"""
+        queryset = super().get_queryset()
+        chef_id = self.request.query_params.get('chef_id')
+        ticket_status = self.request.query_params.get('status')
+        if chef_id:
+            if self._parse_id(chef_id) is None:
+                raise ParseError('chef_id must be an integer')
+            queryset = queryset.filter(chef_id=chef_id)
+        if ticket_status:
+            queryset = queryset.filter(status=ticket_status)
+        return queryset
+
+    @decorators.action(detail=False, methods=['post'], url_path='claim-next')
+    def claim_next(self, request):
+        """POST: Take the next ticket from the chef's queue (VIP first, then oldest)."""
+        chef_id = self._parse_id(request.data.get('chef_id'))
+        if chef_id is None:
+            return Response({'error': 'chef_id is required and must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        success, msg, data = KitchenService.claim_next(chef_id)
+        if not success:
+            code = status.HTTP_409_CONFLICT if data.get('retry') else status.HTTP_404_NOT_FOUND
+            return Response({'error': msg}, status=code)
+        return Response(self.get_serializer(data['ticket']).data, status=status.HTTP_200_OK)
+
+    @decorators.action(detail=True, methods=['post'])
+    def ready(self, request, pk=None):
+        """POST: Mark a claimed ticket as ready; records its prep time."""
+        chef_id = self._parse_id(request.data.get('chef_id'))
+        if chef_id is None or self._parse_id(pk) is None:
+            return Response({'error': 'chef_id is required and ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        success, msg, data = KitchenService.mark_ready(pk, chef_id)
+        if not success:
+            return Response({'error': msg}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.get_serializer(data['ticket']).data, status=status.HTTP_200_OK)
+
+    @decorators.action(detail=False, methods=['get'])
+    def metrics(self, request):
+        """GET: Queue depth and throughput per chef, busiest first. ?window=<minutes>"""
+        success, msg, data = KitchenService.metrics(request.query_params.get('window'))
+        if not success:
+            return Response({'error': msg}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data, status=status.HTTP_200_OK)
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class MenuConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'menu' 
+    name = 'menu'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,117 @@
+"""
+Menu snapshot cache (UC06).
+
+Serialized menu responses (one per user type and search term, shared by
+all allergy profiles, see menu.profiles) are stored under keys stamped
+with a global menu version. Any Dish/Chef/Ingredient/Allergen write bumps the version
+(see menu.signals), so older snapshots simply become unreachable and are
+left to expire.
+
+Dish ratings change far more often than the menu itself, so they are kept
+out of the snapshots: they live under their own ratings version and are
+merged into the snapshot when it is served (MenuService.apply_live_ratings).
+A rating therefore changes the ETag but never invalidates a snapshot.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+MENU_VERSION_KEY = 'menu:version'
+RATINGS_VERSION_KEY = 'menu:ratings:version'
+MENU_CACHE_TIMEOUT = getattr(settings, 'MENU_CACHE_TIMEOUT', 300)
+
+
+def _get_version(key) -> int:
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted counter never restarts below an old value
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key, 0)
+    return version
+
+
+def _bump_version(key) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def get_menu_version() -> int:
+    return _get_version(MENU_VERSION_KEY)
+
+
+def bump_menu_version() -> None:
+    _bump_version(MENU_VERSION_KEY)
+
+
+def bump_menu_version_on_commit() -> None:
+    """
+    Bumps once the surrounding transaction commits, so a reader can never
+    cache pre-commit data under the new version.
+    """
+    transaction.on_commit(bump_menu_version)
+
+
+def get_ratings_version() -> int:
+    return _get_version(RATINGS_VERSION_KEY)
+
+
+def bump_ratings_version_on_commit() -> None:
+    transaction.on_commit(lambda: _bump_version(RATINGS_VERSION_KEY))
+
+
+def get_ratings(version: int):
+    return cache.get(f'menu:ratings:{version}')
+
+
+def set_ratings(version: int, ratings) -> None:
+    cache.set(f'menu:ratings:{version}', ratings, MENU_CACHE_TIMEOUT)
+
+
+def get_customer_allergen_mask(customer_id) -> int:
+    """Resolves a customer to their allergen profile (AllergyPreference.allergen_mask)."""
+    from .models import AllergyPreference
+
+    key = f'menu:profile:{customer_id}'
+    mask = cache.get(key)
+    if mask is None:
+        try:
+            mask = AllergyPreference.objects.filter(
+                customer__pk=customer_id
+            ).values_list('allergen_mask', flat=True).first() or 0
+        except (ValueError, TypeError):
+            mask = 0
+        cache.set(key, mask, MENU_CACHE_TIMEOUT)
+    return mask
+
+
+def forget_customer_allergen_mask(customer_id) -> None:
+    cache.delete(f'menu:profile:{customer_id}')
+
+
+def snapshot_key(version: int, user_type: str, search: str) -> str:
+    """
+    Builds the key for one menu view. Take the version *before* building the
+    snapshot so a concurrent write can only orphan the entry, never mislabel it.
+    """
+    search_hash = hashlib.md5(search.lower().encode()).hexdigest()
+    return f'menu:snapshot:{version}:{user_type}:{search_hash}'
+
+
+def menu_etag(version: int, *parts) -> str:
+    """Strong ETag for a menu representation: the menu version plus whatever varies the response."""
+    raw = ':'.join(str(p) for p in (version,) + parts)
+    return '"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+
+def get_snapshot(key: str):
+    return cache.get(key)
+
+
+def set_snapshot(key: str, snapshot) -> None:
+    cache.set(key, snapshot, MENU_CACHE_TIMEOUT)
@@ -0,0 +1,27 @@
+"""
+Deployment checks for the menu caches (manage.py check --deploy).
+"""
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_version_cache(app_configs, **kwargs):
+    """
+    The menu and ratings versions (menu.cache) and the allergy-profile bits
+    (menu.profiles) are counters in the default cache. Every worker has to
+    read the same counters, or a bump in one leaves the others serving and
+    revalidating stale menus.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_CACHES:
+        return [Error(
+            "The default cache is local to each process, so every worker keeps its own menu version.",
+            hint="Point CACHES['default'] at a backend shared by all workers (Redis, Memcached), "
+                 "or add 'menu.E001' to SILENCED_SYSTEM_CHECKS when running a single worker process.",
+            id='menu.E001',
+        )]
+    return []
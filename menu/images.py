@@ -0,0 +1,80 @@
+"""
+Dish picture variants (UC06/UC19).
+
+Chef uploads are stored as-is in Dish.picture. A background job then
+renders resized WebP and JPEG copies under content-hashed names, so they
+can be cached forever, and records their storage names in
+Dish.picture_variants:
+
+    {"thumb": {"webp": "dishes/variants/<hash>-thumb.webp", "jpeg": ...}, ...}
+"""
+
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# name -> max width/height in px
+VARIANT_SIZES = {
+    'thumb': 160,
+    'card': 480,
+    'full': 1200,
+}
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+VARIANT_DIR = 'dishes/variants'
+
+
+def render_variants(data: bytes):
+    """Yields (size_name, format_name, storage_name, bytes) for one source image."""
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source).convert('RGB')
+        for size_name, max_px in VARIANT_SIZES.items():
+            image = source.copy()
+            image.thumbnail((max_px, max_px), Image.LANCZOS)
+            for format_name, (pil_format, options) in VARIANT_FORMATS.items():
+                buffer = io.BytesIO()
+                image.save(buffer, pil_format, **options)
+                yield size_name, format_name, f'{VARIANT_DIR}/{digest}-{size_name}.{format_name}', buffer.getvalue()
+
+
+def process_dish_picture(dish_id) -> None:
+    """Background job: builds the variants for a dish's current picture."""
+    from .models import Dish
+    from . import cache as menu_cache
+
+    dish = Dish.objects.filter(pk=dish_id).only('pk', 'picture').first()
+    if dish is None or not dish.picture:
+        return
+
+    source_name = dish.picture.name
+    with dish.picture.open('rb') as f:
+        data = f.read()
+
+    variants = {}
+    for size_name, format_name, storage_name, content in render_variants(data):
+        # Content-hashed names: an existing file is already the right bytes
+        if not default_storage.exists(storage_name):
+            default_storage.save(storage_name, ContentFile(content))
+        variants.setdefault(size_name, {})[format_name] = storage_name
+
+    # Only attach if the picture was not replaced while we were rendering
+    updated = Dish.objects.filter(pk=dish_id, picture=source_name).update(picture_variants=variants)
+    if updated:
+        menu_cache.bump_menu_version()
+
+
+def variant_urls(dish, request=None):
+    """Maps Dish.picture_variants storage names to (absolute, when possible) URLs."""
+    urls = {}
+    for size_name, formats in (dish.picture_variants or {}).items():
+        urls[size_name] = {}
+        for format_name, storage_name in formats.items():
+            url = default_storage.url(storage_name)
+            urls[size_name][format_name] = request.build_absolute_uri(url) if request else url
+    return urls
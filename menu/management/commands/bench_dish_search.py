@@ -0,0 +1,96 @@
+"""
+Benchmarks FTS5 dish search against the icontains scan it replaces.
+
+    python manage.py bench_dish_search --dishes 10000
+
+Synthetic dishes are created inside a transaction that is rolled back,
+so the database is left untouched.
+"""
+
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from common.models import User
+from menu.models import Chef, Dish, Ingredient
+from menu.services import MenuService
+from menu import search as menu_search
+
+WORDS = [
+    'tomato', 'basil', 'garlic', 'onion', 'chicken', 'beef', 'pork', 'tofu', 'rice', 'noodle',
+    'pepper', 'lemon', 'ginger', 'curry', 'cheese', 'mushroom', 'spinach', 'salmon', 'shrimp', 'bean',
+    'corn', 'potato', 'carrot', 'cabbage', 'sesame', 'peanut', 'coconut', 'mango', 'chili', 'herb',
+]
+TERMS = ['bas', 'chicken curry', 'salm', 'spicy peanut', 'zzz']
+
+
+class Command(BaseCommand):
+    help = "Compare FTS5 dish search with the icontains scan on a synthetic menu."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dishes', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if not menu_search.fts_available():
+            raise CommandError("FTS5 index not available on this database.")
+
+        with transaction.atomic():
+            self._populate(options['dishes'])
+            self.stdout.write(
+                f"{'term':<16}{'icontains hits':>15}{'ms':>8}{'fts hits':>10}{'ms':>8}"
+            )
+            for term in TERMS:
+                scan_hits, scan_ms = self._time(options['repeat'], lambda: self._icontains(term))
+                fts_hits, fts_ms = self._time(options['repeat'], lambda: self._fts(term))
+                self.stdout.write(
+                    f"{term:<16}{scan_hits:>15}{scan_ms:>8.2f}{fts_hits:>10}{fts_ms:>8.2f}"
+                )
+            transaction.set_rollback(True)
+
+    def _populate(self, count):
+        rng = random.Random(42)
+        user = User.objects.create(username='bench-search-chef')
+        chef = Chef.objects.create(user=user, name='Bench')
+        ingredients = Ingredient.objects.bulk_create(
+            [Ingredient(name=f'bench {word}') for word in WORDS]
+        )
+        dishes = Dish.objects.bulk_create([
+            Dish(
+                chef=chef,
+                name=' '.join(rng.sample(WORDS, 2)) + f' {i}',
+                description=' '.join(rng.sample(WORDS, 6)),
+                price=10,
+            )
+            for i in range(count)
+        ])
+        Dish.ingredient.through.objects.bulk_create([
+            Dish.ingredient.through(dish_id=dish.pk, ingredient_id=ingredient.pk)
+            for dish in dishes
+            for ingredient in rng.sample(ingredients, 3)
+        ])
+        MenuService.refresh_menu_entries([dish.pk for dish in dishes])
+
+    @staticmethod
+    def _icontains(term):
+        return list(Dish.objects.filter(
+            Q(name__icontains=term) | Q(description__icontains=term)
+        ).values_list('pk', flat=True))
+
+    @staticmethod
+    def _fts(term):
+        # Same shape as MenuService._apply_search: ranked, and covering ingredient names
+        match_query = menu_search.build_match_query(term)
+        return list(menu_search.filter_ranked(Dish.objects.all(), match_query)
+                    .order_by('search_rank').values_list('pk', flat=True))
+
+    @staticmethod
+    def _time(repeat, fn):
+        result = fn()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return len(result), (time.perf_counter() - start) * 1000 / repeat
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:46
+
+from django.db import migrations, models
+
+
+def backfill_allergen_masks(apps, schema_editor):
+    Allergen = apps.get_model('menu', 'Allergen')
+    Dish = apps.get_model('menu', 'Dish')
+    AllergyPreference = apps.get_model('menu', 'AllergyPreference')
+
+    for bit_index, allergen in enumerate(Allergen.objects.order_by('pk')):
+        allergen.bit_index = bit_index
+        allergen.save(update_fields=['bit_index'])
+
+    for dish in Dish.objects.all():
+        mask = 0
+        for ingredient in dish.ingredient.exclude(allergens=None).select_related('allergens'):
+            mask |= 1 << ingredient.allergens.bit_index
+        if mask:
+            dish.allergen_mask = mask
+            dish.save(update_fields=['allergen_mask'])
+
+    for pref in AllergyPreference.objects.all():
+        mask = 0
+        for allergen in pref.allergens.all():
+            mask |= 1 << allergen.bit_index
+        if mask:
+            pref.allergen_mask = mask
+            pref.save(update_fields=['allergen_mask'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='allergen',
+            name='bit_index',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='allergypreference',
+            name='allergen_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='allergen_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_allergen_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_menu_entries(apps, schema_editor):
+    Dish = apps.get_model('menu', 'Dish')
+    MenuEntry = apps.get_model('menu', 'MenuEntry')
+
+    for dish in Dish.objects.select_related('chef'):
+        ingredients = list(dish.ingredient.select_related('allergens').order_by('name'))
+        MenuEntry.objects.create(
+            dish=dish,
+            chef_name=dish.chef.name,
+            ingredient_names=[i.name for i in ingredients],
+            allergen_names=sorted({i.allergens.name for i in ingredients if i.allergens}),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0002_allergen_bitmask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuEntry',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('dish', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='menu_entry', serialize=False, to='menu.dish')),
+                ('chef_name', models.CharField(blank=True, max_length=50)),
+                ('ingredient_names', models.JSONField(default=list)),
+                ('allergen_names', models.JSONField(default=list)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(backfill_menu_entries, migrations.RunPython.noop),
+    ]
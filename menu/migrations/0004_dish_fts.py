@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:40
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+def create_dish_fts(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE menu_dish_fts USING fts5("
+            "name, description, ingredients, tokenize='unicode61 remove_diacritics 2')"
+        )
+    except OperationalError:
+        # SQLite built without FTS5; menu.search falls back to icontains
+        return
+
+    Dish = apps.get_model('menu', 'Dish')
+    rows = [
+        (dish.pk, dish.name, dish.description, ' '.join(i.name for i in dish.ingredient.all()))
+        for dish in Dish.objects.prefetch_related('ingredient')
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO menu_dish_fts(rowid, name, description, ingredients) VALUES (%s, %s, %s, %s)",
+            rows
+        )
+
+
+def drop_dish_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS menu_dish_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0003_menuentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_dish_fts, drop_dish_fts),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0004_dish_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='picture_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
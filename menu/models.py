@@ -1,13 +1,41 @@
 from django.db import models
 from django.conf import settings
-from common.models import TimeStampedModel 
+from common.models import TimeStampedModel, DerivedFieldsModel
 from accounts.models import Customer 
 
+
 class Allergen(TimeStampedModel):
+    # Bits 0..62 of a signed 64-bit column; see Dish.allergen_mask
+    MAX_BIT_INDEX = 62
+
     name = models.CharField(max_length=100, unique=True)
+    bit_index = models.PositiveSmallIntegerField(unique=True, null=True, blank=True, editable=False)
+
+    @property
+    def mask(self):
+        return 1 << self.bit_index if self.bit_index is not None else 0
+
+    def save(self, *args, **kwargs):
+        if self.bit_index is None:
+            self.bit_index = Allergen.next_free_bit()
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def next_free_bit():
+        used = set(Allergen.objects.exclude(bit_index=None).values_list('bit_index', flat=True))
+        for bit in range(Allergen.MAX_BIT_INDEX + 1):
+            if bit not in used:
+                return bit
+        raise ValueError("Allergen bitmask capacity exhausted")
+
+    def __str__(self):
+        return self.name
+
 class AllergyPreference(TimeStampedModel):
     customer = models.OneToOneField(Customer,on_delete=models.CASCADE,related_name="allergy_preference")
     allergens = models.ManyToManyField(Allergen, blank=True)
+    # OR of Allergen.mask over `allergens`, maintained by menu.signals
+    allergen_mask = models.BigIntegerField(default=0, editable=False)
 
     def get_allergen_list(self):
         if not self.allergens:
@@ -43,18 +71,39 @@ class Chef(TimeStampedModel):
     def __str__(self):
         return self.name
 
-class Dish(TimeStampedModel):
+class Dish(DerivedFieldsModel):
+    DERIVED_FIELDS = ('allergen_mask', 'picture_variants')
+
     chef = models.ForeignKey(Chef, on_delete=models.PROTECT)
     ingredient = models.ManyToManyField(Ingredient)
     name = models.CharField(max_length=150)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=8, decimal_places=2)
     picture = models.ImageField(upload_to='dishes/', blank=True, null=True)
+    # Resized copies of `picture`, filled in by menu.images in the background
+    picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     special_for_vip = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
+    # OR of Allergen.mask over the ingredients' allergens, maintained by menu.signals
+    allergen_mask = models.BigIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
+
+
+class MenuEntry(TimeStampedModel):
+    """
+    Denormalized menu read model: one row per Dish holding the names the
+    menu serializers need, so a menu page is served from a single join.
+    Maintained by menu.signals via MenuService.refresh_menu_entries.
+    """
+    dish = models.OneToOneField(Dish, on_delete=models.CASCADE, primary_key=True, related_name='menu_entry')
+    chef_name = models.CharField(max_length=50, blank=True)
+    ingredient_names = models.JSONField(default=list)
+    allergen_names = models.JSONField(default=list)
+
+    def __str__(self):
+        return f"MenuEntry({self.dish_id})"
 '''
 class DishIngredient(TimeStampedModel):
     dish = models.ForeignKey(Dish, on_delete=models.CASCADE)
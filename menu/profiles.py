@@ -0,0 +1,75 @@
+"""
+Materialized allergy profiles (UC06).
+
+Customers with the same allergens share one profile: the canonical
+allergen set AllergyPreference.allergen_mask, resolved per customer by
+menu.cache.get_customer_allergen_mask. For every profile we cache the ids
+of the dishes it must not see (Dish.allergen_mask & profile != 0) and
+filter the shared per-user-type menu snapshot with it.
+
+Each allergen bit has its own version. A profile entry is keyed by the
+versions of the bits it contains. When a dish's mask changes, only the
+bits that flipped are bumped, so only profiles that include one of those
+allergens are recomputed. Price edits, toggles and every other menu write
+leave the profile entries alone.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Allergen, Dish
+
+SAFE_MENU_CACHE_TIMEOUT = getattr(settings, 'SAFE_MENU_CACHE_TIMEOUT', 3600)
+
+
+def _bit_key(bit_index):
+    return f'menu:allergen-bit:{bit_index}'
+
+
+def _bits(mask):
+    return [b for b in range(Allergen.MAX_BIT_INDEX + 1) if mask >> b & 1]
+
+
+def _profile_key(profile_mask):
+    keys = [_bit_key(b) for b in _bits(profile_mask)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key, 0)
+    stamp = '.'.join(str(versions[key]) for key in keys)
+    return f'menu:unsafe:{profile_mask}:{stamp}'
+
+
+def unsafe_dish_ids(profile_mask) -> frozenset:
+    """Ids of dishes containing any allergen in the profile."""
+    if not profile_mask:
+        return frozenset()
+    key = _profile_key(profile_mask)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(
+            Dish.objects.alias(
+                allergen_conflict=F('allergen_mask').bitand(profile_mask)
+            ).exclude(allergen_conflict=0).values_list('pk', flat=True)
+        )
+        cache.set(key, ids, SAFE_MENU_CACHE_TIMEOUT)
+    return ids
+
+
+def _bump_bits(mask):
+    for bit_index in _bits(mask):
+        try:
+            cache.incr(_bit_key(bit_index))
+        except ValueError:
+            cache.set(_bit_key(bit_index), time.time_ns(), None)
+
+
+def bump_bits_on_commit(mask) -> None:
+    """Invalidates every profile sharing an allergen with `mask`, once the write commits."""
+    if mask:
+        transaction.on_commit(lambda: _bump_bits(mask))
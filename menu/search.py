@@ -0,0 +1,78 @@
+"""
+Full-text dish search (UC06).
+
+Dish name, description and ingredient names are indexed in an SQLite FTS5
+table (rowid = Dish.pk) created by migration 0004. The index is refreshed
+together with the MenuEntry read model, so it follows every Dish and
+Ingredient write. On other database backends, or SQLite builds without
+FTS5, callers fall back to icontains.
+"""
+
+import re
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'menu_dish_fts'
+
+# bm25 column weights: name, description, ingredients
+FTS_RANK = f'bm25({FTS_TABLE}, 10.0, 1.0, 4.0)'
+
+
+def fts_available() -> bool:
+    return _fts_available(connection.vendor, str(connection.settings_dict['NAME']))
+
+
+@lru_cache(maxsize=None)
+def _fts_available(vendor, database_name) -> bool:
+    if vendor != 'sqlite':
+        return False
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def build_match_query(term: str):
+    """Turns free text into an FTS5 query where every word is a quoted prefix match."""
+    tokens = re.findall(r'\w+', term.lower())
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def filter_ranked(queryset, match_query: str):
+    """
+    Restricts a Dish queryset to index matches and annotates their bm25
+    score as `search_rank` (lower is better) for order_by.
+    """
+    qn = connection.ops.quote_name
+    dish_pk = f'{qn(queryset.model._meta.db_table)}.{qn(queryset.model._meta.pk.column)}'
+    matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match_query])
+    rank = RawSQL(
+        f'SELECT {FTS_RANK} FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {dish_pk}',
+        [match_query],
+        output_field=FloatField(),
+    )
+    return queryset.filter(pk__in=matches).annotate(search_rank=rank)
+
+
+def index_dishes(rows) -> None:
+    """Replaces the index rows for (pk, name, description, ingredient_names) tuples."""
+    if not fts_available():
+        return
+    rows = list(rows)
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE}(rowid, name, description, ingredients) VALUES (%s, %s, %s, %s)",
+            [(pk, name, description, ' '.join(ingredients)) for pk, name, description, ingredients in rows]
+        )
+
+
+def remove_dishes(dish_ids) -> None:
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in dish_ids])
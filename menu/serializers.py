@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from menu.models import Dish, Chef, Allergen, Ingredient
+from menu.images import variant_urls
 
 class ChefSerializer(serializers.ModelSerializer):
     class Meta:
@@ -9,23 +10,53 @@ class ChefSerializer(serializers.ModelSerializer):
 class AllergenSerializer(serializers.ModelSerializer):
     class Meta:
         model = Allergen
-        fields = ['allergen_id', 'name']
+        fields = ['id', 'name']
 
 class MenuDishSerializer(serializers.ModelSerializer):
-    chef_name = serializers.CharField(source='chef_id.name', read_only=True)
+    """
+    Reads names from the MenuEntry projection (select_related('menu_entry')),
+    falling back to the live relations for dishes without one.
+    """
+    chef_name = serializers.SerializerMethodField()
     ingredients_list = serializers.SerializerMethodField()
     allergens_list = serializers.SerializerMethodField()
+    picture_variants = serializers.SerializerMethodField()
+    rating_average = serializers.SerializerMethodField()
+    rating_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Dish
         fields = [
-            'name', 'price', 'description', 'picture',
+            'id', 'name', 'price', 'description', 'picture', 'picture_variants',
             'chef_name', 'special_for_vip', 'is_active',
-            'ingredients_list', 'allergens_list'
+            'ingredients_list', 'allergens_list',
+            'rating_average', 'rating_count'
         ]
 
+    def get_picture_variants(self, obj):
+        """Resized WebP/JPEG URLs by size; empty until the background job has run"""
+        return variant_urls(obj, self.context.get('request'))
+
+    def get_rating_average(self, obj):
+        """Average stars from the running aggregate (select_related('rating_aggregate'))"""
+        aggregate = getattr(obj, 'rating_aggregate', None)
+        return aggregate.average if aggregate else None
+
+    def get_rating_count(self, obj):
+        aggregate = getattr(obj, 'rating_aggregate', None)
+        return aggregate.count if aggregate else 0
+
+    def get_chef_name(self, obj):
+        entry = getattr(obj, 'menu_entry', None)
+        if entry is not None:
+            return entry.chef_name
+        return obj.chef.name
+
     def get_ingredients_list(self, obj):
         """Get list of ingredient names for this dish"""
+        entry = getattr(obj, 'menu_entry', None)
+        if entry is not None:
+            return entry.ingredient_names
         try:
             return [i.name for i in obj.ingredient.all()]
         except AttributeError:
@@ -33,14 +64,14 @@ class MenuDishSerializer(serializers.ModelSerializer):
 
     def get_allergens_list(self, obj):
         """Get list of allergens for this dish"""
+        entry = getattr(obj, 'menu_entry', None)
+        if entry is not None:
+            return entry.allergen_names
         allergens = set()
-        try:
-            for ing in obj.ingredient.all():
-                for alg in ing.allergens.all():
-                    allergens.add(alg.name)
-        except AttributeError:
-            pass
-        return list(allergens)
+        for ing in obj.ingredient.all().select_related('allergens'):
+            if ing.allergens:
+                allergens.add(ing.allergens.name)
+        return sorted(allergens)
 
 class MenuResponseSerializer(serializers.Serializer):
     """Response serializer for menu endpoint (UC06)"""
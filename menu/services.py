@@ -1,8 +1,19 @@
+import time
+from decimal import Decimal, InvalidOperation
 from typing import Tuple, List, Dict, Optional
 from django.db import transaction
-from django.db.models import Q
-from .models import Dish, Chef, Allergen, AllergyPreference, Ingredient
+from django.db.models import Q, F
+from django.db.models.functions import Lower
+from .models import Dish, Chef, Allergen, AllergyPreference, Ingredient, MenuEntry
+from . import cache as menu_cache
+from . import search as menu_search
+from . import profiles as menu_profiles
+from .images import process_dish_picture
+from common.tasks import run_in_background
 from orders.models import Order, OrderItem 
+from reputation.models import DishPopularity, DishRatingAggregate
+
+CENT = Decimal('0.01')
 
 class MenuService:
     """
@@ -11,18 +22,56 @@ class MenuService:
       - Reader Logic (UC06: Displaying/Filtering Menu)
       - Writer Logic (UC19: Managing Dishes/Ingredients)
     """
+    MAX_BULK_DISHES = 1000
+    BULK_BATCH_SIZE = 500
+    # Dish.price is max_digits=8, decimal_places=2
+    MAX_PRICE = Decimal('1000000')
 
     # =========================================================================
     #  SECTION 1: READER LOGIC (For Customers/Visitors - UC06)
     # =========================================================================
 
     @staticmethod
-    def display_menu(customer_id, user_type: str) -> Tuple[bool, str, List[Dish]]:
+    def display_menu(customer_id, user_type: str, search: str = '') -> Tuple[bool, str, List[Dish]]:
         """
         Main entry point for fetching the menu.
-        Applies Availability -> User Type Filter -> Allergy Safety Filter.
+        Applies Availability -> User Type Filter -> Allergy Safety Filter -> Search.
+        """
+        dishes = MenuService._visible_dishes(customer_id, user_type)
+
+        ordering = ['name']
+        if search:
+            dishes, ordering = MenuService._apply_search(dishes, search)
+
+        final_list = dishes.order_by(*ordering)
+
+        # len() evaluates once; the serializer reuses the cached rows
+        count = len(final_list)
+        if not count:
+            return True, MenuService._menu_message(0), []
+
+        return True, MenuService._menu_message(count), final_list
+
+    @staticmethod
+    def popular_dishes(customer_id, user_type: str, limit: int = 10) -> Tuple[bool, str, List[Dish]]:
+        """
+        "Popular now": top-k dishes by time-decayed order/rating score
+        (reputation.DishPopularity), under the same visibility and allergy
+        rules as display_menu.
         """
-        dishes = Dish.objects.all().select_related('chef').prefetch_related('ingredient')
+        dishes = MenuService._visible_dishes(customer_id, user_type).annotate(
+            popularity_score=DishPopularity.rank_expression(time.time(), prefix='popularity__')
+        ).filter(popularity_score__gt=0).order_by('-popularity_score', 'name')[:limit]
+
+        dishes = list(dishes)
+        if not dishes:
+            return True, "No popular dishes yet.", []
+        return True, f"Top {len(dishes)} dishes", dishes
+
+    @staticmethod
+    def _visible_dishes(customer_id, user_type: str):
+        """Availability -> User Type Filter -> Allergy Safety Filter."""
+        dishes = Dish.objects.all().select_related('chef', 'menu_entry', 'rating_aggregate')
 
         if user_type not in ['Manager', 'Chef']:
             dishes = dishes.filter(is_active=True, chef__is_active=True)
@@ -34,24 +83,75 @@ class MenuService:
         if customer_id and user_type != 'Visitor':
             dishes = MenuService._apply_allergy_filter(dishes, customer_id)
 
-        final_list = dishes.order_by('name')
+        return dishes
 
-        if not final_list.exists():
-            return True, "No dishes available.", []
+    @staticmethod
+    def live_ratings() -> Dict[int, Tuple]:
+        """Dish pk -> (rating_average, rating_count), cached under the ratings version."""
+        version = menu_cache.get_ratings_version()
+        ratings = menu_cache.get_ratings(version)
+        if ratings is None:
+            ratings = {
+                dish_id: (round(total / count, 2) if count else None, count)
+                for dish_id, count, total in DishRatingAggregate.objects.values_list('dish_id', 'count', 'total_stars')
+            }
+            menu_cache.set_ratings(version, ratings)
+        return ratings
+
+    @staticmethod
+    def apply_live_ratings(snapshot: Dict, ratings: Dict[int, Tuple]) -> Dict:
+        """Returns the serialized menu with each dish's rating fields taken from `ratings`."""
+        dishes = []
+        for dish in snapshot['dishes']:
+            average, count = ratings.get(dish['id'], (None, 0))
+            dishes.append({**dish, 'rating_average': average, 'rating_count': count})
+        return {**snapshot, "dishes": dishes}
+
+    @staticmethod
+    def filter_snapshot_for_profile(snapshot: Dict, allergen_mask: int) -> Dict:
+        """
+        Narrows a serialized menu (built without allergy filtering) to one
+        allergy profile using its materialized unsafe-dish set.
+        """
+        unsafe = menu_profiles.unsafe_dish_ids(allergen_mask)
+        if not unsafe:
+            return snapshot
+        dishes = [d for d in snapshot['dishes'] if d['id'] not in unsafe]
+        return {**snapshot, "message": MenuService._menu_message(len(dishes)), "dishes": dishes}
+
+    @staticmethod
+    def _menu_message(count: int) -> str:
+        return f"Found {count} dishes" if count else "No dishes available."
+
+    @staticmethod
+    def _apply_search(queryset, search: str):
+        """
+        Restricts the queryset to dishes matching `search` and returns it with
+        its ordering: bm25 rank when the FTS index is available, otherwise an
+        icontains scan ordered by name.
+        """
+        match_query = menu_search.build_match_query(search)
+        if match_query and menu_search.fts_available():
+            return menu_search.filter_ranked(queryset, match_query), ['search_rank', 'name']
 
-        return True, f"Found {final_list.count()} dishes", final_list
+        return queryset.filter(
+            Q(name__icontains=search) |
+            Q(description__icontains=search) |
+            Q(ingredient__name__icontains=search)
+        ).distinct(), ['name']
 
     @staticmethod
     def _apply_allergy_filter(queryset, customer_id):
         """Helper to exclude dishes containing customer's allergens."""
         try:
-            pref = AllergyPreference.objects.filter(customer__pk=customer_id).first()
-            if not pref:
+            allergen_mask = menu_cache.get_customer_allergen_mask(customer_id)
+            if not allergen_mask:
                 return queryset
-            
-            # Find ingredients that match the customer's allergens
-            unsafe_ingredients = Ingredient.objects.filter(allergens__in=pref.allergens.all())
-            return queryset.exclude(ingredient__in=unsafe_ingredients)
+
+            # A dish is safe when it shares no allergen bit with the customer
+            return queryset.alias(
+                allergen_conflict=F('allergen_mask').bitand(allergen_mask)
+            ).filter(allergen_conflict=0)
         except Exception:
             return queryset
 
@@ -95,10 +195,11 @@ class MenuService:
                     is_active=True
                 )
                 
-                # Handle Image if present
+                # Handle Image if present; variants are rendered off-request
                 if 'picture' in dish_data:
                     dish.picture = dish_data['picture']
                     dish.save()
+                    MenuService.schedule_picture_variants(dish)
 
                 # Handle Ingredients
                 if 'ingredients' in dish_data:
@@ -109,6 +210,107 @@ class MenuService:
         except Exception as e:
             return False, f"Failed to create dish: {str(e)}", None
 
+    @staticmethod
+    def bulk_add_dishes(chef_id, rows: List[Dict]) -> Tuple[bool, str, List[Dict]]:
+        """
+        Onboards many dishes at once (e.g. a new location's menu).
+        Rows are validated individually; valid ones are inserted with one
+        ingredient lookup, bulk inserts for new ingredients, dishes and
+        Dish-Ingredient links, all in a single transaction.
+        Returns per-row results: {'row', 'name', 'success', 'dish_id' | 'error'};
+        if the insert fails, no row is saved and every row carries an error.
+        """
+        if len(rows) > MenuService.MAX_BULK_DISHES:
+            return False, f"At most {MenuService.MAX_BULK_DISHES} dishes per import", []
+
+        try:
+            chef = chef_id if hasattr(chef_id, 'pk') else Chef.objects.get(pk=chef_id)
+        except (Chef.DoesNotExist, ValueError, TypeError):
+            return False, "Chef not found", []
+        if not chef.is_active:
+            return False, "Chef account is not active", []
+
+        # 1. Per-row validation, including name clashes with the DB and within the batch
+        rows = [row if isinstance(row, dict) else {} for row in rows]
+        results = [{'row': i, 'name': str(row.get('name') or '').strip(), 'success': False} for i, row in enumerate(rows)]
+        names = {r['name'].lower() for r in results if r['name']}
+        taken = set(
+            Dish.objects.annotate(lname=Lower('name')).filter(lname__in=names).values_list('lname', flat=True)
+        )
+
+        valid = []
+        for result, row in zip(results, rows):
+            is_valid, error_msg = MenuService._validate_dish_data(row)
+            if is_valid and result['name'].lower() in taken:
+                is_valid, error_msg = False, "Dish name already exists"
+            if not is_valid:
+                result['error'] = error_msg
+                continue
+            taken.add(result['name'].lower())
+            valid.append((result, row, MenuService._parse_ingredient_names(row.get('ingredients'))))
+
+        if not valid:
+            return False, "No valid dishes to import", results
+
+        # 2. Resolve every ingredient name in one query, create the missing ones
+        wanted = {}
+        for _, _, ingredient_names in valid:
+            for name in ingredient_names:
+                wanted.setdefault(name.lower(), name)
+
+        try:
+            with transaction.atomic():
+                ingredients = {
+                    i.name.lower(): i
+                    for i in Ingredient.objects.annotate(lname=Lower('name')).filter(lname__in=wanted)
+                }
+                created = Ingredient.objects.bulk_create(
+                    [Ingredient(name=name) for key, name in wanted.items() if key not in ingredients],
+                    batch_size=MenuService.BULK_BATCH_SIZE
+                )
+                ingredients.update({i.name.lower(): i for i in created})
+
+                # 3. Dishes, then their through rows, one insert each
+                dishes = Dish.objects.bulk_create(
+                    [
+                        Dish(
+                            chef=chef,
+                            name=result['name'],
+                            price=MenuService._parse_price(row['price']),
+                            description=str(row.get('description') or '').strip(),
+                            special_for_vip=MenuService._parse_bool(row.get('special_for_vip')),
+                            is_active=True
+                        )
+                        for result, row, _ in valid
+                    ],
+                    batch_size=MenuService.BULK_BATCH_SIZE
+                )
+                Dish.ingredient.through.objects.bulk_create(
+                    [
+                        Dish.ingredient.through(dish_id=dish.pk, ingredient_id=ingredients[name.lower()].pk)
+                        for dish, (_, _, ingredient_names) in zip(dishes, valid)
+                        for name in dict.fromkeys(n.lower() for n in ingredient_names)
+                    ],
+                    batch_size=MenuService.BULK_BATCH_SIZE
+                )
+
+                # bulk_create sends no signals, so refresh the derived menu data here
+                dish_ids = [dish.pk for dish in dishes]
+                MenuService.refresh_dish_allergen_masks(dish_ids)
+                MenuService.refresh_menu_entries(dish_ids)
+                menu_cache.bump_menu_version_on_commit()
+        except Exception as e:
+            # The transaction rolled back, so rows that passed validation were not saved either
+            for result, _, _ in valid:
+                result['error'] = "Import failed; nothing was saved"
+            return False, f"Failed to import dishes: {str(e)}", results
+
+        for dish, (result, _, _) in zip(dishes, valid):
+            result['success'] = True
+            result['dish_id'] = dish.pk
+
+        return True, f"Imported {len(dishes)} of {len(rows)} dishes", results
+
     @staticmethod
     def delete_dish(dish_id, chef_id) -> Tuple[bool, str]:
         """
@@ -139,36 +341,65 @@ class MenuService:
             dish.delete()
             return True, "Dish permanently deleted."
 
+    @staticmethod
+    def schedule_picture_variants(dish) -> None:
+        """Drops variants of the previous picture and queues a rebuild for the current one."""
+        dish.picture_variants = {}
+        dish.save(update_fields=['picture_variants'])
+        if dish.picture:
+            run_in_background(process_dish_picture, dish.pk)
+
     # =========================================================================
     #  SECTION 3: HELPER METHODS (Private/Internal)
     # =========================================================================
 
     @staticmethod
     def _validate_dish_data(data: Dict) -> Tuple[bool, str]:
-        if not data.get('name'): return False, "Name is required"
-        try:
-            price = float(data.get('price', 0))
-            if price <= 0: return False, "Price must be positive"
-        except ValueError:
-            return False, "Invalid price format"
+        if not str(data.get('name') or '').strip(): return False, "Name is required"
+        price = MenuService._parse_price(data.get('price', 0))
+        if price is None: return False, "Invalid price format"
+        if price <= 0: return False, "Price must be positive"
+        if price >= MenuService.MAX_PRICE: return False, "Price is too large"
         return True, ""
 
+    @staticmethod
+    def _parse_price(value) -> Optional[Decimal]:
+        """The price as stored (rounded to cents), or None if it is not a finite number."""
+        try:
+            price = Decimal(str(value).strip())
+        except (InvalidOperation, ValueError, TypeError):
+            return None
+        if not price.is_finite():
+            return None
+        # Out-of-range values are returned as is; quantizing them can overflow
+        return price.quantize(CENT) if abs(price) < MenuService.MAX_PRICE else price
+
     @staticmethod
     def _check_dish_name_unique(name: str) -> bool:
         return not Dish.objects.filter(name__iexact=name.strip()).exists()
 
+    @staticmethod
+    def _parse_ingredient_names(ingredients_input) -> List[str]:
+        """Parses a string "Tomato, Basil" OR a list ['Tomato', 'Basil']."""
+        if isinstance(ingredients_input, str):
+            return [x.strip() for x in ingredients_input.split(',') if x.strip()]
+        if isinstance(ingredients_input, list):
+            return [str(x).strip() for x in ingredients_input if x and str(x).strip()]
+        return []
+
+    @staticmethod
+    def _parse_bool(value) -> bool:
+        if isinstance(value, str):
+            return value.strip().lower() in ('1', 'true', 'yes', 'y')
+        return bool(value)
+
     @staticmethod
     def _add_ingredients_to_dish(dish, ingredients_input):
         """
         Parses a string "Tomato, Basil" OR a list ['Tomato', 'Basil']
         and links/creates ingredients.
         """
-        if isinstance(ingredients_input, str):
-            names = [x.strip() for x in ingredients_input.split(',') if x.strip()]
-        elif isinstance(ingredients_input, list):
-            names = [str(x).strip() for x in ingredients_input if x]
-        else:
-            return
+        names = MenuService._parse_ingredient_names(ingredients_input)
 
         for name in names:
             # Get or Create the Ingredient
@@ -177,4 +408,103 @@ class MenuService:
                 defaults={'name': name}
             )
             # Link it to the Dish
-            dish.ingredient.add(ingredient_obj)
\ No newline at end of file
+            dish.ingredient.add(ingredient_obj)
+
+    # =========================================================================
+    #  SECTION 4: ALLERGEN BITMASK INDEX
+    # =========================================================================
+
+    @staticmethod
+    def refresh_dish_allergen_masks(dish_ids) -> None:
+        """
+        Recomputes Dish.allergen_mask for the given dishes from their
+        ingredients' allergens. Uses queryset updates so no signals fire.
+        """
+        dish_ids = set(dish_ids)
+        if not dish_ids:
+            return
+
+        masks = dict.fromkeys(dish_ids, 0)
+        links = Dish.ingredient.through.objects.filter(
+            dish_id__in=dish_ids,
+            ingredient__allergens__isnull=False
+        ).values_list('dish_id', 'ingredient__allergens__bit_index')
+
+        for dish_id, bit_index in links:
+            if bit_index is not None:
+                masks[dish_id] |= 1 << bit_index
+
+        dishes = list(Dish.objects.filter(pk__in=dish_ids).only('pk', 'allergen_mask'))
+        changed = [d for d in dishes if d.allergen_mask != masks[d.pk]]
+        flipped_bits = 0
+        for dish in changed:
+            flipped_bits |= dish.allergen_mask ^ masks[dish.pk]
+            dish.allergen_mask = masks[dish.pk]
+        Dish.objects.bulk_update(changed, ['allergen_mask'])
+        menu_profiles.bump_bits_on_commit(flipped_bits)
+
+    @staticmethod
+    def refresh_preference_allergen_mask(preference_id) -> Optional[int]:
+        """Recomputes AllergyPreference.allergen_mask from its allergens and returns it."""
+        customer_id = AllergyPreference.objects.filter(pk=preference_id).values_list('customer_id', flat=True).first()
+        if customer_id is None:
+            return None
+
+        mask = 0
+        bits = Allergen.objects.filter(
+            allergypreference__pk=preference_id
+        ).exclude(bit_index=None).values_list('bit_index', flat=True)
+        for bit_index in bits:
+            mask |= 1 << bit_index
+        AllergyPreference.objects.filter(pk=preference_id).update(allergen_mask=mask)
+
+        transaction.on_commit(lambda: menu_cache.forget_customer_allergen_mask(customer_id))
+        return mask
+
+
+    # =========================================================================
+    #  SECTION 5: MENU READ MODEL
+    # =========================================================================
+
+    @staticmethod
+    def refresh_menu_entries(dish_ids) -> None:
+        """
+        Rebuilds the MenuEntry projection rows for the given dishes
+        (chef name, ingredient names, allergen names) in one upsert.
+        """
+        dish_ids = set(dish_ids)
+        if not dish_ids:
+            return
+
+        dish_rows = list(Dish.objects.filter(pk__in=dish_ids).values_list('pk', 'chef__name', 'name', 'description'))
+        chef_names = {pk: chef_name for pk, chef_name, _, _ in dish_rows}
+        ingredients = {pk: [] for pk in chef_names}
+        allergens = {pk: set() for pk in chef_names}
+
+        links = Dish.ingredient.through.objects.filter(
+            dish_id__in=chef_names
+        ).values_list('dish_id', 'ingredient__name', 'ingredient__allergens__name').order_by('ingredient__name')
+
+        for dish_id, ingredient_name, allergen_name in links:
+            ingredients[dish_id].append(ingredient_name)
+            if allergen_name:
+                allergens[dish_id].add(allergen_name)
+
+        MenuEntry.objects.bulk_create(
+            [
+                MenuEntry(
+                    dish_id=pk,
+                    chef_name=chef_name or '',
+                    ingredient_names=ingredients[pk],
+                    allergen_names=sorted(allergens[pk]),
+                )
+                for pk, chef_name in chef_names.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['dish'],
+            update_fields=['chef_name', 'ingredient_names', 'allergen_names', 'updated_at'],
+        )
+
+        menu_search.index_dishes(
+            (pk, name, description, ingredients[pk]) for pk, _, name, description in dish_rows
+        )
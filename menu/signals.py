@@ -0,0 +1,145 @@
+"""
+Keeps the denormalized allergen bitmasks on Dish and AllergyPreference
+and the MenuEntry read model in step with the Ingredient/Allergen/Chef
+rows they are built from, and bumps the menu snapshot version on every
+menu write.
+"""
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import Dish, Chef, Ingredient, Allergen, AllergyPreference
+from .services import MenuService
+from . import cache as menu_cache
+from . import search as menu_search
+from . import profiles as menu_profiles
+
+
+def _affected_ids(instance, action, pk_set, reverse, related_ids):
+    """
+    Returns the pks on the 'owning' side of an m2m change.
+    For reverse clears the ids are captured in pre_clear, since they are gone by post_clear.
+    """
+    if not reverse:
+        return {instance.pk}
+    if action == 'pre_clear':
+        instance._cleared_ids = set(related_ids())
+        return set()
+    if action == 'post_clear':
+        return getattr(instance, '_cleared_ids', set())
+    return set(pk_set or ())
+
+
+@receiver(m2m_changed, sender=Dish.ingredient.through)
+def dish_ingredients_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear', 'post_clear'):
+        return
+    dish_ids = _affected_ids(
+        instance, action, pk_set, reverse,
+        lambda: instance.dish_set.values_list('pk', flat=True)
+    )
+    if action != 'pre_clear':
+        MenuService.refresh_dish_allergen_masks(dish_ids)
+        MenuService.refresh_menu_entries(dish_ids)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    if created:
+        return
+    dish_ids = list(instance.dish_set.values_list('pk', flat=True))
+    MenuService.refresh_dish_allergen_masks(dish_ids)
+    MenuService.refresh_menu_entries(dish_ids)
+
+
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_deleting(sender, instance, **kwargs):
+    # Cascading deletes of m2m rows do not send m2m_changed
+    instance._dish_ids = list(instance.dish_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, **kwargs):
+    dish_ids = getattr(instance, '_dish_ids', [])
+    MenuService.refresh_dish_allergen_masks(dish_ids)
+    MenuService.refresh_menu_entries(dish_ids)
+
+
+@receiver(post_save, sender=Dish)
+def dish_saved(sender, instance, **kwargs):
+    MenuService.refresh_menu_entries([instance.pk])
+
+
+@receiver(post_delete, sender=Dish)
+def dish_deleted(sender, instance, **kwargs):
+    menu_search.remove_dishes([instance.pk])
+    menu_profiles.bump_bits_on_commit(instance.allergen_mask)
+
+
+@receiver(post_save, sender=Chef)
+def chef_saved(sender, instance, created, **kwargs):
+    if created:
+        return
+    MenuService.refresh_menu_entries(instance.dish_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Allergen)
+def allergen_saved(sender, instance, created, **kwargs):
+    if created:
+        return
+    MenuService.refresh_menu_entries(
+        Dish.objects.filter(ingredient__allergens=instance).values_list('pk', flat=True)
+    )
+
+
+@receiver(m2m_changed, sender=AllergyPreference.allergens.through)
+def preference_allergens_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear', 'post_clear'):
+        return
+    pref_ids = _affected_ids(
+        instance, action, pk_set, reverse,
+        lambda: instance.allergypreference_set.values_list('pk', flat=True)
+    )
+    for pref_id in pref_ids:
+        mask = MenuService.refresh_preference_allergen_mask(pref_id)
+        if not reverse:
+            # Keep the instance current so a later pref.save() writes this mask, not the old one
+            instance.allergen_mask = mask
+
+
+@receiver(pre_delete, sender=Allergen)
+def allergen_deleting(sender, instance, **kwargs):
+    # Cascading deletes of m2m rows do not send m2m_changed
+    instance._pref_ids = list(instance.allergypreference_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Allergen)
+def allergen_deleted(sender, instance, **kwargs):
+    for pref_id in getattr(instance, '_pref_ids', []):
+        MenuService.refresh_preference_allergen_mask(pref_id)
+
+
+@receiver(post_delete, sender=AllergyPreference)
+def preference_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: menu_cache.forget_customer_allergen_mask(instance.customer_id))
+
+
+# --- Menu snapshot version ---
+
+@receiver(post_save, sender=Dish)
+@receiver(post_save, sender=Chef)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Allergen)
+@receiver(post_delete, sender=Dish)
+@receiver(post_delete, sender=Chef)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Allergen)
+def menu_row_changed(sender, **kwargs):
+    menu_cache.bump_menu_version_on_commit()
+
+
+@receiver(m2m_changed, sender=Dish.ingredient.through)
+def menu_links_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        menu_cache.bump_menu_version_on_commit()
@@ -1,3 +1,367 @@
-from django.test import TestCase
+import io
+import tempfile
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from accounts.models import Customer
+from common.models import User
+from orders.models import Order
+from reputation.models import DishPopularity
+from reputation.services import ReputationService
+from .checks import check_shared_version_cache
+from .models import Allergen, AllergyPreference, Chef, Dish, Ingredient, MenuEntry
+from .serializers import MenuDishSerializer
+from .services import MenuService
+from . import cache as menu_cache
+from . import images
+from . import search as menu_search
+
+
+class IngredientDeleteTests(TestCase):
+    def setUp(self):
+        chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        self.peanuts = Ingredient.objects.create(name='peanuts', allergens=Allergen.objects.create(name='peanut'))
+        self.rice = Ingredient.objects.create(name='rice')
+        self.dish = Dish.objects.create(chef=chef, name='Satay', price=Decimal('9.00'))
+        self.dish.ingredient.add(self.peanuts, self.rice)
+
+    def test_delete_refreshes_mask_menu_entry_and_search_index(self):
+        self.dish.refresh_from_db()
+        self.assertNotEqual(self.dish.allergen_mask, 0)
+
+        self.peanuts.delete()
+
+        self.dish.refresh_from_db()
+        self.assertEqual(self.dish.allergen_mask, 0)
+        entry = MenuEntry.objects.get(dish=self.dish)
+        self.assertEqual(entry.ingredient_names, ['rice'])
+        self.assertEqual(entry.allergen_names, [])
+        if menu_search.fts_available():
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT ingredients FROM {menu_search.FTS_TABLE} WHERE rowid = %s", [self.dish.pk])
+                self.assertEqual(cursor.fetchone()[0], 'rice')
+
+
+class BulkImportValidationTests(TestCase):
+    def setUp(self):
+        self.chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+
+    def test_bad_rows_are_reported_without_failing_the_batch(self):
+        rows = [
+            {'name': 'Soup', 'price': '4.50'},
+            {'name': 'A', 'price': 'nan'},
+            {'name': 'B', 'price': 'inf'},
+            {'name': 'C', 'price': 'Infinity'},
+            {'name': 'D', 'price': '0.001'},
+            {'name': 'E', 'price': '1e9'},
+            {'name': '   ', 'price': '3'},
+        ]
+        ok, message, results = MenuService.bulk_add_dishes(self.chef, rows)
+
+        self.assertTrue(ok, message)
+        self.assertEqual([r['success'] for r in results], [True] + [False] * 6)
+        self.assertEqual([r.get('error') for r in results[1:]], [
+            "Invalid price format", "Invalid price format", "Invalid price format",
+            "Price must be positive", "Price is too large", "Name is required",
+        ])
+        self.assertEqual(list(Dish.objects.values_list('name', 'price')), [('Soup', Decimal('4.50'))])
+
+    def test_failed_insert_marks_every_valid_row(self):
+        rows = [{'name': 'Soup', 'price': '4.50', 'ingredients': 'leek'}, {'name': 'Stew', 'price': '9'},
+                {'name': 'A', 'price': 'nan'}]
+        with mock.patch.object(MenuService, 'refresh_menu_entries', side_effect=RuntimeError('boom')):
+            ok, message, results = MenuService.bulk_add_dishes(self.chef, rows)
+
+        self.assertFalse(ok)
+        self.assertEqual([(r['success'], r.get('error')) for r in results], [
+            (False, "Import failed; nothing was saved"),
+            (False, "Import failed; nothing was saved"),
+            (False, "Invalid price format"),
+        ])
+        self.assertFalse(any('dish_id' in r for r in results))
+        self.assertFalse(Dish.objects.exists())
+        self.assertFalse(Ingredient.objects.filter(name='leek').exists())
+
+
+class MenuRatingsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        self.dish = Dish.objects.create(chef=chef, name='Soup', price=Decimal('5.00'))
+        self.customer = Customer.objects.create(user=User.objects.create(username='alice'))
+        self.order = Order.objects.create(customer_id=self.customer, status=Order.STATUS_COMPLETED)
+
+    def menu(self):
+        response = self.client.get('/menu/dishes/')
+        return response['ETag'], {d['id']: (d['rating_average'], d['rating_count']) for d in response.json()['dishes']}
+
+    def test_ratings_refresh_the_menu_without_rebuilding_the_snapshot(self):
+        etag, dishes = self.menu()
+        self.assertEqual(dishes[self.dish.pk], (None, 0))
+        menu_version = menu_cache.get_menu_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(ReputationService.submit_food_rating(self.customer.pk, self.dish.pk, self.order.pk, 4)[0])
+
+        self.assertEqual(menu_cache.get_menu_version(), menu_version)
+        with mock.patch.object(MenuService, 'display_menu', side_effect=AssertionError("snapshot was rebuilt")):
+            new_etag, dishes = self.menu()
+        self.assertNotEqual(new_etag, etag)
+        self.assertEqual(dishes[self.dish.pk], (4.0, 1))
+        self.assertEqual(self.client.get('/menu/dishes/', HTTP_IF_NONE_MATCH=new_etag).status_code, 304)
+
+
+class AllergenEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_lists_allergens_and_revalidates(self):
+        nuts = Allergen.objects.create(name='Nuts')
+
+        response = self.client.get('/menu/dishes/allergens/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{'id': nuts.pk, 'name': 'Nuts'}])
+        self.assertEqual(self.client.get('/menu/dishes/allergens/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_deploy_check_requires_a_shared_cache(self):
+        local = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+
+        with override_settings(CACHES=local):
+            self.assertEqual([e.id for e in check_shared_version_cache(None)], ['menu.E001'])
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_shared_version_cache(None), [])
+
+
+class AllergyPreferenceMaskTests(TestCase):
+    def setUp(self):
+        self.nuts = Allergen.objects.create(name='Nuts')
+        self.milk = Allergen.objects.create(name='Milk')
+        self.customer = Customer.objects.create(user=User.objects.create(username='alice'))
+
+    def test_saving_the_preference_after_editing_allergens_keeps_the_mask(self):
+        pref = AllergyPreference.objects.create(customer=self.customer)
+        pref.allergens.add(self.nuts, self.milk)
+        pref.save()
+
+        self.assertEqual(AllergyPreference.objects.get(pk=pref.pk).allergen_mask, self.nuts.mask | self.milk.mask)
+
+        pref.allergens.remove(self.nuts)
+        pref.save()
+        self.assertEqual(AllergyPreference.objects.get(pk=pref.pk).allergen_mask, self.milk.mask)
+
+    def test_allergen_side_edits_refresh_the_stored_mask(self):
+        pref = AllergyPreference.objects.create(customer=self.customer)
+        self.nuts.allergypreference_set.add(pref)
+        self.assertEqual(AllergyPreference.objects.get(pk=pref.pk).allergen_mask, self.nuts.mask)
+
+        self.nuts.allergypreference_set.clear()
+        self.assertEqual(AllergyPreference.objects.get(pk=pref.pk).allergen_mask, 0)
+
+
+class MenuSnapshotCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        self.flour = Ingredient.objects.create(name='Flour')
+        self.dish = Dish.objects.create(chef=chef, name='Bread', price=Decimal('3.00'))
+        self.dish.ingredient.add(self.flour)
+
+    def names(self):
+        return [d['name'] for d in self.client.get('/menu/dishes/').json()['dishes']]
+
+    def test_repeat_read_runs_no_queries(self):
+        self.assertEqual(self.names(), ['Bread'])
+        self.client.get('/menu/dishes/?search=bread')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(), ['Bread'])
+            response = self.client.get('/menu/dishes/?search=bread')
+        self.assertEqual([d['name'] for d in response.json()['dishes']], ['Bread'])
+
+    def test_dish_and_ingredient_edits_replace_the_snapshot(self):
+        self.assertEqual(self.names(), ['Bread'])
+        version = menu_cache.get_menu_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dish.name = 'Rye bread'
+            self.dish.save()
+        self.assertNotEqual(menu_cache.get_menu_version(), version)
+        self.assertEqual(self.names(), ['Rye bread'])
+
+        version = menu_cache.get_menu_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flour.name = 'Rye flour'
+            self.flour.save()
+        self.assertNotEqual(menu_cache.get_menu_version(), version)
+        etag = self.client.get('/menu/dishes/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dish.ingredient.remove(self.flour)
+        self.assertEqual(self.client.get('/menu/dishes/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class MenuSearchTests(TestCase):
+    def setUp(self):
+        chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        self.basil = Ingredient.objects.create(name='basil')
+        self.pesto = Dish.objects.create(chef=chef, name='Pesto pasta', price=Decimal('11.00'))
+        self.pesto.ingredient.add(self.basil)
+        self.soup = Dish.objects.create(chef=chef, name='Tomato soup', description='Served with pesto',
+                                        price=Decimal('6.00'))
+
+    def search(self, term):
+        success, message, dishes = MenuService.display_menu(None, 'Visitor', term)
+        return [dish.name for dish in dishes]
+
+    def test_build_match_query_quotes_every_word(self):
+        self.assertEqual(menu_search.build_match_query('Pesto pasta'), '"pesto"* "pasta"*')
+        self.assertEqual(menu_search.build_match_query('say "hi"'), '"say"* "hi"*')
+        self.assertEqual(menu_search.build_match_query('soup OR pasta'), '"soup"* "or"* "pasta"*')
+        self.assertEqual(menu_search.build_match_query('NEAR(soup pasta)'), '"near"* "soup"* "pasta"*')
+        self.assertEqual(menu_search.build_match_query('pesto*'), '"pesto"*')
+        self.assertIsNone(menu_search.build_match_query('"() -*'))
+
+    def test_operator_like_input_is_searched_as_words(self):
+        self.assertEqual(self.search('pesto"'), ['Pesto pasta', 'Tomato soup'])
+        self.assertEqual(self.search('soup OR pasta'), [])
+        self.assertEqual(self.search('NEAR(tomato soup)'), [])
+        self.assertEqual(self.search('"() -*'), [])
+
+    def test_name_matches_rank_above_description_matches(self):
+        if not menu_search.fts_available():
+            self.skipTest('SQLite FTS5 index not available')
+        self.assertEqual(self.search('pesto'), ['Pesto pasta', 'Tomato soup'])
+        self.assertEqual(self.search('pas'), ['Pesto pasta'])
+
+    def test_dish_rename_reindexes(self):
+        self.pesto.name = 'Trofie'
+        self.pesto.save()
+
+        self.assertEqual(self.search('pasta'), [])
+        self.assertEqual(self.search('trofie'), ['Trofie'])
+
+    def test_ingredient_rename_reindexes_its_dishes(self):
+        self.basil.name = 'pine nuts'
+        self.basil.save()
+
+        self.assertEqual(self.search('basil'), [])
+        self.assertEqual(self.search('pine nuts'), ['Pesto pasta'])
+
+    def test_falls_back_to_icontains_without_fts(self):
+        with mock.patch.object(menu_search, 'fts_available', return_value=False):
+            dishes = MenuService._apply_search(Dish.objects.all(), 'basil')[0]
+            self.assertNotIn(menu_search.FTS_TABLE, str(dishes.query))
+            self.assertEqual([dish.name for dish in dishes], ['Pesto pasta'])
+            self.assertEqual(self.search('SOUP'), ['Tomato soup'])
+            self.assertEqual(self.search('pesto'), ['Pesto pasta', 'Tomato soup'])
+
+
+class MenuEntrySerializerTests(TestCase):
+    def setUp(self):
+        chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        for i in range(6):
+            dish = Dish.objects.create(chef=chef, name=f'Dish {i}', price=Decimal('5.00'))
+            dish.ingredient.add(
+                Ingredient.objects.create(name=f'nut {i}', allergens=Allergen.objects.create(name=f'allergen {i}')),
+                Ingredient.objects.create(name=f'salt {i}'),
+            )
+
+    def test_menu_is_serialized_from_one_query(self):
+        with self.assertNumQueries(1):
+            success, message, dishes = MenuService.display_menu(None, 'Visitor')
+            data = MenuDishSerializer(dishes, many=True).data
+
+        self.assertEqual(len(data), 6)
+        self.assertEqual(data[0]['chef_name'], 'Chef')
+        self.assertEqual(data[0]['ingredients_list'], ['nut 0', 'salt 0'])
+        self.assertEqual(data[0]['allergens_list'], ['allergen 0'])
+
+    def test_dish_without_an_entry_falls_back_to_its_relations(self):
+        MenuEntry.objects.filter(dish__name='Dish 1').delete()
+
+        success, message, dishes = MenuService.display_menu(None, 'Visitor')
+        data = {row['name']: row for row in MenuDishSerializer(dishes, many=True).data}
+
+        self.assertEqual(data['Dish 1']['ingredients_list'], ['nut 1', 'salt 1'])
+        self.assertEqual(data['Dish 1']['allergens_list'], ['allergen 1'])
+
+
+class PictureVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        self.dish = Dish.objects.create(chef=chef, name='Soup', price=Decimal('4.00'))
+        self.dish.picture = self.upload('soup.png', (2000, 1000))
+        self.dish.save(update_fields=['picture'])
+
+    @staticmethod
+    def upload(name, size):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'orange').save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_renders_every_size_and_format(self):
+        images.process_dish_picture(self.dish.pk)
+
+        variants = Dish.objects.get(pk=self.dish.pk).picture_variants
+        self.assertEqual(set(variants), set(images.VARIANT_SIZES))
+        for size_name, formats in variants.items():
+            self.assertEqual(set(formats), set(images.VARIANT_FORMATS))
+            for format_name, storage_name in formats.items():
+                with default_storage.open(storage_name) as f, Image.open(f) as image:
+                    self.assertEqual(image.format, images.VARIANT_FORMATS[format_name][0])
+                    self.assertEqual(image.size, (images.VARIANT_SIZES[size_name], images.VARIANT_SIZES[size_name] // 2))
+
+    def test_skips_a_picture_replaced_while_rendering(self):
+        render_variants = images.render_variants
+
+        def replaced_meanwhile(data):
+            self.dish.picture = self.upload('new.png', (300, 300))
+            self.dish.save(update_fields=['picture'])
+            return render_variants(data)
+
+        with mock.patch.object(images, 'render_variants', side_effect=replaced_meanwhile):
+            images.process_dish_picture(self.dish.pk)
+
+        self.assertEqual(Dish.objects.get(pk=self.dish.pk).picture_variants, {})
+
+
+class PopularDishesTests(TestCase):
+    def setUp(self):
+        chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        now, half_life = time.time(), DishPopularity.half_life_seconds()
+        # (name, order_score, rating_score, seconds since score_ts)
+        for name, orders, ratings, age in [
+            ('Stale hit', 10.0, 0.0, 2 * half_life),  # decays to 2.5
+            ('Fresh', 4.0, 0.0, 0),
+            ('Rated', 2.0, 2.0, 0),                   # 2 + 0.5 * 2 = 3
+            ('Disliked', 1.0, -6.0, 0),               # below zero, never shown
+        ]:
+            dish = Dish.objects.create(chef=chef, name=name, price=Decimal('5.00'))
+            DishPopularity.objects.create(dish_id=dish, order_score=orders, rating_score=ratings, score_ts=now - age)
+        Dish.objects.create(chef=chef, name='Never ordered', price=Decimal('5.00'))
+
+    def popular(self, query=''):
+        return self.client.get(f'/menu/dishes/popular/{query}')
+
+    def test_orders_by_the_decayed_score(self):
+        response = self.popular()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([dish['name'] for dish in response.json()['dishes']], ['Fresh', 'Rated', 'Stale hit'])
+
+    def test_respects_limit(self):
+        self.assertEqual([dish['name'] for dish in self.popular('?limit=2').json()['dishes']], ['Fresh', 'Rated'])
+        self.assertEqual(len(self.popular('?limit=0').json()['dishes']), 1)
+        self.assertEqual(self.popular('?limit=many').status_code, 400)
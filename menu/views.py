@@ -1,33 +1,71 @@
+import csv
+import io
 from rest_framework import viewsets, status, decorators, permissions, filters
 from rest_framework.response import Response
+from django.utils.http import parse_etags
 from .models import Dish, Allergen, Chef
 from .serializers import MenuDishSerializer, AllergenSerializer, ChefSerializer
 from .services import MenuService
+from . import cache as menu_cache
+from orders.services import OrderService
 
 class DishViewSet(viewsets.ModelViewSet):
     """
     Unified Endpoint for Menu Operations (UC06, UC19).
     Combines all 'dish_views.py' logic into one standard ViewSet.
     """
-    queryset = Dish.objects.all().select_related('chef')
+    queryset = Dish.objects.all().select_related('chef', 'menu_entry', 'rating_aggregate')
     serializer_class = MenuDishSerializer
     permission_classes = [permissions.AllowAny] 
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'description']
 
+    @staticmethod
+    def _conditional_response(request, etag, build):
+        """
+        Answers 304 when the client's If-None-Match already holds `etag`,
+        otherwise calls build() for the body. Both carry the ETag.
+        """
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(build())
+        response['ETag'] = etag
+        return response
+
     def list(self, request, *args, **kwargs):
         """UC06: Display Menu (Read)"""
         user_type = request.query_params.get('user_type', 'Visitor')
         customer_id = request.query_params.get('customer_id')
+        search = request.query_params.get('search', '').strip()
 
-        success, message, dishes = MenuService.display_menu(customer_id, user_type)
-        
-        serializer = self.get_serializer(dishes, many=True)
-        return Response({
-            "success": success,
-            "message": message,
-            "dishes": serializer.data
-        })
+        allergen_mask = 0
+        if customer_id and user_type != 'Visitor':
+            allergen_mask = menu_cache.get_customer_allergen_mask(customer_id)
+
+        # One snapshot per user type/search is shared by every allergy profile
+        version = menu_cache.get_menu_version()
+        ratings_version = menu_cache.get_ratings_version()
+        key = menu_cache.snapshot_key(version, user_type, search)
+        etag = menu_cache.menu_etag(version, 'list', user_type, allergen_mask, search.lower(), ratings_version)
+
+        def build():
+            snapshot = menu_cache.get_snapshot(key)
+            if snapshot is None:
+                success, message, dishes = MenuService.display_menu(None, user_type, search)
+                serializer = self.get_serializer(dishes, many=True)
+                snapshot = {
+                    "success": success,
+                    "message": message,
+                    "dishes": serializer.data
+                }
+                menu_cache.set_snapshot(key, snapshot)
+            if allergen_mask:
+                snapshot = MenuService.filter_snapshot_for_profile(snapshot, allergen_mask)
+            return MenuService.apply_live_ratings(snapshot, MenuService.live_ratings())
+
+        return self._conditional_response(request, etag, build)
 
     def create(self, request, *args, **kwargs):
         """UC19: Add Dish"""
@@ -41,6 +79,30 @@ class DishViewSet(viewsets.ModelViewSet):
             )
         return Response({"success": False, "error": message}, status=status.HTTP_400_BAD_REQUEST)
 
+    @decorators.action(detail=False, methods=['post'])
+    def bulk_import(self, request):
+        """
+        UC19: Bulk add dishes for one chef.
+        Body: {"chef_id": ..., "dishes": [{name, price, description, special_for_vip, ingredients}, ...]}
+        or multipart with chef_id and a CSV `file` using those column names.
+        """
+        chef_id = request.data.get('chef_id')
+        upload = request.FILES.get('file')
+        if upload:
+            rows = list(csv.DictReader(io.TextIOWrapper(upload, encoding='utf-8-sig')))
+        else:
+            rows = request.data.get('dishes')
+
+        if not chef_id or not isinstance(rows, list) or not rows:
+            return Response({"success": False, "error": "chef_id and a non-empty dishes list or CSV file are required"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        success, message, results = MenuService.bulk_add_dishes(chef_id, rows)
+        return Response(
+            {"success": success, "message": message, "results": results},
+            status=status.HTTP_201_CREATED if success else status.HTTP_400_BAD_REQUEST
+        )
+
     def update(self, request, *args, **kwargs):
         """UC19: Update Dish (Replaces update_dish from dish_views)"""
         dish = self.get_object()
@@ -48,6 +110,15 @@ class DishViewSet(viewsets.ModelViewSet):
         
         return super().update(request, *args, **kwargs)
 
+    def perform_update(self, serializer):
+        old_price = serializer.instance.price
+        dish = serializer.save()
+        if 'picture' in serializer.validated_data:
+            MenuService.schedule_picture_variants(dish)
+        if dish.price != old_price:
+            # Open carts still hold the old unit price
+            OrderService.schedule_repricing([dish.pk])
+
     def destroy(self, request, *args, **kwargs):
         """UC19: Safe Delete"""
         dish = self.get_object()
@@ -76,6 +147,27 @@ class DishViewSet(viewsets.ModelViewSet):
             "dish": MenuDishSerializer(dish).data
         })
 
+    @decorators.action(detail=False, methods=['get'])
+    def popular(self, request):
+        """
+        UC06: "Popular now" section.
+        Usage: /menu/dishes/popular/?user_type=...&customer_id=...&limit=10
+        """
+        user_type = request.query_params.get('user_type', 'Visitor')
+        customer_id = request.query_params.get('customer_id')
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        success, message, dishes = MenuService.popular_dishes(customer_id, user_type, limit)
+        serializer = self.get_serializer(dishes, many=True)
+        return Response({
+            "success": success,
+            "message": message,
+            "dishes": serializer.data
+        })
+
     @decorators.action(detail=False, methods=['get'])
     def chef_dishes(self, request):
         """
@@ -85,17 +177,25 @@ class DishViewSet(viewsets.ModelViewSet):
         chef_id = request.query_params.get('chef_id')
         if not chef_id:
             return Response({"error": "chef_id required"}, status=status.HTTP_400_BAD_REQUEST)
-            
-        dishes = self.get_queryset().filter(chef__pk=chef_id)
-        serializer = self.get_serializer(dishes, many=True)
-        return Response(serializer.data)
+
+        etag = menu_cache.menu_etag(menu_cache.get_menu_version(), 'chef_dishes', chef_id,
+                                    menu_cache.get_ratings_version())
+
+        def build():
+            dishes = self.get_queryset().filter(chef__pk=chef_id)
+            return self.get_serializer(dishes, many=True).data
+
+        return self._conditional_response(request, etag, build)
 
     @decorators.action(detail=False, methods=['get'])
     def allergens(self, request):
         """Helper for Settings page"""
-        allergens = Allergen.objects.all()
-        serializer = AllergenSerializer(allergens, many=True)
-        return Response(serializer.data)
+        etag = menu_cache.menu_etag(menu_cache.get_menu_version(), 'allergens')
+
+        def build():
+            return AllergenSerializer(Allergen.objects.all(), many=True).data
+
+        return self._conditional_response(request, etag, build)
     
 class ChefViewSet(viewsets.ModelViewSet):
     queryset = Chef.objects.all()
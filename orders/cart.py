@@ -0,0 +1,453 @@
+"""
+Write-behind cart cache (UC07).
+
+Pending carts live in a CartStore whose backend is an in-process LRU or,
+when settings.CART_CACHE_ALIAS names a Django cache, that shared cache so
+several workers see the same cart. Add/update/remove mutate the cached cart and return at
+once; a background job then writes it to the customer's pending
+Order/OrderItem rows. Anything that needs those rows (cart GET, checkout)
+calls flush() first, which writes synchronously if the cart is dirty.
+
+A flush writes only the lines this cart changed since it last synced with
+the DB (compared against 'synced'): touched lines are upserted, lines it
+removed are deleted, and lines it never saw (added by another worker) are
+left alone and picked up into the cache. Written lines take the dish's
+current price, so a price edit needs no pass over the cached carts.
+
+Cart state is a plain dict so it pickles into any cache backend:
+
+    {
+        'customer': <Customer pk>,
+        'order': <pending Order pk or None>,
+        'items': {<dish pk>: {'item_id', 'name', 'quantity', 'unit_price'}},
+        'subtotal': <Decimal, kept in step with items by line deltas>,
+        'synced': {<dish pk>: (quantity, unit_price) as last read from or written to the DB},
+        'version': <bumped by every mutation>,
+        'flushed_version': <version last written to the DB>,
+        'flush_scheduled': bool,
+    }
+"""
+
+import copy
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from common.tasks import run_in_background
+from menu import cache as menu_cache
+from menu.models import Dish
+from . import totals
+from .models import Order, OrderItem
+
+LOCK_STRIPES = 64
+
+
+def dish_infos(dish_ids) -> dict:
+    """
+    Cart-relevant dish fields by pk, cached under the menu version so price
+    or availability edits are seen immediately. Unknown ids are left out.
+    Misses are read in one query.
+    """
+    version = menu_cache.get_menu_version()
+    keys = {}
+    for dish_id in dish_ids:
+        try:
+            keys[f'cart:dish:{version}:{int(dish_id)}'] = int(dish_id)
+        except (ValueError, TypeError):
+            continue
+    found = cache.get_many(keys)
+    missing = [pk for key, pk in keys.items() if key not in found]
+    if missing:
+        rows = {row['pk']: row for row in Dish.objects.filter(pk__in=missing).values(
+            'pk', 'name', 'price', 'is_active', 'special_for_vip', 'chef__is_active'
+        )}
+        fresh = {f'cart:dish:{version}:{pk}': rows.get(pk, {}) for pk in missing}
+        cache.set_many(fresh, menu_cache.MENU_CACHE_TIMEOUT)
+        found.update(fresh)
+    return {keys[key]: info for key, info in found.items() if info}
+
+
+def dish_info(dish_id):
+    """Single-dish dish_infos(); None for unknown dishes."""
+    return next(iter(dish_infos([dish_id]).values()), None)
+
+
+def cart_total(state) -> Decimal:
+    """Item subtotal of a cached cart, without touching the DB."""
+    return state['subtotal']
+
+
+class LocalCartBackend:
+    """In-process LRU. Dirty carts are never dropped; they are flushed shortly anyway."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, customer_pk):
+        with self._lock:
+            state = self._entries.get(customer_pk)
+            if state is not None:
+                self._entries.move_to_end(customer_pk)
+            return state
+
+    def set(self, state):
+        with self._lock:
+            self._entries[state['customer']] = state
+            self._entries.move_to_end(state['customer'])
+            overflow = len(self._entries) - self.max_entries
+            for key in list(self._entries):
+                if overflow <= 0:
+                    break
+                if self._entries[key]['version'] == self._entries[key]['flushed_version']:
+                    del self._entries[key]
+                    overflow -= 1
+
+    def delete(self, customer_pk):
+        with self._lock:
+            self._entries.pop(customer_pk, None)
+
+
+class SharedCartBackend:
+    """Django cache alias shared by every worker (e.g. Redis or Memcached)."""
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    @staticmethod
+    def _key(customer_pk):
+        # v2: carts carry 'synced'; older entries are simply not read
+        return f'cart:state:v2:{customer_pk}'
+
+    def get(self, customer_pk):
+        return self.cache.get(self._key(customer_pk))
+
+    def set(self, state):
+        self.cache.set(self._key(state['customer']), state, None)
+
+    def delete(self, customer_pk):
+        self.cache.delete(self._key(customer_pk))
+
+
+class CartStore:
+    """
+    Per-customer mutations are serialized by a striped in-process lock.
+    Across processes, flushes merge per line (see _write_items), and the DB
+    constraint guarantees a single pending order.
+    """
+
+    def __init__(self, backend=None):
+        if backend is None:
+            alias = getattr(settings, 'CART_CACHE_ALIAS', None)
+            backend = SharedCartBackend(alias) if alias else LocalCartBackend(
+                getattr(settings, 'CART_CACHE_MAX_ENTRIES', 10000)
+            )
+        self.backend = backend
+        self._locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
+
+    def _lock(self, customer_pk):
+        return self._locks[customer_pk % LOCK_STRIPES]
+
+    def _peek(self, customer_pk):
+        return self.backend.get(customer_pk)
+
+    def _put(self, state):
+        self.backend.set(state)
+
+    @contextmanager
+    def locked(self, customer_pks):
+        """Holds the locks of several customers at once (stripes taken in order, so no deadlock)."""
+        with ExitStack() as stack:
+            for stripe in sorted({int(pk) % LOCK_STRIPES for pk in customer_pks}):
+                stack.enter_context(self._locks[stripe])
+            yield
+
+    def is_dirty(self, customer_pk) -> bool:
+        """True if the cached cart has changes not yet flushed to the DB."""
+        state = self._peek(int(customer_pk))
+        return state is not None and state['version'] != state['flushed_version']
+
+    def evict(self, customer_pk):
+        customer_pk = int(customer_pk)
+        with self._lock(customer_pk):
+            self.backend.delete(customer_pk)
+
+    def _load(self, customer_pk):
+        """Builds the cart state from the customer's pending order, if any."""
+        state = {
+            'customer': customer_pk, 'order': None, 'items': {}, 'subtotal': Decimal('0'), 'synced': {},
+            'version': 0, 'flushed_version': 0, 'flush_scheduled': False,
+        }
+        order = Order.objects.filter(customer_id_id=customer_pk, status=Order.STATUS_PENDING).only('pk').first()
+        if order is not None:
+            state['order'] = order.pk
+            self._set_lines(state, OrderItem.objects.filter(order_id=order).values_list(
+                'pk', 'dish_id', 'dish_id__name', 'quantity', 'unit_price'
+            ))
+        return state
+
+    @staticmethod
+    def _set_lines(state, lines):
+        """Replaces the cart's items with the DB lines (item pk, dish pk, name, quantity, unit_price)."""
+        state['items'], state['synced'], state['subtotal'] = {}, {}, Decimal('0')
+        for item_id, dish_pk, name, quantity, unit_price in lines:
+            state['items'][dish_pk] = {
+                'item_id': item_id, 'name': name, 'quantity': quantity, 'unit_price': unit_price
+            }
+            state['synced'][dish_pk] = (quantity, unit_price)
+            state['subtotal'] += totals.line_total(unit_price, quantity)
+
+    def get(self, customer_pk):
+        customer_pk = int(customer_pk)
+        state = self._peek(customer_pk)
+        if state is None:
+            with self._lock(customer_pk):
+                state = self._peek(customer_pk)
+                if state is None:
+                    state = self._load(customer_pk)
+                    self._put(state)
+        return state
+
+    # --- mutations ---------------------------------------------------------
+
+    def mutate(self, customer_pk, fn):
+        """
+        Applies fn(state) -> (changed, result) to a copy of the cart under the
+        customer's lock, caches the copy and schedules a write-behind flush
+        when something changed. The cache is not transactional: call this
+        outside transaction.atomic() so a rollback cannot leave it ahead of
+        the DB.
+        """
+        customer_pk = int(customer_pk)
+        with self._lock(customer_pk):
+            state = copy.deepcopy(self.get(customer_pk))
+            changed, result = fn(state)
+            if changed:
+                state['version'] += 1
+                schedule = not state['flush_scheduled']
+                state['flush_scheduled'] = True
+                self._put(state)
+                if schedule:
+                    run_in_background(self.flush, customer_pk)
+            return result
+
+    # State helpers: apply one change to a cart dict, returning (changed, result)
+
+    @staticmethod
+    def add_item(state, dish, quantity=1):
+        item = state['items'].get(dish['pk'])
+        if item is None:
+            item = state['items'][dish['pk']] = {
+                'item_id': None, 'name': dish['name'], 'quantity': 0, 'unit_price': dish['price']
+            }
+        old_line = totals.line_total(item['unit_price'], item['quantity'])
+        item['quantity'] += quantity
+        item['unit_price'] = dish['price']  # refresh in case the price changed
+        state['subtotal'] += totals.line_total(item['unit_price'], item['quantity']) - old_line
+        return True, item['quantity']
+
+    @staticmethod
+    def set_item_quantity(state, dish_pk, quantity):
+        item = state['items'].get(dish_pk)
+        if item is None:
+            return False, False
+        old_line = totals.line_total(item['unit_price'], item['quantity'])
+        if quantity <= 0:
+            del state['items'][dish_pk]
+            state['subtotal'] -= old_line
+        else:
+            item['quantity'] = quantity
+            state['subtotal'] += totals.line_total(item['unit_price'], quantity) - old_line
+        return True, True
+
+    @staticmethod
+    def remove_item(state, dish_pk):
+        item = state['items'].pop(dish_pk, None)
+        if item is not None:
+            state['subtotal'] -= totals.line_total(item['unit_price'], item['quantity'])
+        return item is not None, item
+
+    def add(self, customer_pk, dish, quantity=1):
+        return self.mutate(customer_pk, lambda state: self.add_item(state, dish, quantity))
+
+    def set_quantity(self, customer_pk, dish_pk, quantity):
+        return self.mutate(customer_pk, lambda state: self.set_item_quantity(state, dish_pk, quantity))
+
+    def remove(self, customer_pk, dish_pk):
+        return self.mutate(customer_pk, lambda state: self.remove_item(state, dish_pk))
+
+    def reprice(self, customer_pk, prices):
+        """
+        Applies new unit prices ({dish pk: price}) to a cached cart whose rows
+        were already re-priced in the DB, so neither side is marked dirty.
+        """
+        customer_pk = int(customer_pk)
+        with self._lock(customer_pk):
+            state = self._peek(customer_pk)
+            if state is None:
+                return
+            for dish_pk, price in prices.items():
+                item = state['items'].get(dish_pk)
+                if item is not None and item['unit_price'] != price:
+                    state['subtotal'] += totals.line_total(price, item['quantity']) - totals.line_total(item['unit_price'], item['quantity'])
+                    item['unit_price'] = price
+                if dish_pk in state['synced']:
+                    state['synced'][dish_pk] = (state['synced'][dish_pk][0], price)
+            self._put(state)
+
+    @staticmethod
+    def dish_for_item(state, item_id):
+        """Maps a flushed OrderItem pk back to the dish key it is stored under."""
+        for dish_pk, item in state['items'].items():
+            if item['item_id'] is not None and str(item['item_id']) == str(item_id):
+                return dish_pk
+        return None
+
+    # --- write-behind ------------------------------------------------------
+
+    def flush(self, customer_pk):
+        """
+        Writes the cached cart to its pending Order/OrderItems if it changed
+        since the last flush. Returns the pending Order (or None if the
+        customer has no cart). The write is made on a copy that replaces the
+        cached cart only once its transaction commits; if the write fails
+        the cart is evicted, so the next read reloads it from the DB.
+        """
+        customer_pk = int(customer_pk)
+        with self._lock(customer_pk):
+            state = self._peek(customer_pk)
+            if state is None:
+                return Order.objects.filter(customer_id_id=customer_pk, status=Order.STATUS_PENDING).first()
+            if state['flush_scheduled']:
+                state = {**state, 'flush_scheduled': False}
+                self._put(state)
+            if state['version'] == state['flushed_version']:
+                if state['order'] is None:
+                    return None
+                return Order.objects.filter(pk=state['order'], status=Order.STATUS_PENDING).first()
+
+            flushed = copy.deepcopy(state)
+            try:
+                with transaction.atomic():
+                    order = self._pending_order(customer_pk)
+                    if flushed['order'] is not None and flushed['order'] != order.pk:
+                        # The cached order was checked out meanwhile; rows already
+                        # flushed belong to it, only later additions carry over.
+                        for dish_pk in [pk for pk, item in flushed['items'].items() if item['item_id'] is not None]:
+                            self.remove_item(flushed, dish_pk)
+                        flushed['synced'] = {}
+                    self._apply_current_prices(flushed)
+                    self._write_items(order, flushed)
+            except Exception:
+                self.backend.delete(customer_pk)
+                raise
+
+            flushed['order'] = order.pk
+            flushed['flushed_version'] = flushed['version']
+            # Runs at once outside a transaction; inside one, a rollback keeps the dirty cart
+            transaction.on_commit(lambda: self._publish(flushed))
+            return order
+
+    def _publish(self, flushed):
+        """Caches a flushed cart unless it was evicted or changed again meanwhile."""
+        with self._lock(flushed['customer']):
+            current = self._peek(flushed['customer'])
+            if current is not None and current['version'] == flushed['version']:
+                self._put(flushed)
+
+    @staticmethod
+    def _apply_current_prices(state):
+        """
+        Moves the lines about to be written to the dishes' current prices, so
+        a line priced before a Dish.price edit is never written at the old
+        price. Lines already in the DB are re-priced by orders.repricing.
+        """
+        touched = [dish_pk for dish_pk, item in state['items'].items()
+                   if state['synced'].get(dish_pk) != (item['quantity'], item['unit_price'])]
+        for dish_pk, info in dish_infos(touched).items():
+            item = state['items'][dish_pk]
+            if item['unit_price'] != info['price']:
+                state['subtotal'] += (totals.line_total(info['price'], item['quantity'])
+                                      - totals.line_total(item['unit_price'], item['quantity']))
+                item['unit_price'] = info['price']
+
+    @staticmethod
+    def _pending_order(customer_pk):
+        # unique_pending_order_per_customer: at most one row can win the insert
+        try:
+            with transaction.atomic():
+                order, _ = Order.objects.get_or_create(
+                    customer_id_id=customer_pk,
+                    status=Order.STATUS_PENDING,
+                    defaults={'subtotal': 0, 'total': 0, 'discount_amount': 0}
+                )
+        except IntegrityError:
+            order = Order.objects.get(customer_id_id=customer_pk, status=Order.STATUS_PENDING)
+        return order
+
+    @staticmethod
+    def _write_items(order, state):
+        """
+        Upserts the lines this cart changed since it last synced and deletes
+        the ones it removed, applying their exact delta to the order totals.
+        The cart is then re-synced with every line of the order, including
+        those another worker wrote meanwhile.
+        """
+        synced = state['synced']
+        rows = {row.dish_id_id: row for row in OrderItem.objects.filter(order_id=order).select_related('dish_id').only(
+            'pk', 'order_id', 'dish_id__name', 'quantity', 'unit_price'
+        )}
+        names = {dish_pk: row.dish_id.name for dish_pk, row in rows.items()}
+        to_create, to_update, to_delete = [], [], []
+        delta = Decimal('0')
+
+        for dish_pk, cached in state['items'].items():
+            if synced.get(dish_pk) == (cached['quantity'], cached['unit_price']):
+                continue
+            names[dish_pk] = cached['name']
+            row = rows.get(dish_pk)
+            if row is None:
+                row = rows[dish_pk] = OrderItem(order_id=order, dish_id_id=dish_pk,
+                                                quantity=cached['quantity'], unit_price=cached['unit_price'])
+                to_create.append(row)
+                delta += totals.line_total(row.unit_price, row.quantity)
+            elif row.quantity != cached['quantity'] or row.unit_price != cached['unit_price']:
+                delta -= totals.line_total(row.unit_price, row.quantity)
+                delta += totals.line_total(cached['unit_price'], cached['quantity'])
+                row.quantity = cached['quantity']
+                row.unit_price = cached['unit_price']
+                to_update.append(row)
+
+        for dish_pk in synced:
+            if dish_pk not in state['items'] and dish_pk in rows:
+                row = rows.pop(dish_pk)
+                delta -= totals.line_total(row.unit_price, row.quantity)
+                to_delete.append(row.pk)
+
+        if to_delete:
+            OrderItem.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            # bulk_update() skips auto_now; the reaper reads item activity from updated_at
+            now = timezone.now()
+            for row in to_update:
+                row.updated_at = now
+            OrderItem.objects.bulk_update(to_update, ['quantity', 'unit_price', 'updated_at'])
+        if to_create:
+            OrderItem.objects.bulk_create(to_create)
+
+        CartStore._set_lines(state, sorted(
+            ((row.pk, dish_pk, names[dish_pk], row.quantity, row.unit_price) for dish_pk, row in rows.items()),
+            key=lambda line: line[0],
+        ))
+        refreshed = totals.apply_delta(order.pk, delta)
+        order.subtotal, order.discount_amount, order.total = refreshed.subtotal, refreshed.discount_amount, refreshed.total
+
+
+cart_store = CartStore()
@@ -0,0 +1,109 @@
+"""
+Streaming order export for accounting.
+
+Orders are read with .iterator(chunk_size=EXPORT_CHUNK_SIZE), so only one
+chunk of orders (and the items prefetched for that chunk) is in memory at
+a time, and are written out line by line through a StreamingHttpResponse:
+
+    NDJSON: one JSON object per order with its items nested
+    CSV:    one row per order item, order columns repeated
+"""
+
+import csv
+import json
+from datetime import date, datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import Order, OrderItem
+from .totals import line_total
+
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+ORDER_FIELDS = ['order_id', 'created_at', 'status', 'customer_id', 'customer',
+                'subtotal', 'discount_amount', 'total']
+ITEM_FIELDS = ['item_id', 'dish_id', 'dish_name', 'quantity', 'unit_price', 'line_total']
+
+
+def _day_start(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def export_queryset(start=None, end=None, statuses=None, customer_pk=None):
+    """
+    Orders created on days [start, end] (YYYY-MM-DD strings, both optional)
+    in pk order. Raises ValueError for malformed dates.
+    """
+    queryset = Order.objects.select_related('customer_id__user').only(
+        'pk', 'created_at', 'status', 'subtotal', 'discount_amount', 'total',
+        'customer_id__user__username',
+    ).prefetch_related(Prefetch(
+        'items',
+        queryset=OrderItem.objects.select_related('dish_id').only(
+            'pk', 'order_id', 'quantity', 'unit_price', 'dish_id__name'
+        ).order_by('pk')
+    )).order_by('pk')
+
+    if start:
+        queryset = queryset.filter(created_at__gte=_day_start(date.fromisoformat(start)))
+    if end:
+        queryset = queryset.filter(created_at__lt=_day_start(date.fromisoformat(end) + timedelta(days=1)))
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    if customer_pk is not None:
+        queryset = queryset.filter(customer_id=customer_pk)
+    return queryset
+
+
+def _order_dict(order) -> dict:
+    return {
+        'order_id': order.pk,
+        'created_at': order.created_at,
+        'status': order.status,
+        'customer_id': order.customer_id.pk,
+        'customer': order.customer_id.user.username,
+        'subtotal': order.subtotal,
+        'discount_amount': order.discount_amount,
+        'total': order.total,
+    }
+
+
+def _item_dict(item) -> dict:
+    return {
+        'item_id': item.pk,
+        'dish_id': item.dish_id.pk,
+        'dish_name': item.dish_id.name,
+        'quantity': item.quantity,
+        'unit_price': item.unit_price,
+        'line_total': line_total(item.unit_price, item.quantity),
+    }
+
+
+def ndjson_lines(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    for order in queryset.iterator(chunk_size=chunk_size):
+        row = _order_dict(order)
+        row['items'] = [_item_dict(item) for item in order.items.all()]
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+class _Echo:
+    """File-like object whose write() hands the formatted line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    writer = csv.DictWriter(_Echo(), fieldnames=ORDER_FIELDS + ITEM_FIELDS)
+    yield writer.writeheader()
+    for order in queryset.iterator(chunk_size=chunk_size):
+        row = _order_dict(order)
+        row['created_at'] = row['created_at'].isoformat()
+        items = order.items.all()
+        if not items:
+            yield writer.writerow(row)
+        for item in items:
+            yield writer.writerow({**row, **_item_dict(item)})
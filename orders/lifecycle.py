@@ -0,0 +1,176 @@
+"""
+Order lifecycle (UC07/UC11/UC12).
+
+Every status change goes through transition(): it checks the move against
+TRANSITIONS, applies it with a status-guarded UPDATE (so two racing
+requests cannot both move the same order) and appends an OrderEvent in the
+same transaction. Once that commits, the event is handed to the projections
+registered for its target status (customer stats, VIP promotion, dish
+popularity, driver assignment, delivery tracking, ...), which run in the
+background instead of inside the request.
+
+Each projection runs in its own transaction together with a
+ProjectionCheckpoint row for (event, projection), so it is applied at most
+once per event; a projection that failed, or never ran because the process
+died, is picked up again by replay() (manage.py replay_projections).
+
+    pending -> paid -> assigned -> delivering -> completed
+    pending -> cancelled
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from common.tasks import run_in_background
+from .models import Order, OrderEvent, ProjectionCheckpoint
+
+logger = logging.getLogger(__name__)
+
+TRANSITIONS = {
+    Order.STATUS_PENDING: {Order.STATUS_PAID, Order.STATUS_CANCELLED},
+    Order.STATUS_PAID: {Order.STATUS_ASSIGNED},
+    Order.STATUS_ASSIGNED: {Order.STATUS_DELIVERING},
+    Order.STATUS_DELIVERING: {Order.STATUS_COMPLETED},
+    Order.STATUS_COMPLETED: set(),
+    Order.STATUS_CANCELLED: set(),
+}
+
+_projections = defaultdict(list)
+
+REPLAY_CHUNK_SIZE = 500
+# Younger events are most likely still queued for their first dispatch
+REPLAY_MIN_AGE = timedelta(minutes=5)
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def projection(*statuses):
+    """Registers fn(event) to run in the background after an order enters one of `statuses`."""
+    def register(fn):
+        for status in statuses:
+            _projections[status].append(fn)
+        return fn
+    return register
+
+
+def projection_name(fn) -> str:
+    return f"{fn.__module__}.{fn.__qualname__}"
+
+
+def projection_names() -> dict:
+    """Target status -> names of the projections registered for it."""
+    return {status: [projection_name(fn) for fn in fns] for status, fns in _projections.items() if fns}
+
+
+def can_transition(from_status, to_status) -> bool:
+    return to_status in TRANSITIONS.get(from_status, set())
+
+
+def transition(order_pk, to_status, actor='', updates=None, **payload) -> OrderEvent:
+    """
+    Moves the order to `to_status`, optionally writing extra `updates` in the
+    same UPDATE, and records the event. Raises InvalidTransition if the move
+    is not allowed from the order's current status, or if another request
+    changed the status first.
+    """
+    with transaction.atomic():
+        from_status = Order.objects.filter(pk=order_pk).values_list('status', flat=True).first()
+        if from_status is None:
+            raise InvalidTransition(f"Order {order_pk} does not exist.")
+        if not can_transition(from_status, to_status):
+            raise InvalidTransition(f"Cannot move order {order_pk} from {from_status} to {to_status}.")
+
+        moved = Order.objects.filter(pk=order_pk, status=from_status).update(status=to_status, **(updates or {}))
+        if not moved:
+            raise InvalidTransition(f"Order {order_pk} changed status concurrently.")
+
+        event = OrderEvent.objects.create(
+            order_id_id=order_pk, from_status=from_status, to_status=to_status, actor=actor, payload=payload
+        )
+        if _projections.get(to_status):
+            run_in_background(dispatch, event.pk)
+    return event
+
+
+def transition_many(order_pks, from_status, to_status, actor='', **payload) -> list:
+    """
+    Bulk transition(): moves those of `order_pks` still in `from_status` with
+    one UPDATE and records their events with one insert. Returns the pks
+    that moved.
+    """
+    if not can_transition(from_status, to_status):
+        raise InvalidTransition(f"Cannot move orders from {from_status} to {to_status}.")
+    with transaction.atomic():
+        moved = list(Order.objects.select_for_update().filter(
+            pk__in=order_pks, status=from_status
+        ).values_list('pk', flat=True))
+        if not moved:
+            return []
+        Order.objects.filter(pk__in=moved, status=from_status).update(status=to_status)
+        events = OrderEvent.objects.bulk_create([
+            OrderEvent(order_id_id=pk, from_status=from_status, to_status=to_status, actor=actor, payload=payload)
+            for pk in moved
+        ])
+        if _projections.get(to_status):
+            for event in events:
+                run_in_background(dispatch, event.pk)
+    return moved
+
+
+def dispatch(event_pk) -> list:
+    """
+    Background job: runs every projection registered for the event's target
+    status that has no checkpoint yet. Returns the names of those that failed.
+    """
+    event = OrderEvent.objects.select_related('order_id__customer_id').get(pk=event_pk)
+    done = set(ProjectionCheckpoint.objects.filter(event_id=event_pk).values_list('projection', flat=True))
+    failed = []
+    for fn in _projections.get(event.to_status, []):
+        name = projection_name(fn)
+        if name in done:
+            continue
+        try:
+            with transaction.atomic():
+                try:
+                    # Claimed first, so a concurrent dispatch of the same event waits here or fails
+                    with transaction.atomic():
+                        ProjectionCheckpoint.objects.create(event_id=event, projection=name)
+                except IntegrityError:
+                    continue
+                fn(event)
+        except Exception:
+            # One failing projection must not starve the others; replay() retries it
+            logger.exception("Projection %s failed for order event %s", fn.__qualname__, event_pk)
+            failed.append(name)
+    return failed
+
+
+def unprocessed_events(min_age=REPLAY_MIN_AGE):
+    """Events older than `min_age` that are missing a checkpoint for one of their projections."""
+    missing = Q(pk__in=[])
+    for status, names in projection_names().items():
+        for name in names:
+            checkpoint = ProjectionCheckpoint.objects.filter(event_id=OuterRef('pk'), projection=name)
+            missing |= Q(to_status=status) & ~Exists(checkpoint)
+    return OrderEvent.objects.filter(missing, created_at__lt=timezone.now() - min_age)
+
+
+def replay(min_age=REPLAY_MIN_AGE, chunk_size=REPLAY_CHUNK_SIZE) -> dict:
+    """Re-dispatches every unprocessed event in pk order; already-applied projections are skipped."""
+    report = {'events': 0, 'failed': 0}
+    last_pk = 0
+    while True:
+        pks = list(unprocessed_events(min_age).filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return report
+        last_pk = pks[-1]
+        for pk in pks:
+            report['events'] += 1
+            report['failed'] += bool(dispatch(pk))
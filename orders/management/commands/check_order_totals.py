@@ -0,0 +1,32 @@
+"""
+Verifies the delta-maintained Order totals against a full recompute.
+
+    python manage.py check_order_totals                   # every order
+    python manage.py check_order_totals --status pending  # open carts only
+    python manage.py check_order_totals --fix             # rewrite mismatches
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.services import OrderService
+
+
+class Command(BaseCommand):
+    help = "Compare stored order subtotal/discount/total with a recompute from their items."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', action='append', dest='statuses')
+        parser.add_argument('--fix', action='store_true')
+
+    def handle(self, *args, **options):
+        consistent, msg, data = OrderService.check_order_totals(options['statuses'], fix=options['fix'])
+        for row in data['mismatches']:
+            self.stdout.write(
+                f"Order {row['order_id']}: stored total {row['stored']['total']}, expected {row['expected']['total']}"
+            )
+        if consistent:
+            self.stdout.write(self.style.SUCCESS(msg))
+        elif options['fix']:
+            self.stdout.write(self.style.WARNING(msg))
+        else:
+            raise CommandError(msg)
@@ -0,0 +1,26 @@
+"""
+Reclaims abandoned pending carts (see orders/reaper.py). Checkouts already
+queue a sweep every CART_REAPER_INTERVAL seconds; use this from cron or by hand.
+
+    python manage.py reap_carts                  # settings.CART_ABANDON_TTL_HOURS
+    python manage.py reap_carts --ttl-hours 24 --archive
+"""
+
+from django.core.management.base import BaseCommand
+
+from orders.services import OrderService
+
+
+class Command(BaseCommand):
+    help = "Delete or archive pending carts with no activity within the TTL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl-hours', type=float, dest='ttl_hours')
+        parser.add_argument('--archive', action='store_true', default=None,
+                            help="Cancel carts that have items instead of deleting them.")
+
+    def handle(self, *args, **options):
+        _, msg, metrics = OrderService.reap_abandoned_carts(options['ttl_hours'], options['archive'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{msg} ({metrics['items']} items, {metrics['chunks']} chunks, {metrics['seconds']}s)"
+        ))
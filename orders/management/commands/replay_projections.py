@@ -0,0 +1,24 @@
+"""
+Re-runs order event projections that failed or never ran (see
+orders/lifecycle.py). Projections already applied to an event are skipped,
+so this is safe to run from cron at any interval.
+
+    python manage.py replay_projections
+    python manage.py replay_projections --min-age-minutes 0
+"""
+
+from django.core.management.base import BaseCommand
+
+from orders.services import OrderService
+
+
+class Command(BaseCommand):
+    help = "Apply every order event projection that has no checkpoint yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age-minutes', type=float, dest='min_age',
+                            help="Skip events younger than this (default: 5), which are usually still queued.")
+
+    def handle(self, *args, **options):
+        success, msg, _ = OrderService.replay_projections(options['min_age'])
+        self.stdout.write(self.style.SUCCESS(msg) if success else self.style.WARNING(msg))
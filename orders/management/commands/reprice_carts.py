@@ -0,0 +1,25 @@
+"""
+Brings pending carts up to the current dish prices. Price edits through
+the dish API queue this automatically; run it after edits made elsewhere
+(admin, shell, imports).
+
+    python manage.py reprice_carts              # every dish
+    python manage.py reprice_carts --dish 3 --dish 7
+"""
+
+from django.core.management.base import BaseCommand
+
+from menu.models import Dish
+from orders.services import OrderService
+
+
+class Command(BaseCommand):
+    help = "Re-price pending order items whose unit price no longer matches their dish."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dish', action='append', type=int, dest='dish_ids')
+
+    def handle(self, *args, **options):
+        dish_ids = options['dish_ids'] or list(Dish.objects.values_list('pk', flat=True))
+        _, msg, data = OrderService.reprice_pending_carts(dish_ids)
+        self.stdout.write(self.style.SUCCESS(f"{msg} ({data['items']} items)"))
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_history_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('from_status', models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('assigned', 'Assigned'), ('delivering', 'Delivering'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('to_status', models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('assigned', 'Assigned'), ('delivering', 'Delivering'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('actor', models.CharField(blank=True, default='', max_length=150)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('order_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='orders.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['order_id', 'created_at'], name='orderevent_order_created')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_alter_customer_address'),
+        ('orders', '0004_orderevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'updated_at'], name='order_status_updated'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_existing_events(apps, schema_editor):
+    # Events from before checkpoints were already dispatched; replaying them would apply them twice
+    from orders.lifecycle import projection_names
+
+    OrderEvent = apps.get_model('orders', 'OrderEvent')
+    ProjectionCheckpoint = apps.get_model('orders', 'ProjectionCheckpoint')
+    for status, names in projection_names().items():
+        events = OrderEvent.objects.filter(to_status=status).values_list('pk', flat=True)
+        ProjectionCheckpoint.objects.bulk_create([
+            ProjectionCheckpoint(event_id_id=pk, projection=name)
+            for pk in events.iterator() for name in names
+        ], batch_size=500)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_status_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectionCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('projection', models.CharField(max_length=200)),
+                ('event_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='orders.orderevent')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('event_id', 'projection'), name='projection_checkpoint_once')],
+            },
+        ),
+        migrations.RunPython(mark_existing_events, migrations.RunPython.noop),
+    ]
@@ -29,6 +29,9 @@ class Order(TimeStampedModel):
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     vip_discount_applied = models.BooleanField(default=False)
     free_delivery_applied = models.BooleanField(default=False)
+    # Client-supplied checkout key; a retried checkout with the same key replays checkout_result
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    checkout_result = models.JSONField(null=True, blank=True, editable=False)
 
     class Meta:
         constraints = [
@@ -36,11 +39,68 @@ class Order(TimeStampedModel):
                 fields=['customer_id'], 
                 condition=models.Q(status='pending'), 
                 name='unique_pending_order_per_customer'
+            ),
+            models.UniqueConstraint(
+                fields=['customer_id', 'idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False),
+                name='unique_checkout_key_per_customer'
             )
         ]
+        indexes = [
+            # Order history: one customer's orders, optionally by status, newest first
+            models.Index(fields=['customer_id', 'status', 'created_at'], name='order_customer_status_created'),
+            # Abandoned-cart sweep (orders.reaper): pending orders by last activity
+            models.Index(fields=['status', 'updated_at'], name='order_status_updated'),
+        ]
     
 class OrderItem(TimeStampedModel):
     order_id = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items') 
     dish_id = models.ForeignKey(Dish, on_delete=models.PROTECT) 
     quantity = models.PositiveIntegerField(default=1)
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+
+class OrderEvent(TimeStampedModel):
+    """
+    Append-only log of Order status transitions, written by
+    orders.lifecycle.transition(). Projections consume these rows.
+    """
+    order_id = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='events')
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    actor = models.CharField(max_length=150, blank=True, default='')
+    payload = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order_id', 'created_at'], name='orderevent_order_created'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("OrderEvent rows are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("OrderEvent rows are append-only.")
+
+    def __str__(self):
+        return f"Order {self.order_id_id}: {self.from_status} -> {self.to_status}"
+
+
+class ProjectionCheckpoint(TimeStampedModel):
+    """
+    One row per (OrderEvent, projection) that has been applied, written in
+    the same transaction as the projection's own changes, so a projection
+    runs at most once per event and unprocessed events can be replayed.
+    """
+    event_id = models.ForeignKey(OrderEvent, on_delete=models.CASCADE, related_name='checkpoints')
+    projection = models.CharField(max_length=200)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event_id', 'projection'], name='projection_checkpoint_once'),
+        ]
+
+    def __str__(self):
+        return f"{self.projection} @ event {self.event_id_id}"
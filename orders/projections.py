@@ -0,0 +1,46 @@
+"""
+Order event projections (see orders/lifecycle.py).
+
+Each function keeps a read model in step with order status changes and runs
+in the background after the transition commits.
+"""
+
+from accounts.services import update_customer_after_completed_order
+from delivery.models import Bids, OrderAssignment
+from reputation.services import ReputationService
+from .lifecycle import projection
+from .models import Order
+
+# Order status -> OrderAssignment.status
+ASSIGNMENT_STATUS = {
+    Order.STATUS_DELIVERING: "ON_THE_WAY",
+    Order.STATUS_COMPLETED: "DELIVERED",
+}
+
+
+@projection(Order.STATUS_PAID)
+def dish_popularity(event):
+    ReputationService.record_dish_orders(event.order_id)
+
+
+@projection(Order.STATUS_COMPLETED)
+def customer_stats(event):
+    """UC04: total spent, order count and VIP promotion."""
+    order = event.order_id
+    update_customer_after_completed_order(order.customer_id, order.total)
+
+
+@projection(Order.STATUS_ASSIGNED)
+def driver_assignment(event):
+    """Assigns the driver whose bid the manager picked (payload: bid_id, manager_id)."""
+    bid = Bids.objects.get(pk=event.payload['bid_id'], order_id=event.order_id_id)
+    OrderAssignment.objects.get_or_create(order_id=event.order_id, defaults={
+        'driver_id_id': bid.driver_id_id,
+        'manager_id_id': event.payload['manager_id'],
+        'choosen_price': bid.bid_price,
+    })
+
+
+@projection(*ASSIGNMENT_STATUS)
+def delivery_tracking(event):
+    OrderAssignment.objects.filter(order_id=event.order_id_id).update(status=ASSIGNMENT_STATUS[event.to_status])
@@ -0,0 +1,116 @@
+"""
+Abandoned-cart reaper (UC07).
+
+A pending Order is abandoned once neither it nor any of its items has
+changed for settings.CART_ABANDON_TTL_HOURS. reap_abandoned_carts() walks
+those orders in pk-ordered chunks, each in its own short transaction, so
+the sweep never holds a write lock for longer than one chunk. Empty carts
+are always deleted; carts with items are deleted too, or moved to
+cancelled (keeping their items) when CART_REAPER_ARCHIVE is set.
+
+Checkouts call maybe_schedule_reap(), which queues at most one sweep per
+CART_REAPER_INTERVAL seconds; `manage.py reap_carts` runs one on demand.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from common.tasks import run_in_background
+from . import lifecycle
+from .cart import cart_store
+from .models import Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+REAPER_LOCK_KEY = 'orders:reaper:scheduled'
+
+
+def _settings():
+    return {
+        'ttl': timedelta(hours=getattr(settings, 'CART_ABANDON_TTL_HOURS', 72)),
+        'chunk_size': getattr(settings, 'CART_REAPER_CHUNK_SIZE', 500),
+        'archive': getattr(settings, 'CART_REAPER_ARCHIVE', False),
+    }
+
+
+def abandoned_carts(cutoff):
+    """Pending orders with no order or item activity since `cutoff`."""
+    return (Order.objects
+            .filter(status=Order.STATUS_PENDING, updated_at__lt=cutoff)
+            .exclude(items__updated_at__gte=cutoff))
+
+
+def _reap_chunk(rows, cutoff, archive) -> dict:
+    """Deletes or archives one chunk of (order pk, customer pk, item count) rows."""
+    reclaimed = {'carts': 0, 'items': 0, 'archived': 0}
+    with cart_store.locked(customer_pk for _, customer_pk, _ in rows):
+        rows = [row for row in rows if not cart_store.is_dirty(row[1])]
+        to_delete = [pk for pk, _, item_count in rows if not (archive and item_count)]
+        to_archive = [pk for pk, _, item_count in rows if archive and item_count]
+
+        with transaction.atomic():
+            if to_delete:
+                # Re-check under the write: an add or checkout since the scan keeps the order
+                idle = abandoned_carts(cutoff).filter(pk__in=to_delete)
+                reclaimed['items'] += OrderItem.objects.filter(order_id__in=idle).delete()[0]
+                reclaimed['carts'] += idle.delete()[1].get(Order._meta.label, 0)
+            if to_archive:
+                still_idle = list(abandoned_carts(cutoff).filter(pk__in=to_archive).values_list('pk', flat=True))
+                reclaimed['archived'] += len(lifecycle.transition_many(
+                    still_idle, Order.STATUS_PENDING, Order.STATUS_CANCELLED, actor='reaper', reason='abandoned'
+                ))
+
+        for _, customer_pk, _ in rows:
+            cart_store.evict(customer_pk)
+    return reclaimed
+
+
+def reap_abandoned_carts(ttl=None, chunk_size=None, archive=None) -> dict:
+    """
+    Reclaims pending carts idle for longer than `ttl` (a timedelta).
+    Returns {'carts', 'items', 'archived', 'chunks', 'seconds'}.
+    """
+    defaults = _settings()
+    ttl = defaults['ttl'] if ttl is None else ttl
+    chunk_size = chunk_size or defaults['chunk_size']
+    archive = defaults['archive'] if archive is None else archive
+
+    started = time.monotonic()
+    cutoff = timezone.now() - ttl
+    candidates = (abandoned_carts(cutoff)
+                  .annotate(item_count=Count('items'))
+                  .order_by('pk')
+                  .values_list('pk', 'customer_id', 'item_count'))
+    metrics = {'carts': 0, 'items': 0, 'archived': 0, 'chunks': 0}
+    last_pk = 0
+    while True:
+        rows = list(candidates.filter(pk__gt=last_pk)[:chunk_size])
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        for key, value in _reap_chunk(rows, cutoff, archive).items():
+            metrics[key] += value
+        metrics['chunks'] += 1
+
+    metrics['seconds'] = round(time.monotonic() - started, 3)
+    logger.info(
+        "Cart reaper reclaimed %(carts)s carts, %(items)s items, archived %(archived)s "
+        "in %(chunks)s chunks (%(seconds)ss)", metrics, extra={'metrics': metrics}
+    )
+    return metrics
+
+
+def maybe_schedule_reap() -> bool:
+    """Queues a background sweep unless one was queued within CART_REAPER_INTERVAL seconds."""
+    interval = getattr(settings, 'CART_REAPER_INTERVAL', 3600)
+    if not interval or not cache.add(REAPER_LOCK_KEY, True, interval):
+        return False
+    run_in_background(reap_abandoned_carts)
+    return True
@@ -0,0 +1,97 @@
+"""
+Price-change propagation for pending carts (UC07/UC19).
+
+OrderItem.unit_price is copied when a dish is added, so a Dish.price edit
+leaves open carts stale. reprice_pending_items() walks the pending orders
+holding a stale line for the changed dishes in pk-ordered chunks; per
+chunk it re-prices every matching OrderItem with one UPDATE, recomputes
+the chunk's Order totals from their items and writes them with one
+bulk_update, then patches the cached carts (orders.cart) to match. The
+chunk's cart locks are held throughout so a concurrent write-behind
+flush cannot put the old price back. Lines that only exist in a cached
+cart are not in the walk; CartStore.flush() writes them at the current
+price.
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from menu.models import Dish
+from . import totals
+from .cart import cart_store
+from .models import Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+REPRICE_CHUNK_SIZE = 500
+
+
+def _current_price():
+    return Subquery(Dish.objects.filter(pk=OuterRef('dish_id')).values('price')[:1])
+
+
+def stale_pending_items(dish_ids):
+    """Pending-order lines of `dish_ids` whose unit_price differs from the dish's current price."""
+    return (OrderItem.objects
+            .filter(dish_id__in=dish_ids, order_id__status=Order.STATUS_PENDING)
+            .annotate(current_price=_current_price())
+            .exclude(unit_price=F('current_price')))
+
+
+def _reprice_chunk(order_pks, dish_ids, prices):
+    """Re-prices one chunk of pending orders; returns (orders touched, items updated)."""
+    with transaction.atomic():
+        # Orders checked out since the chunk was read keep the price they were charged
+        orders = list(Order.objects.select_for_update().filter(pk__in=order_pks, status=Order.STATUS_PENDING))
+        if not orders:
+            return 0, 0
+        updated = OrderItem.objects.filter(
+            order_id__in=[order.pk for order in orders], dish_id__in=dish_ids
+        ).update(unit_price=_current_price(), updated_at=timezone.now())
+
+        subtotals = totals.expected_subtotals([order.pk for order in orders])
+        now = timezone.now()
+        for order in orders:
+            order.subtotal = subtotals[order.pk].quantize(totals.CENT)
+            totals.derive(order)
+            order.updated_at = now
+        Order.objects.bulk_update(orders, totals.TOTAL_FIELDS)
+
+    for order in orders:
+        cart_store.reprice(order.customer_id_id, prices)
+    return len(orders), updated
+
+
+def reprice_pending_items(dish_ids, chunk_size=REPRICE_CHUNK_SIZE) -> dict:
+    """
+    Brings every pending cart holding one of `dish_ids` up to the current
+    dish prices. Returns {'dishes', 'carts', 'items'} counts.
+    """
+    dish_ids = [int(pk) for pk in dish_ids]
+    prices = dict(Dish.objects.filter(pk__in=dish_ids).values_list('pk', 'price'))
+    report = {'dishes': len(prices), 'carts': 0, 'items': 0}
+    if not prices:
+        return report
+
+    stale = stale_pending_items(list(prices))
+    last_pk = 0
+    while True:
+        chunk = list(
+            stale.filter(order_id__gt=last_pk)
+            .order_by('order_id')
+            .values_list('order_id', 'order_id__customer_id')
+            .distinct()[:chunk_size]
+        )
+        if not chunk:
+            break
+        last_pk = chunk[-1][0]
+        with cart_store.locked(customer_pk for _, customer_pk in chunk):
+            carts, items = _reprice_chunk([order_pk for order_pk, _ in chunk], list(prices), prices)
+        report['carts'] += carts
+        report['items'] += items
+
+    logger.info("Re-priced %(items)s items in %(carts)s pending carts for %(dishes)s dishes", report)
+    return report
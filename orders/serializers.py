@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Order, OrderItem
+from menu.images import variant_urls
 
 class OrderItemSerializer(serializers.ModelSerializer):
     """
@@ -7,12 +8,16 @@ class OrderItemSerializer(serializers.ModelSerializer):
     """
     dish_name = serializers.CharField(source='dish_id.name', read_only=True)
     dish_image = serializers.ImageField(source='dish_id.picture', read_only=True)
+    dish_image_variants = serializers.SerializerMethodField()
     dish = serializers.IntegerField(source='dish_id.pk', read_only=True)
     subtotal = serializers.SerializerMethodField()
 
     class Meta:
         model = OrderItem
-        fields = ['id', 'dish', 'dish_name', 'dish_image', 'quantity', 'unit_price', 'subtotal']
+        fields = ['id', 'dish', 'dish_name', 'dish_image', 'dish_image_variants', 'quantity', 'unit_price', 'subtotal']
+
+    def get_dish_image_variants(self, obj):
+        return variant_urls(obj.dish_id, self.context.get('request'))
 
     def get_subtotal(self, obj):
         """
@@ -42,4 +47,6 @@ class OrderSerializer(serializers.ModelSerializer):
             'items',
             'subtotal',
             'discount_amount'
-        ]
\ No newline at end of file
+        ]
+        # Status only changes through orders.lifecycle (the transition action)
+        read_only_fields = ['status']
\ No newline at end of file
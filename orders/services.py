@@ -4,27 +4,43 @@ Order Services - UC07: Cart & Checkout Business Logic
 Implements logic from UC07 pseudocode (Phase 1-5).
 """
 
+import base64
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
 from typing import Tuple, Optional, Dict
-from django.db import transaction
-from django.db.models import F
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, DecimalField, ExpressionWrapper, F, Prefetch, Q
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from .models import Order
-from accounts.models import Customer
-from accounts.services import update_customer_after_completed_order
+from accounts.models import Customer, Manager
+from delivery.models import Bids
 
 from menu.models import Dish 
 from orders.models import Order, OrderItem, Customer
+from payments import ledger
+from payments.models import Transactions
+from . import cart, lifecycle, reaper, repricing, totals
+from .cart import CartStore, cart_store
+from common.tasks import run_in_background
 
 
 User = get_user_model()
 
 
+class CheckoutConflict(Exception):
+    """Raised inside checkout when the pending order was already claimed by another request."""
+
+
 class OrderService:
     # Business Rules from UC04/UC05/settings
-    VIP_DISCOUNT_RATE = 0.05
-    STANDARD_DELIVERY_FEE = 5.00
+    VIP_DISCOUNT_RATE = totals.VIP_DISCOUNT_RATE
+    STANDARD_DELIVERY_FEE = totals.STANDARD_DELIVERY_FEE
     FREE_DELIVERY_THRESHOLD = 3 
+    MAX_CART_OPERATIONS = 50
+    HISTORY_PAGE_SIZE = 50
+    MAX_HISTORY_PAGE_SIZE = 100
 
     @classmethod
     def get_or_create_pending_order(cls, customer_id) -> Tuple[bool, str, Optional[Order]]:
@@ -42,113 +58,103 @@ class OrderService:
         return (True, "Cart retrieved" if not created else "New cart created", order)
 
 
+    @staticmethod
+    def cart_totals(order: Order) -> Dict:
+        """UC07: Totals of a pending order, straight from its stored (delta-maintained) columns."""
+        return {
+            'subtotal': order.subtotal,
+            'discount': order.discount_amount,
+            'delivery_fee': totals.delivery_fee(order),
+            'total': order.total,
+            'vip_discount_applied': order.vip_discount_applied,
+            'free_delivery_applied': order.free_delivery_applied,
+        }
+
     @classmethod
     def add_to_cart(cls, customer_id: str, dish_id: str) -> Tuple[bool, str]:
-        """UC07: Add dish to cart (Phase 1 logic)."""
-        
-        try:
-            dish = Dish.objects.get(dish_id=dish_id)
-        except Dish.DoesNotExist:
+        """UC07: Add dish to cart (Phase 1 logic). Applied to the cached cart; the DB is written behind."""
+        dish = cart.dish_info(dish_id)
+        if dish is None:
             return (False, "Dish not found or unavailable.")
-        
-        if not dish.is_active:
-            return (False, f"{dish.name} is currently unavailable.")
-        
-        success, msg, order = cls.get_or_create_pending_order(customer_id)
-        if not success:
-            return (False, msg)
 
-        try:
-            cart_item = OrderItem.objects.get(order_id=order, dish_id=dish)
-            cart_item.quantity = F('quantity') + 1
-            cart_item.save()
-            return (True, f"{dish.name} quantity increased in cart.")
-        except OrderItem.DoesNotExist:
-            OrderItem.objects.create(
-                order_id=order,
-                dish_id=dish,
-                quantity=1,
-                unit_price=dish.price
-            )
-            return (True, f"{dish.name} added to cart.")
-        except Exception as e:
-            return (False, f"Failed to add to cart: {str(e)}")
+        if not dish['is_active']:
+            return (False, f"{dish['name']} is currently unavailable.")
 
+        quantity = cart_store.add(customer_id, dish)
+        if quantity > 1:
+            return (True, f"{dish['name']} quantity increased in cart.")
+        return (True, f"{dish['name']} added to cart.")
+
+
+    @staticmethod
+    def _annotated_items(order: Order, is_vip: bool):
+        """
+        UC07 Exception 2 as a query: the order's items annotated with their
+        line total, dish name and whether they may no longer be ordered
+        (dish or chef inactive, VIP special for a non-VIP).
+        """
+        unavailable = Q(dish_id__is_active=False) | Q(dish_id__chef__is_active=False)
+        if not is_vip:
+            unavailable |= Q(dish_id__special_for_vip=True)
+        return OrderItem.objects.filter(order_id=order).annotate(
+            dish_name=F('dish_id__name'),
+            line_total=ExpressionWrapper(
+                F('unit_price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)
+            ),
+            unavailable=ExpressionWrapper(unavailable, output_field=BooleanField()),
+        ).order_by('pk')
 
     @classmethod
-    def validate_and_format_cart(cls, customer_id: str) -> Tuple[bool, str, Dict]:
+    def validate_and_format_cart(cls, customer_id: str, customer: Optional[Customer] = None) -> Tuple[bool, str, Dict]:
         """UC07: Validates cart, removes unavailable dishes (Exception 2), and calculates totals."""
-        success, msg, order = cls.get_or_create_pending_order(customer_id)
-        if not success: return (False, msg, {})
-        
-        items = list(order.items.all().select_related('dish_id', 'dish_id__chef_id', 'customer_id'))
-        
-        try:
-            customer = Customer.objects.get(customer_id=customer_id)
-            is_vip = customer.get_user_type().lower() == 'vip'
-        except Customer.DoesNotExist:
-            return (False, "Customer not found.", {})
-
-        unavailable_items_removed = []
-        with transaction.atomic():
-            for item in items:
-                dish = item.dish_id
-                is_available = dish.is_active and dish.chef_id.is_active
-                
-                if dish.special_for_vip and not is_vip:
-                    is_available = False
-                
-                if not is_available:
-                    unavailable_items_removed.append(dish.name)
-                    item.delete() 
-            
-            items = list(order.items.all().select_related('dish_id')) 
-        
+        if customer is None:
+            customer = Customer.objects.filter(pk=customer_id).first()
+            if customer is None:
+                return (False, "Customer not found.", {})
+        is_vip = customer.status == Customer.STATUS_VIP
+
+        order = cart_store.flush(customer.pk)
+        if order is None:
+            return (True, "Your cart is empty!", {'items': []})
+
+        # One select: every item with its line total and availability flag
+        rows = list(cls._annotated_items(order, is_vip).values(
+            'pk', 'dish_name', 'unit_price', 'quantity', 'line_total', 'unavailable'
+        ))
+        for row in rows:
+            # SQLite evaluates the product in floating point; line totals are whole cents
+            row['line_total'] = row['line_total'].quantize(totals.CENT)
+        items = [row for row in rows if not row['unavailable']]
+        removed = [row for row in rows if row['unavailable']]
+
+        unavailable_items_removed = [row['dish_name'] for row in removed]
+        if removed:
+            with transaction.atomic():
+                # One delete for all of them, then one delta for the totals
+                OrderItem.objects.filter(pk__in=[row['pk'] for row in removed]).delete()
+                order = totals.apply_delta(order.pk, -sum((row['line_total'] for row in removed), Decimal('0')))
+                # Reload the cached cart so the removed rows are not written back
+                transaction.on_commit(lambda: cart_store.evict(customer.pk))
+
         if not items:
             return (True, "Your cart is empty!", {'items': []})
 
-        #Calculate Totals
-        subtotal = sum(float(item.unit_price) * item.quantity for item in items)
-        discount_amount = 0.0
-        vip_discount_applied = False
-        free_delivery_applied = False
-        delivery_fee = cls.STANDARD_DELIVERY_FEE
-        
-        if is_vip:
-            discount_amount = round(subtotal * cls.VIP_DISCOUNT_RATE, 2)
-            vip_discount_applied = True
-            
-            if (customer.order_count + 1) % cls.FREE_DELIVERY_THRESHOLD == 0:
-                delivery_fee = 0.0
-                free_delivery_applied = True
-            
-        total = subtotal - discount_amount + delivery_fee
-        
-        #Update Order totals in DB 
-        order.subtotal = subtotal
-        order.discount_amount = discount_amount
-        order.total = total
-        order.vip_discount_applied = vip_discount_applied
-        order.free_delivery_applied = free_delivery_applied
-        order.save()
+        # Discount and delivery are derived from the stored subtotal and the VIP flags
+        free_delivery = is_vip and (customer.orders_count + 1) % cls.FREE_DELIVERY_THRESHOLD == 0
+        totals.set_flags(order, vip_discount_applied=is_vip, free_delivery_applied=free_delivery)
 
         #Prepare response data
         formatted_items = [{
-            'item_id': str(item.order_item_id),
-            'dish_name': item.dish_id.name,
-            'price': round(float(item.unit_price), 2),
-            'quantity': item.quantity,
-            'subtotal': round(float(item.unit_price) * item.quantity, 2)
+            'item_id': str(item['pk']),
+            'dish_name': item['dish_name'],
+            'price': item['unit_price'],
+            'quantity': item['quantity'],
+            'subtotal': item['line_total']
         } for item in items]
         
         response_data = {
             'items': formatted_items,
-            'subtotal': round(subtotal, 2),
-            'discount': round(discount_amount, 2),
-            'delivery_fee': round(delivery_fee, 2),
-            'total': round(total, 2),
-            'vip_discount_applied': vip_discount_applied,
-            'free_delivery_applied': free_delivery_applied,
+            **cls.cart_totals(order),
         }
         
         if unavailable_items_removed:
@@ -159,53 +165,276 @@ class OrderService:
 
 
     @classmethod
-    def checkout(cls, customer_id: str) -> Tuple[bool, str, Dict]:
-        """UC07: Phase 4 logic - Final order processing, balance check, and creation."""
-        success, msg, cart_data = cls.validate_and_format_cart(customer_id)
+    def apply_cart_operations(cls, customer: Customer, operations) -> Tuple[bool, str, Dict]:
+        """
+        UC07: Applies several cart operations at once and returns the cart.
+        Each operation is one of:
+            {'op': 'add', 'dish_id': ..., 'quantity': 1}
+            {'op': 'update', 'item_id' or 'dish_id': ..., 'quantity': n}
+            {'op': 'remove', 'item_id' or 'dish_id': ...}
+        The batch is all or nothing: if any operation fails, none is applied
+        and data['results'] says which ones failed.
+        """
+        if not isinstance(operations, list) or not operations:
+            return (False, "operations must be a non-empty list.", {})
+        if len(operations) > cls.MAX_CART_OPERATIONS:
+            return (False, f"At most {cls.MAX_CART_OPERATIONS} operations per request.", {})
+
+        dishes = cart.dish_infos(
+            op.get('dish_id') for op in operations if isinstance(op, dict) and op.get('op') == 'add'
+        )
+
+        def apply(state):
+            # mutate() hands us a copy; it is only cached if every operation succeeded
+            results = [cls._apply_cart_operation(state, op, dishes) for op in operations]
+            return all(result['success'] for result in results), results
+
+        # The cached cart is not transactional: mutate it first, then flush in
+        # its own transaction (a failed flush evicts the cart, see CartStore.flush)
+        results = cart_store.mutate(customer.pk, apply)
+        failed = sum(not result['success'] for result in results)
+        if failed:
+            return (False, f"{failed} of {len(results)} operations failed; the cart was not changed.",
+                    {'results': results})
+        success, msg, data = cls.validate_and_format_cart(customer.pk, customer)
+
+        data['results'] = results
+        return (success, msg, data)
+
+    @staticmethod
+    def _apply_cart_operation(state, op, dishes) -> Dict:
+        """Applies one batch operation to a cached cart; returns its result row."""
+        if not isinstance(op, dict) or op.get('op') not in ('add', 'update', 'remove'):
+            return {'op': None, 'success': False, 'message': "op must be 'add', 'update' or 'remove'."}
+        kind = op['op']
+
+        try:
+            quantity = int(op.get('quantity', 1))
+            dish_pk = int(op['dish_id']) if op.get('dish_id') not in (None, '') else None
+        except (ValueError, TypeError):
+            return {'op': kind, 'success': False, 'message': "quantity and dish_id must be integers."}
+
+        if kind == 'add':
+            dish = dishes.get(dish_pk)
+            if dish is None:
+                return {'op': kind, 'success': False, 'message': "Dish not found or unavailable."}
+            if not dish['is_active']:
+                return {'op': kind, 'success': False, 'message': f"{dish['name']} is currently unavailable."}
+            if quantity <= 0:
+                return {'op': kind, 'success': False, 'message': "Quantity must be greater than 0."}
+            CartStore.add_item(state, dish, quantity)
+            return {'op': kind, 'success': True, 'message': f"{dish['name']} added to cart."}
+
+        if dish_pk is None:
+            dish_pk = CartStore.dish_for_item(state, op.get('item_id'))
+        if dish_pk not in state['items']:
+            return {'op': kind, 'success': False, 'message': "Cart item not found in your pending order."}
+
+        if kind == 'update':
+            if quantity <= 0:
+                return {'op': kind, 'success': False, 'message': "Quantity must be greater than 0."}
+            CartStore.set_item_quantity(state, dish_pk, quantity)
+            return {'op': kind, 'success': True, 'message': "Cart item quantity updated."}
+
+        _, removed = CartStore.remove_item(state, dish_pk)
+        return {'op': kind, 'success': True, 'message': f"'{removed['name']}' removed from cart."}
+
+
+    @classmethod
+    def checkout(cls, customer_id: str, idempotency_key: Optional[str] = None,
+                 customer: Optional[Customer] = None) -> Tuple[bool, str, Dict]:
+        """
+        UC07: Phase 4 logic - Final order processing, balance check, and creation.
+        The balance is debited by one conditional UPDATE (balance >= total), in
+        the same transaction that marks the order paid and records the charge.
+        A retry with the same idempotency_key returns the original result
+        instead of charging again.
+        """
+        if customer is None:
+            customer = Customer.objects.filter(pk=customer_id).first()
+            if customer is None:
+                return (False, "Customer not found.", {})
+
+        if idempotency_key:
+            replay = cls._replay_checkout(customer, idempotency_key)
+            if replay:
+                return replay
+
+        success, msg, cart_data = cls.validate_and_format_cart(customer.pk, customer)
         if not success or not cart_data.get('items'):
-            return (False, "Cannot checkout: Cart is empty or validation failed.", {})
-        
-        final_total = cart_data['total']
-        
+            # A retry racing the first request may find the cart already paid
+            replay = cls._replay_checkout(customer, idempotency_key) if idempotency_key else None
+            return replay or (False, "Cannot checkout: Cart is empty or validation failed.", {})
+
+        order = Order.objects.filter(customer_id=customer, status=Order.STATUS_PENDING).first()
+        if order is None:
+            replay = cls._replay_checkout(customer, idempotency_key) if idempotency_key else None
+            return replay or (False, "This cart has already been checked out.", {})
+
         try:
             with transaction.atomic():
-                customer = Customer.objects.get(customer_id=customer_id)
-
-                #Check Insufficient Balance 
-                if float(customer.balance) < final_total:
-                    cls._handle_insufficient_balance(customer, final_total)
-                    return (False, "Order failed - Insufficient balance. Please add funds.", {})
-
-                #Finalize Order 
-                order = Order.objects.get(customer_id=customer, status=Order.STATUS_PENDING)
-                order.status = Order.STATUS_PAID 
-                order.save()
-                
-                #Reduce Customer Balance
-                customer.balance = F('balance') - final_total
-                
-                #Update VIP order count 
-                if customer.get_user_type().lower() == 'vip':
-                    customer.order_count = F('order_count') + 1
-                
-                customer.save()
-                
-                # 7. Clear Cart by creating a new pending order 
-                Order.objects.create(customer_id=customer, status=Order.STATUS_PENDING)
-
-                return (True, "Order placed successfully!", {'order_id': str(order.order_id)})
-            
-        except Customer.DoesNotExist:
-            return (False, "Customer not found.", {})
-        except Exception as e:
-            return (False, f"An unexpected error occurred during checkout: {str(e)}", {})
+                #Finalize Order: only one checkout can move it out of pending
+                try:
+                    lifecycle.transition(
+                        order.pk, Order.STATUS_PAID, actor=f'customer:{customer.pk}',
+                        updates={'idempotency_key': idempotency_key or None}
+                    )
+                except lifecycle.InvalidTransition:
+                    raise CheckoutConflict()
+
+                # Charge the total as of the transition: a cart flush or repricing may have
+                # changed it since `order` was read, and neither touches orders once paid
+                final_total = Order.objects.filter(pk=order.pk).values_list('total', flat=True).get()
+
+                #Charge the Customer through the ledger (conditional, so concurrent debits cannot overdraw)
+                _, new_balance = ledger.post(
+                    customer.pk, Transactions.TYPE_CHARGE, final_total, order_pk=order.pk, require_funds=True
+                )
+                result = {'order_id': str(order.pk), 'total': str(final_total), 'new_balance': str(new_balance)}
+                Order.objects.filter(pk=order.pk).update(checkout_result=result)
+
+                # 7. Clear Cart: the next add starts a new pending order
+                transaction.on_commit(lambda: cart_store.evict(customer.pk))
+
+        except ledger.InsufficientFunds:
+            cls._handle_insufficient_balance(customer, final_total)
+            return (False, "Order failed - Insufficient balance. Please add funds.", {})
+        except (CheckoutConflict, IntegrityError):
+            # A concurrent request with the same key (or cart) got there first
+            replay = cls._replay_checkout(customer, idempotency_key) if idempotency_key else None
+            return replay or (False, "This cart has already been checked out.", {})
+
+        reaper.maybe_schedule_reap()
+        return (True, "Order placed successfully!", result)
+
+    @staticmethod
+    def _replay_checkout(customer: Customer, idempotency_key: str) -> Optional[Tuple[bool, str, Dict]]:
+        order = Order.objects.filter(customer_id=customer, idempotency_key=idempotency_key).only('checkout_result').first()
+        if order is None or order.checkout_result is None:
+            return None
+        return (True, "Order already placed.", {**order.checkout_result, 'replayed': True})
 
 
     @staticmethod
-    def _handle_insufficient_balance(customer: Customer, required_amount: float):
+    def history_queryset():
+        """Orders with everything OrderSerializer touches loaded in two queries."""
+        return Order.objects.select_related('customer_id__user').prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('dish_id').order_by('pk'))
+        )
+
+    @classmethod
+    def order_history(cls, customer: Customer, statuses=None, cursor: Optional[str] = None,
+                      limit=None) -> Tuple[bool, str, Dict]:
+        """
+        Keyset-paginated order history, newest first. The cursor encodes the
+        (created_at, id) of the last order on the previous page, so every page
+        is an index range scan however deep the customer's history goes.
+        """
+        try:
+            limit = min(max(int(limit or cls.HISTORY_PAGE_SIZE), 1), cls.MAX_HISTORY_PAGE_SIZE)
+        except (ValueError, TypeError):
+            return (False, "limit must be an integer.", {})
+
+        queryset = cls.history_queryset().filter(customer_id=customer)
+        if statuses:
+            queryset = queryset.filter(status__in=statuses)
+        else:
+            queryset = queryset.exclude(status=Order.STATUS_PENDING)
+
+        if cursor:
+            position = cls._decode_cursor(cursor)
+            if position is None:
+                return (False, "Invalid cursor.", {})
+            created_at, pk = position
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+
+        page = list(queryset.order_by('-created_at', '-pk')[:limit + 1])
+        next_cursor = cls._encode_cursor(page[limit - 1]) if len(page) > limit else None
+        return (True, "Order history loaded", {'orders': page[:limit], 'next_cursor': next_cursor})
+
+    @staticmethod
+    def _encode_cursor(order: Order) -> str:
+        raw = json.dumps([order.created_at.isoformat(), order.pk])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str):
+        try:
+            created_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            created_at = datetime.fromisoformat(created_at)
+            return created_at, int(pk)
+        except (ValueError, TypeError):
+            return None
+
+    @staticmethod
+    def check_order_totals(statuses=None, fix: bool = False) -> Tuple[bool, str, Dict]:
+        """
+        Consistency check: compares stored Order subtotal/discount/total with a
+        full recompute from their items. With fix=True, mismatches are rewritten.
+        """
+        queryset = Order.objects.all()
+        if statuses:
+            queryset = queryset.filter(status__in=statuses)
+
+        mismatches = []
+        for order, (subtotal, discount, total) in totals.find_inconsistent(queryset):
+            mismatches.append({
+                'order_id': order.pk,
+                'stored': {'subtotal': subtotal, 'discount': discount, 'total': total},
+                'expected': {'subtotal': order.subtotal, 'discount': order.discount_amount, 'total': order.total},
+            })
+            if fix:
+                totals.repair(order)
+
+        if not mismatches:
+            return (True, "All order totals are consistent.", {'mismatches': []})
+        action = "Repaired" if fix else "Found"
+        return (False, f"{action} {len(mismatches)} orders with inconsistent totals.", {'mismatches': mismatches})
+
+    @staticmethod
+    def reprice_pending_carts(dish_ids) -> Tuple[bool, str, Dict]:
+        """UC19: Moves every pending cart holding one of `dish_ids` to the dishes' current prices."""
+        report = repricing.reprice_pending_items(dish_ids)
+        return (True, f"Re-priced {report['carts']} pending carts.", report)
+
+    @staticmethod
+    def schedule_repricing(dish_ids) -> None:
+        """Queues reprice_pending_carts() to run after the price change commits."""
+        run_in_background(repricing.reprice_pending_items, list(dish_ids))
+
+    @staticmethod
+    def reap_abandoned_carts(ttl_hours=None, archive=None) -> Tuple[bool, str, Dict]:
+        """Deletes (or archives) pending carts idle for longer than the TTL."""
+        ttl = timedelta(hours=ttl_hours) if ttl_hours is not None else None
+        metrics = reaper.reap_abandoned_carts(ttl=ttl, archive=archive)
+        return (True, f"Reclaimed {metrics['carts']} carts, archived {metrics['archived']}.", metrics)
+
+    @staticmethod
+    def replay_projections(min_age_minutes=None) -> Tuple[bool, str, Dict]:
+        """Applies every event projection that failed or never ran."""
+        min_age = timedelta(minutes=min_age_minutes) if min_age_minutes is not None else lifecycle.REPLAY_MIN_AGE
+        report = lifecycle.replay(min_age=min_age)
+        return (not report['failed'], f"Replayed {report['events']} events, {report['failed']} still failing.", report)
+
+    @staticmethod
+    def assignment_payload(order_pk, bid_id, manager_id) -> Tuple[bool, str, Dict]:
+        """
+        Checks the winning bid and the assigning manager for a move to
+        'assigned'; the driver_assignment projection turns the returned
+        event payload into the OrderAssignment.
+        """
+        if not str(bid_id or '').isdigit() or not str(manager_id or '').isdigit():
+            return (False, "bid_id and manager_id are required to assign a driver.", {})
+        if not Bids.objects.filter(pk=bid_id, order_id=order_pk).exists():
+            return (False, "Bid not found for this order.", {})
+        if not Manager.objects.filter(pk=manager_id).exists():
+            return (False, "Manager not found.", {})
+        return (True, "", {'bid_id': int(bid_id), 'manager_id': int(manager_id)})
+
+    @staticmethod
+    def _handle_insufficient_balance(customer: Customer, required_amount: Decimal):
         """UC07: Exception 3 - Issues warning and triggers deregistration check."""
-        customer.warnings = F('warnings') + 1
-        customer.save()
+        Customer.objects.filter(pk=customer.pk).update(warnings=F('warnings') + 1)
         customer.refresh_from_db() 
         
         if customer.warnings >= 3:
@@ -217,45 +446,29 @@ class OrderService:
     @classmethod
     def update_cart_item(cls, customer_id: str, item_id: str, quantity: int) -> Tuple[bool, str]:
         """UC07: Update quantity of an item in the cart."""
-        try:
-            order_item = OrderItem.objects.get(
-                order_item_id=item_id, 
-                order_id__customer_id=customer_id, 
-                order_id__status=Order.STATUS_PENDING
-            )
-        except OrderItem.DoesNotExist:
-            return (False, "Cart item not found in your pending order.")
-        
         if quantity <= 0:
             return (False, "Quantity must be greater than 0.")
-            
-        order_item.quantity = quantity
-        order_item.save()
-        
+
+        dish_pk = CartStore.dish_for_item(cart_store.get(customer_id), item_id)
+        if dish_pk is None or not cart_store.set_quantity(customer_id, dish_pk, quantity):
+            return (False, "Cart item not found in your pending order.")
+
         return (True, "Cart item quantity updated.")
 
     @classmethod
     def remove_cart_item(cls, customer_id: str, item_id: str) -> Tuple[bool, str]:
         """UC07: Remove item from cart."""
-        try:
-            order_item = OrderItem.objects.get(
-                order_item_id=item_id, 
-                order_id__customer_id=customer_id, 
-                order_id__status=Order.STATUS_PENDING
-            )
-            dish_name = order_item.dish_id.name
-            order_item.delete()
-            return (True, f"'{dish_name}' removed from cart.")
-        except OrderItem.DoesNotExist:
+        dish_pk = CartStore.dish_for_item(cart_store.get(customer_id), item_id)
+        removed = cart_store.remove(customer_id, dish_pk) if dish_pk is not None else None
+        if removed is None:
             return (False, "Cart item not found in your pending order.")
+        return (True, f"'{removed['name']}' removed from cart.")
 
 
 def complete_order(order: Order):
-    order.status = Order.STATUS_COMPLETED
-    order.save()
+    """Delivered: customer stats and VIP promotion follow from the event (orders/projections.py)."""
+    lifecycle.transition(order.pk, Order.STATUS_COMPLETED)
 
-    #Update customer stats and VIP status
-    update_customer_after_completed_order(order.customer, float(order.total_price))
 
 def apply_vip_benefits(customer: Customer, order: Order) -> Order:
     """
@@ -1,3 +1,711 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import Customer, Manager
+from common.models import User
+from delivery.models import Bids, Driver, OrderAssignment
+from menu.models import Chef, Dish
+from payments.models import Transactions
+from payments.services import PaymentService
+from .cart import CartStore, LocalCartBackend, SharedCartBackend, cart_store
+from . import cart, export, lifecycle, reaper, repricing, totals
+from .models import Order, OrderEvent, OrderItem, ProjectionCheckpoint
+from .services import OrderService
+
+
+def run_parallel(target, count):
+    """Starts `count` threads on target(i) behind a barrier and returns their results."""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(i):
+        try:
+            barrier.wait()
+            results[i] = target(i)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class CheckoutConcurrencyTests(TransactionTestCase):
+    """UC07: checkout must charge exactly once, however many requests race for it."""
+
+    THREADS = 8
+
+    def setUp(self):
+        cache.clear()
+        cart_store.backend = LocalCartBackend(100)
+        chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        self.dish = Dish.objects.create(chef=chef, name='Soup', price=Decimal('10.00'))
+        self.customer = Customer.objects.create(user=User.objects.create(username='alice'), balance=Decimal('100.00'))
+        OrderService.add_to_cart(self.customer.pk, self.dish.pk)
+        OrderService.add_to_cart(self.customer.pk, self.dish.pk)
+        self.total = OrderService.validate_and_format_cart(self.customer.pk)[2]['total']
+
+    def assertChargedOnce(self, extra_deposits=Decimal('0')):
+        self.customer.refresh_from_db()
+        charges = Transactions.objects.filter(customer_id=self.customer, type=Transactions.TYPE_CHARGE)
+        self.assertEqual(charges.count(), 1)
+        self.assertEqual(charges.get().amount, self.total)
+        self.assertEqual(self.customer.balance, Decimal('100.00') + extra_deposits - self.total)
+        self.assertEqual(Order.objects.filter(customer_id=self.customer, status=Order.STATUS_PAID).count(), 1)
+
+    def test_retries_with_one_key_replay_the_first_result(self):
+        results = run_parallel(lambda i: OrderService.checkout(self.customer.pk, 'retry-key'), self.THREADS)
+
+        self.assertTrue(all(success for success, _, _ in results), results)
+        self.assertEqual({data['order_id'] for _, _, data in results}, {results[0][2]['order_id']})
+        self.assertEqual(sum(1 for _, _, data in results if not data.get('replayed')), 1)
+        self.assertChargedOnce()
+
+    def test_parallel_checkouts_and_deposits_do_not_lose_updates(self):
+        def attempt(i):
+            if i % 2:
+                return PaymentService.process_deposit(self.customer.pk, '1.00')
+            return OrderService.checkout(self.customer.pk, f'key-{i}')
+
+        results = run_parallel(attempt, self.THREADS)
+
+        checkouts = [result for i, result in enumerate(results) if i % 2 == 0]
+        self.assertEqual(sum(1 for success, _, _ in checkouts if success), 1, checkouts)
+        self.assertChargedOnce(extra_deposits=Decimal('1.00') * (self.THREADS // 2))
+
+    def test_insufficient_balance_charges_nothing(self):
+        Customer.objects.filter(pk=self.customer.pk).update(balance=Decimal('1.00'))
+
+        success, _, _ = OrderService.checkout(self.customer.pk, 'poor-key')
+
+        self.assertFalse(success)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.balance, Decimal('1.00'))
+        self.assertEqual(self.customer.warnings, 1)
+        self.assertFalse(Transactions.objects.filter(customer_id=self.customer).exists())
+        self.assertTrue(Order.objects.filter(customer_id=self.customer, status=Order.STATUS_PENDING).exists())
+
+
+class CheckoutTotalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cart_store.backend = LocalCartBackend(100)
+        chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        self.dish = Dish.objects.create(chef=chef, name='Soup', price=Decimal('10.00'))
+        self.customer = Customer.objects.create(user=User.objects.create(username='alice'), balance=Decimal('100.00'))
+        OrderService.add_to_cart(self.customer.pk, self.dish.pk)
+
+    def test_charges_the_total_as_of_the_transition(self):
+        transition = lifecycle.transition
+
+        def total_changes_first(order_pk, *args, **kwargs):
+            # e.g. a repricing committed between checkout reading the order and claiming it
+            Order.objects.filter(pk=order_pk).update(total=Decimal('12.34'))
+            return transition(order_pk, *args, **kwargs)
+
+        with mock.patch.object(lifecycle, 'transition', side_effect=total_changes_first):
+            success, msg, data = OrderService.checkout(self.customer.pk, 'key')
+
+        self.assertTrue(success, msg)
+        self.assertEqual(data['total'], '12.34')
+        self.assertEqual(Transactions.objects.get(type=Transactions.TYPE_CHARGE).amount, Decimal('12.34'))
+        self.assertEqual(Customer.objects.get(pk=self.customer.pk).balance, Decimal('87.66'))
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class OrderTotalsTests(TestCase):
+    """Delta-maintained Order totals agree with a full recompute from the items."""
+
+    def setUp(self):
+        cache.clear()
+        cart_store.backend = LocalCartBackend(100)
+        chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        self.dishes = [Dish.objects.create(chef=chef, name=name, price=Decimal(price))
+                       for name, price in [('Tea', '0.10'), ('Cake', '0.20'), ('Stew', '19.99')]]
+        self.customer = Customer.objects.create(user=User.objects.create(username='alice'))
+
+    def load(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            success, msg, data = OrderService.validate_and_format_cart(self.customer.pk)
+        self.assertTrue(success, msg)
+        return {item['dish_name']: item['item_id'] for item in data['items']}
+
+    def assert_consistent(self):
+        order = Order.objects.get(customer_id=self.customer, status=Order.STATUS_PENDING)
+        expected = totals.expected_subtotals([order.pk])[order.pk]
+        self.assertEqual(order.subtotal, expected)
+        self.assertEqual(cart.cart_total(cart_store.get(self.customer.pk)), expected)
+        self.assertEqual(list(totals.find_inconsistent()), [])
+        return order
+
+    def test_cart_operations_keep_totals_equal_to_a_recompute(self):
+        for status in [Customer.STATUS_REGISTERED, Customer.STATUS_VIP]:
+            Customer.objects.filter(pk=self.customer.pk).update(status=status)
+            tea, cake, stew = (dish.pk for dish in self.dishes)
+            for dish_pk in [tea, tea, tea, cake, stew]:
+                OrderService.add_to_cart(self.customer.pk, dish_pk)
+            ids = self.load()
+            self.assert_consistent()
+
+            self.assertTrue(OrderService.update_cart_item(self.customer.pk, ids['Tea'], 7)[0])
+            self.assertTrue(OrderService.update_cart_item(self.customer.pk, ids['Stew'], 3)[0])
+            self.load()
+            self.assertEqual(self.assert_consistent().subtotal, Decimal('60.87'))
+
+            self.assertTrue(OrderService.remove_cart_item(self.customer.pk, ids['Cake'])[0])
+            OrderService.add_to_cart(self.customer.pk, cake)
+            self.assertTrue(OrderService.remove_cart_item(self.customer.pk, ids['Stew'])[0])
+            self.load()
+            order = self.assert_consistent()
+            self.assertEqual(order.subtotal, Decimal('0.90'))
+
+            for item_id in self.load().values():
+                OrderService.remove_cart_item(self.customer.pk, item_id)
+            self.load()
+            self.assertEqual(self.assert_consistent().total, Decimal('0.00'))
+
+    def test_repair_rewrites_a_corrupted_total(self):
+        OrderService.add_to_cart(self.customer.pk, self.dishes[2].pk)
+        self.load()
+        order = Order.objects.get(customer_id=self.customer)
+        Order.objects.filter(pk=order.pk).update(subtotal=Decimal('1.00'), total=Decimal('6.00'))
+
+        [(recomputed, stored)] = totals.find_inconsistent()
+        self.assertEqual(stored, (Decimal('1.00'), order.discount_amount, Decimal('6.00')))
+        totals.repair(recomputed)
+
+        order.refresh_from_db()
+        self.assertEqual((order.subtotal, order.total), (Decimal('19.99'), Decimal('24.99')))
+        self.assertEqual(list(totals.find_inconsistent()), [])
+
+    def test_check_order_totals_command(self):
+        pending = Order.objects.create(customer_id=self.customer, status=Order.STATUS_PENDING)
+        OrderItem.objects.create(order_id=pending, dish_id=self.dishes[0], quantity=3, unit_price=Decimal('0.10'))
+        done = Order.objects.create(customer_id=self.customer, status=Order.STATUS_COMPLETED,
+                                    subtotal=Decimal('0.20'), total=Decimal('5.20'))
+        OrderItem.objects.create(order_id=done, dish_id=self.dishes[1], quantity=1, unit_price=Decimal('0.20'))
+        out = io.StringIO()
+
+        with self.assertRaisesMessage(CommandError, "Found 1 orders with inconsistent totals."):
+            call_command('check_order_totals', stdout=out)
+        self.assertIn(f"Order {pending.pk}: stored total 0.00, expected 5.30", out.getvalue())
+        call_command('check_order_totals', '--status', Order.STATUS_COMPLETED, stdout=out)
+
+        call_command('check_order_totals', '--fix', stdout=out)
+        self.assertIn("Repaired 1 orders with inconsistent totals.", out.getvalue())
+        pending.refresh_from_db()
+        self.assertEqual((pending.subtotal, pending.total), (Decimal('0.30'), Decimal('5.30')))
+
+        out = io.StringIO()
+        call_command('check_order_totals', stdout=out)
+        self.assertIn("All order totals are consistent.", out.getvalue())
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class CartBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cart_store.backend = LocalCartBackend(100)
+        chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        self.soup = Dish.objects.create(chef=chef, name='Soup', price=Decimal('4.00'))
+        self.bread = Dish.objects.create(chef=chef, name='Bread', price=Decimal('2.50'))
+        self.customer = Customer.objects.create(user=User.objects.create(username='alice'))
+
+    def batch(self, operations):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/orders/cart/batch/', {'customer_id': 'alice', 'operations': operations},
+                                    content_type='application/json')
+
+    def test_applies_every_operation_and_returns_the_cart_once(self):
+        response = self.batch([
+            {'op': 'add', 'dish_id': self.soup.pk, 'quantity': 2},
+            {'op': 'add', 'dish_id': self.bread.pk},
+            {'op': 'update', 'dish_id': self.bread.pk, 'quantity': 3},
+        ])
+
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        self.assertEqual(data['results'], [
+            {'op': 'add', 'success': True, 'message': "Soup added to cart."},
+            {'op': 'add', 'success': True, 'message': "Bread added to cart."},
+            {'op': 'update', 'success': True, 'message': "Cart item quantity updated."},
+        ])
+        self.assertEqual([(item['dish_name'], item['quantity']) for item in data['items']], [('Soup', 2), ('Bread', 3)])
+        self.assertEqual(Decimal(data['subtotal']), Decimal('15.50'))
+
+        bread_item = next(item['item_id'] for item in data['items'] if item['dish_name'] == 'Bread')
+        data = self.batch([{'op': 'remove', 'item_id': bread_item}]).json()
+        self.assertEqual(data['results'], [{'op': 'remove', 'success': True, 'message': "'Bread' removed from cart."}])
+        self.assertEqual(list(OrderItem.objects.values_list('dish_id__name', 'quantity')), [('Soup', 2)])
+
+    def test_one_invalid_operation_rejects_the_whole_batch(self):
+        self.batch([{'op': 'add', 'dish_id': self.soup.pk}])
+        self.bread.is_active = False
+        self.bread.save()
+
+        response = self.batch([
+            {'op': 'update', 'dish_id': self.soup.pk, 'quantity': 5},
+            {'op': 'add', 'dish_id': self.bread.pk},
+            {'op': 'remove', 'item_id': 'nope'},
+            {'op': 'eat'},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        data = response.json()
+        self.assertEqual(data['error'], "3 of 4 operations failed; the cart was not changed.")
+        self.assertEqual([(r['op'], r['success']) for r in data['results']],
+                         [('update', True), ('add', False), ('remove', False), (None, False)])
+        self.assertEqual(data['results'][1]['message'], "Bread is currently unavailable.")
+        self.assertEqual(cart_store.get(self.customer.pk)['items'][self.soup.pk]['quantity'], 1)
+        self.assertEqual(list(OrderItem.objects.values_list('dish_id__name', 'quantity')), [('Soup', 1)])
+
+    def test_rejects_a_malformed_request(self):
+        self.assertEqual(self.batch([]).status_code, 400)
+        self.assertEqual(self.batch([{'op': 'add'}] * (OrderService.MAX_CART_OPERATIONS + 1)).status_code, 400)
+        self.assertEqual(self.client.post('/orders/cart/batch/', {'customer_id': 'bob', 'operations': []},
+                                          content_type='application/json').status_code, 404)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class CartValidationQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cart_store.backend = LocalCartBackend(100)
+        self.chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        self.customer = Customer.objects.create(user=User.objects.create(username='alice'))
+
+    def fill_cart(self, count):
+        start = Dish.objects.count()
+        dishes = [Dish.objects.create(chef=self.chef, name=f'Dish {i}', price=Decimal('3.00'))
+                  for i in range(start, start + count)]
+        OrderService.apply_cart_operations(self.customer, [{'op': 'add', 'dish_id': dish.pk} for dish in dishes])
+        Dish.objects.filter(pk=dishes[0].pk).update(is_active=False)
+        return dishes
+
+    def validate(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return OrderService.validate_and_format_cart(self.customer.pk, self.customer)
+
+    def test_query_count_does_not_grow_with_the_cart(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            dishes = self.fill_cart(3)
+        # Order, annotated items, one delete and one totals update for the dropped dish
+        with self.assertNumQueries(9):
+            success, msg, data = self.validate()
+        self.assertEqual(len(data['items']), 2)
+        self.assertEqual(data['message'], f"Some items were removed from your cart: {dishes[0].name}")
+        self.assertEqual(data['subtotal'], Decimal('6.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dishes = self.fill_cart(8)
+        with self.assertNumQueries(9):
+            success, msg, data = self.validate()
+        self.assertEqual(len(data['items']), 9)
+        self.assertNotIn(dishes[0].name, [item['dish_name'] for item in data['items']])
+        self.assertFalse(OrderItem.objects.filter(dish_id=dishes[0]).exists())
+        self.assertEqual(data['subtotal'], Decimal('27.00'))
+
+
+class OrderHistoryTests(TestCase):
+    def setUp(self):
+        chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        dish = Dish.objects.create(chef=chef, name='Soup', price=Decimal('4.00'))
+        self.customer = Customer.objects.create(user=User.objects.create(username='alice'))
+        noon = timezone.make_aware(datetime(2026, 1, 1, 12))
+        # Two pairs share a timestamp, so paging has to break ties on pk
+        stamps = [noon, noon, noon - timedelta(hours=1), noon - timedelta(hours=2), noon - timedelta(hours=2)]
+        self.orders = []
+        for stamp in stamps:
+            order = Order.objects.create(customer_id=self.customer, status=Order.STATUS_COMPLETED)
+            for quantity in (1, 2):
+                OrderItem.objects.create(order_id=order, dish_id=dish, quantity=quantity, unit_price=dish.price)
+            Order.objects.filter(pk=order.pk).update(created_at=stamp)
+            self.orders.append(order.pk)
+        Order.objects.create(customer_id=self.customer, status=Order.STATUS_PENDING)
+        self.newest_first = [self.orders[i] for i in (1, 0, 2, 4, 3)]
+
+    def page(self, cursor=None, limit=2):
+        query = f'customer_id=alice&limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        return self.client.get(f'/orders/history/?{query}')
+
+    def test_pages_cover_every_order_once_in_a_stable_order(self):
+        seen, cursor = [], None
+        while True:
+            data = self.page(cursor).json()
+            self.assertLessEqual(len(data['orders']), 2)
+            seen += [order['id'] for order in data['orders']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+
+        self.assertEqual(seen, self.newest_first)
+        self.assertEqual([order['id'] for order in self.page(limit=50).json()['orders']], self.newest_first)
+
+    def test_query_count_is_the_same_on_every_page(self):
+        first = self.page()
+        with self.assertNumQueries(3):
+            self.page()
+        with self.assertNumQueries(3):
+            response = self.page(first.json()['next_cursor'])
+        self.assertEqual([len(order['items']) for order in response.json()['orders']], [2, 2])
+
+    def test_malformed_cursor_is_a_bad_request(self):
+        for cursor in ['%%%', 'bm90IGpzb24=', 'WzFd', 'WyJub3QgYSBkYXRlIiwgMV0=']:
+            response = self.page(cursor)
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertEqual(response.json(), {'error': "Invalid cursor."})
+        self.assertEqual(self.page(limit='ten').status_code, 400)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class ReaperTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cart_store.backend = LocalCartBackend(100)
+        chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        self.tea = Dish.objects.create(chef=chef, name='Tea', price=Decimal('2.00'))
+        self.cake = Dish.objects.create(chef=chef, name='Cake', price=Decimal('2.00'))
+        self.long_ago = timezone.now() - timedelta(days=10)
+
+    def cart(self, username, *dishes):
+        """A pending cart whose order and items were last touched ten days ago."""
+        customer = Customer.objects.create(user=User.objects.create(username=username))
+        order = Order.objects.create(customer_id=customer, status=Order.STATUS_PENDING)
+        for dish in dishes:
+            OrderItem.objects.create(order_id=order, dish_id=dish, quantity=1, unit_price=dish.price)
+        Order.objects.filter(pk=order.pk).update(updated_at=self.long_ago)
+        OrderItem.objects.filter(order_id=order).update(updated_at=self.long_ago)
+        return customer, order
+
+    def reap(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return reaper.reap_abandoned_carts(ttl=timedelta(days=3), **kwargs)
+
+    def test_deletes_idle_carts_and_keeps_active_ones(self):
+        self.cart('empty')
+        self.cart('full', self.tea, self.cake)
+        active = Order.objects.create(customer_id=Customer.objects.create(user=User.objects.create(username='now')),
+                                      status=Order.STATUS_PENDING)
+
+        metrics = self.reap(archive=False)
+
+        self.assertEqual((metrics['carts'], metrics['items'], metrics['archived']), (2, 2, 0))
+        self.assertEqual(list(Order.objects.values_list('pk', flat=True)), [active.pk])
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_archive_cancels_carts_with_items_and_deletes_empty_ones(self):
+        _, empty = self.cart('empty')
+        _, full = self.cart('full', self.tea)
+
+        metrics = self.reap(archive=True)
+
+        self.assertEqual((metrics['carts'], metrics['archived']), (1, 1))
+        self.assertFalse(Order.objects.filter(pk=empty.pk).exists())
+        self.assertEqual(Order.objects.get(pk=full.pk).status, Order.STATUS_CANCELLED)
+        self.assertEqual(OrderItem.objects.filter(order_id=full).count(), 1)
+
+    def test_skips_carts_with_unflushed_changes(self):
+        for backend in (LocalCartBackend(100), SharedCartBackend('default')):
+            with self.subTest(backend=type(backend).__name__):
+                cache.clear()
+                cart_store.backend = backend
+                customer, order = self.cart(f'dirty-{type(backend).__name__}', self.tea)
+                with mock.patch.object(cart, 'run_in_background'):
+                    cart_store.add(customer.pk, cart.dish_info(self.cake.pk))
+                self.assertTrue(cart_store.is_dirty(customer.pk))
+
+                self.assertEqual(self.reap(archive=False)['carts'], 0)
+                self.assertTrue(Order.objects.filter(pk=order.pk).exists())
+
+                with self.captureOnCommitCallbacks(execute=True):
+                    cart_store.flush(customer.pk)
+                self.assertEqual(OrderItem.objects.filter(order_id=order).count(), 2)
+
+    def test_rechecks_activity_under_the_write(self):
+        _, deleted = self.cart('a', self.tea)
+        _, archived = self.cart('b', self.tea)
+        reap_chunk = reaper._reap_chunk
+
+        def touched_after_the_scan(rows, cutoff, archive):
+            # e.g. the customer changed the cart between the candidate scan and the chunk
+            OrderItem.objects.filter(order_id=deleted if not archive else archived).update(updated_at=timezone.now())
+            return reap_chunk(rows, cutoff, archive)
+
+        with mock.patch.object(reaper, '_reap_chunk', side_effect=touched_after_the_scan):
+            self.assertEqual(self.reap(archive=False)['carts'], 1)
+            self.assertTrue(Order.objects.filter(pk=deleted.pk).exists())
+            self.assertFalse(Order.objects.filter(pk=archived.pk).exists())
+
+        _, archived = self.cart('c', self.tea)
+        with mock.patch.object(reaper, '_reap_chunk', side_effect=touched_after_the_scan):
+            self.assertEqual(self.reap(archive=True)['archived'], 0)
+        self.assertEqual(Order.objects.get(pk=archived.pk).status, Order.STATUS_PENDING)
+
+    def test_a_flushed_quantity_change_keeps_the_cart(self):
+        customer, order = self.cart('alice', self.tea, self.cake)
+        OrderItem.objects.filter(order_id=order, dish_id=self.tea).update(quantity=2)
+        Order.objects.filter(pk=order.pk).update(subtotal=Decimal('6.00'), total=Decimal('11.00'))
+        # 2 tea + 1 cake -> 1 tea + 2 cake: the order total, and so its row, stays the same
+        with self.captureOnCommitCallbacks(execute=True):
+            cart_store.set_quantity(customer.pk, self.tea.pk, 1)
+            cart_store.set_quantity(customer.pk, self.cake.pk, 2)
+
+        self.assertFalse(cart_store.is_dirty(customer.pk))
+        self.assertEqual(Order.objects.get(pk=order.pk).updated_at, self.long_ago)
+        self.assertEqual(self.reap(archive=False)['carts'], 0)
+        self.assertEqual(sorted(OrderItem.objects.filter(order_id=order).values_list('quantity', flat=True)), [1, 2])
+
+
+class ProjectionTests(TestCase):
+    """Order event projections run once per event and failed ones are replayed."""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(user=User.objects.create(username='alice'))
+        self.order = Order.objects.create(customer_id=self.customer, status=Order.STATUS_DELIVERING, total=Decimal('20.00'))
+
+    def complete(self):
+        return lifecycle.transition(self.order.pk, Order.STATUS_COMPLETED)
+
+    def test_dispatching_an_event_twice_applies_it_once(self):
+        event = self.complete()
+
+        self.assertEqual(lifecycle.dispatch(event.pk), [])
+        self.assertEqual(lifecycle.dispatch(event.pk), [])
+
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.orders_count, 1)
+        self.assertEqual(self.customer.total_spent, Decimal('20.00'))
+        self.assertEqual(
+            ProjectionCheckpoint.objects.filter(event_id=event).count(),
+            len(lifecycle.projection_names()[Order.STATUS_COMPLETED])
+        )
+
+    def test_failed_projection_is_replayed(self):
+        event = self.complete()
+        with mock.patch('orders.projections.update_customer_after_completed_order', side_effect=RuntimeError), \
+                self.assertLogs('orders.lifecycle', 'ERROR'):
+            failed = lifecycle.dispatch(event.pk)
+
+        self.assertEqual(failed, ['orders.projections.customer_stats'])
+        self.assertEqual(list(lifecycle.unprocessed_events(min_age=timedelta(0))), [event])
+        self.assertEqual(list(lifecycle.unprocessed_events()), [])  # too young for the default
+
+        self.assertEqual(lifecycle.replay(min_age=timedelta(0)), {'events': 1, 'failed': 0})
+        self.assertEqual(lifecycle.replay(min_age=timedelta(0)), {'events': 0, 'failed': 0})
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.orders_count, 1)
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_assigning_creates_the_assignment_from_the_bid(self):
+        Order.objects.filter(pk=self.order.pk).update(status=Order.STATUS_PAID)
+        driver = Driver.objects.create(user=User.objects.create(username='driver'))
+        manager = Manager.objects.create(user=User.objects.create(username='manager'))
+        bid = Bids.objects.create(order_id=self.order, driver_id=driver, bid_price=Decimal('4.50'))
+        url = f'/orders/{self.order.pk}/transition/'
+
+        response = self.client.post(url, {'status': 'assigned'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, {'status': 'assigned', 'bid_id': bid.pk + 1, 'manager_id': manager.pk},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'status': 'assigned', 'bid_id': bid.pk, 'manager_id': manager.pk},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        assignment = OrderAssignment.objects.get(order_id=self.order)
+        self.assertEqual((assignment.driver_id, assignment.manager_id, assignment.choosen_price),
+                         (driver, manager, Decimal('4.50')))
+        self.assertEqual(OrderEvent.objects.get(to_status=Order.STATUS_ASSIGNED).payload,
+                         {'bid_id': bid.pk, 'manager_id': manager.pk})
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class RepricingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cart_store.backend = LocalCartBackend(100)
+        chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        self.dish = Dish.objects.create(chef=chef, name='Soup', price=Decimal('10.00'))
+        self.customer = Customer.objects.create(user=User.objects.create(username='alice'))
+
+    def test_unflushed_cart_line_is_written_at_the_new_price(self):
+        for backend in (LocalCartBackend(100), SharedCartBackend('default')):
+            with self.subTest(backend=type(backend).__name__):
+                cart_store.backend = backend
+                Dish.objects.filter(pk=self.dish.pk).update(price=Decimal('10.00'))
+                Order.objects.all().delete()
+                cart_store.evict(self.customer.pk)
+                # Added to the cache only: the write-behind flush has not run yet
+                OrderService.add_to_cart(self.customer.pk, self.dish.pk)
+                self.dish.price = Decimal('12.00')
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.dish.save()
+
+                repricing.reprice_pending_items([self.dish.pk])
+                order = cart_store.flush(self.customer.pk)
+
+                self.assertEqual(order.items.get().unit_price, Decimal('12.00'))
+                self.assertEqual(Order.objects.get(pk=order.pk).subtotal, Decimal('12.00'))
+
+    def test_flushed_lines_are_repriced_in_db_and_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderService.add_to_cart(self.customer.pk, self.dish.pk)
+            order = cart_store.flush(self.customer.pk)
+        Dish.objects.filter(pk=self.dish.pk).update(price=Decimal('12.00'))
+
+        report = repricing.reprice_pending_items([self.dish.pk])
+
+        self.assertEqual((report['carts'], report['items']), (1, 1))
+        self.assertEqual(order.items.get().unit_price, Decimal('12.00'))
+        self.assertEqual(cart_store.get(self.customer.pk)['items'][self.dish.pk]['unit_price'], Decimal('12.00'))
+        self.assertFalse(cart_store.is_dirty(self.customer.pk))
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class CartFlushTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cart_store.backend = LocalCartBackend(100)
+        chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        self.dish = Dish.objects.create(chef=chef, name='Soup', price=Decimal('10.00'))
+        self.customer = Customer.objects.create(user=User.objects.create(username='alice'))
+        OrderService.add_to_cart(self.customer.pk, self.dish.pk)
+
+    def test_failed_flush_evicts_the_cart(self):
+        with mock.patch.object(CartStore, '_write_items', side_effect=RuntimeError('disk full')):
+            with self.assertRaises(RuntimeError):
+                cart_store.flush(self.customer.pk)
+
+        self.assertIsNone(cart_store.backend.get(self.customer.pk))
+        self.assertEqual(cart_store.get(self.customer.pk)['items'], {})
+        self.assertFalse(Order.objects.exists())
+
+    def test_flushed_quantity_change_moves_item_updated_at(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            item = cart_store.flush(self.customer.pk).items.get()
+        OrderItem.objects.filter(pk=item.pk).update(updated_at=timezone.now() - timedelta(days=3))
+
+        cart_store.set_quantity(self.customer.pk, self.dish.pk, 3)
+        cart_store.flush(self.customer.pk)
+
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 3)
+        self.assertGreater(item.updated_at, timezone.now() - timedelta(minutes=1))
+
+    def test_flush_keeps_lines_written_by_another_worker(self):
+        stew = Dish.objects.create(chef=self.dish.chef, name='Stew', price=Decimal('7.00'))
+        cake = Dish.objects.create(chef=self.dish.chef, name='Cake', price=Decimal('3.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            cart_store.flush(self.customer.pk)
+        # A second process with its own cache, loaded before either change below
+        other = CartStore(LocalCartBackend(100))
+        other.get(self.customer.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cart_store.add(self.customer.pk, cart.dish_info(stew.pk))
+            cart_store.flush(self.customer.pk)
+            other.add(self.customer.pk, cart.dish_info(cake.pk))
+            other.remove(self.customer.pk, self.dish.pk)
+            order = other.flush(self.customer.pk)
+
+        self.assertEqual(sorted(order.items.values_list('dish_id__name', 'quantity')), [('Cake', 1), ('Stew', 1)])
+        self.assertEqual(Order.objects.get(pk=order.pk).subtotal, Decimal('10.00'))
+        self.assertEqual(set(other.get(self.customer.pk)['items']), {stew.pk, cake.pk})
+        self.assertEqual(other.get(self.customer.pk)['subtotal'], Decimal('10.00'))
+
+    def test_rolled_back_flush_keeps_the_cart_dirty(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    cart_store.flush(self.customer.pk)
+                    raise RuntimeError('checkout failed')
+
+        self.assertTrue(cart_store.is_dirty(self.customer.pk))
+        self.assertIsNone(cart_store.get(self.customer.pk)['items'][self.dish.pk]['item_id'])
+        self.assertFalse(Order.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = cart_store.flush(self.customer.pk)
+
+        self.assertFalse(cart_store.is_dirty(self.customer.pk))
+        self.assertEqual(cart_store.get(self.customer.pk)['items'][self.dish.pk]['item_id'], order.items.get().pk)
+        self.assertEqual(Order.objects.get(pk=order.pk).subtotal, Decimal('10.00'))
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        self.soup = Dish.objects.create(chef=chef, name='Soup', price=Decimal('4.00'))
+        self.cake = Dish.objects.create(chef=chef, name='Cake', price=Decimal('2.50'))
+        self.alice = Customer.objects.create(user=User.objects.create(username='alice'))
+        self.bob = Customer.objects.create(user=User.objects.create(username='bob'))
+
+    def order(self, customer, created_at, status=Order.STATUS_PAID, items=()):
+        order = Order.objects.create(customer_id=customer, status=status)
+        for dish, quantity in items:
+            OrderItem.objects.create(order_id=order, dish_id=dish, quantity=quantity, unit_price=dish.price)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.make_aware(created_at))
+        return order
+
+    def export(self, query):
+        response = self.client.get(f'/orders/export/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def exported_ids(self, query):
+        return [json.loads(line)['order_id'] for line in self.export(query).splitlines()]
+
+    def test_date_bounds_are_inclusive_days(self):
+        self.order(self.alice, datetime(2024, 1, 1, 23, 59, 59))
+        first = self.order(self.alice, datetime(2024, 1, 2, 0, 0))
+        last = self.order(self.alice, datetime(2024, 1, 3, 23, 59, 59))
+        self.order(self.alice, datetime(2024, 1, 4, 0, 0))
+
+        self.assertEqual(self.exported_ids('start=2024-01-02&end=2024-01-03'), [first.pk, last.pk])
+        self.assertEqual(len(self.exported_ids('end=2024-01-01')), 1)
+        self.assertEqual(len(self.exported_ids('')), 4)
+
+    def test_status_and_customer_filters(self):
+        day = datetime(2024, 1, 2, 12, 0)
+        paid = self.order(self.alice, day)
+        completed = self.order(self.alice, day, status=Order.STATUS_COMPLETED)
+        self.order(self.alice, day, status=Order.STATUS_PENDING)
+        bobs = self.order(self.bob, day)
+
+        self.assertEqual(self.exported_ids('status=paid,completed&customer_id=alice'), [paid.pk, completed.pk])
+        self.assertEqual(self.exported_ids(f'status=paid&customer_id={self.bob.pk}'), [bobs.pk])
+        self.assertEqual(self.client.get('/orders/export/?customer_id=nobody').status_code, 404)
+
+    def test_csv_has_a_header_and_one_row_per_item(self):
+        day = datetime(2024, 1, 2, 12, 0)
+        order = self.order(self.alice, day, items=[(self.soup, 2), (self.cake, 1)])
+        empty = self.order(self.bob, day)
+
+        reader = csv.DictReader(io.StringIO(self.export('as=csv')))
+        rows = [(r['order_id'], r['customer'], r['dish_name'], r['quantity'], r['line_total']) for r in reader]
+
+        self.assertEqual(reader.fieldnames, export.ORDER_FIELDS + export.ITEM_FIELDS)
+        self.assertEqual(rows, [
+            (str(order.pk), 'alice', 'Soup', '2', '8.00'),
+            (str(order.pk), 'alice', 'Cake', '1', '2.50'),
+            (str(empty.pk), 'bob', '', '', ''),
+        ])
+
+    def test_malformed_parameters_are_bad_requests(self):
+        for query in ('start=2024-13-01', 'end=yesterday', 'as=xml', 'as=json'):
+            self.assertEqual(self.client.get(f'/orders/export/?{query}').status_code, 400, query)
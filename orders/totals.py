@@ -0,0 +1,98 @@
+"""
+Order totals (UC05/UC07).
+
+Order.subtotal is maintained incrementally: every OrderItem insert,
+quantity/price change and delete applies its exact Decimal line delta to
+the order row through apply_delta(). Discount, delivery fee and total are
+derived from the stored subtotal and the order's VIP flags, so reading a
+cart's totals is a single-row fetch. find_inconsistent() checks the stored
+values against a full recompute from the items.
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+
+from .models import Order, OrderItem
+
+CENT = Decimal('0.01')
+VIP_DISCOUNT_RATE = Decimal('0.05')
+STANDARD_DELIVERY_FEE = Decimal('5.00')
+
+TOTAL_FIELDS = ['subtotal', 'discount_amount', 'total', 'vip_discount_applied', 'free_delivery_applied', 'updated_at']
+
+
+def line_total(unit_price, quantity) -> Decimal:
+    return Decimal(unit_price) * quantity
+
+
+def delivery_fee(order) -> Decimal:
+    if order.free_delivery_applied or not order.subtotal:
+        return Decimal('0.00')
+    return STANDARD_DELIVERY_FEE
+
+
+def derive(order) -> None:
+    """Sets discount_amount and total on `order` from its subtotal and flags."""
+    subtotal = Decimal(order.subtotal)
+    discount = (subtotal * VIP_DISCOUNT_RATE).quantize(CENT, ROUND_HALF_UP) if order.vip_discount_applied else Decimal('0.00')
+    order.discount_amount = discount
+    order.total = subtotal - discount + delivery_fee(order)
+
+
+def apply_delta(order_pk, delta) -> Order:
+    """Adds an exact line-total delta to the order's subtotal and re-derives the rest."""
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order_pk)
+        if delta:
+            order.subtotal = (Decimal(order.subtotal) + Decimal(delta)).quantize(CENT)
+            derive(order)
+            order.save(update_fields=TOTAL_FIELDS)
+    return order
+
+
+def set_flags(order, vip_discount_applied, free_delivery_applied) -> Order:
+    """Updates the VIP flags (and the derived amounts) only if they changed."""
+    if (order.vip_discount_applied, order.free_delivery_applied) != (vip_discount_applied, free_delivery_applied):
+        order.vip_discount_applied = vip_discount_applied
+        order.free_delivery_applied = free_delivery_applied
+        derive(order)
+        order.save(update_fields=TOTAL_FIELDS)
+    return order
+
+
+def expected_subtotals(order_pks) -> dict:
+    """Full recompute: order pk -> sum of unit_price * quantity, in Decimal."""
+    subtotals = {pk: Decimal('0') for pk in order_pks}
+    rows = OrderItem.objects.filter(order_id__in=order_pks).values_list('order_id', 'unit_price', 'quantity')
+    for order_pk, unit_price, quantity in rows.iterator(chunk_size=2000):
+        subtotals[order_pk] += line_total(unit_price, quantity)
+    return subtotals
+
+
+def find_inconsistent(queryset=None, chunk_size=500):
+    """
+    Yields (order, stored) for orders whose stored subtotal, discount or
+    total disagree with a recompute from their items. `order` carries the
+    recomputed values (pass it to repair()); `stored` is the old
+    (subtotal, discount_amount, total).
+    """
+    queryset = (queryset if queryset is not None else Order.objects.all()).order_by('pk')
+    last_pk = 0
+    while True:
+        orders = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not orders:
+            return
+        last_pk = orders[-1].pk
+        subtotals = expected_subtotals([order.pk for order in orders])
+        for order in orders:
+            stored = (Decimal(order.subtotal), Decimal(order.discount_amount), Decimal(order.total))
+            order.subtotal = subtotals[order.pk]
+            derive(order)
+            if stored != (order.subtotal, order.discount_amount, order.total):
+                yield order, stored
+
+
+def repair(order) -> None:
+    """Saves the recomputed values set on `order` by find_inconsistent()."""
+    order.save(update_fields=TOTAL_FIELDS)
@@ -1,11 +1,13 @@
 from rest_framework import viewsets, status, permissions, decorators
 from rest_framework.response import Response
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from .models import Order, OrderItem
 from .serializers import OrderSerializer, OrderItemSerializer
 from .services import OrderService
-from accounts.models import Customer  
-from menu.models import Dish          
+from . import export, lifecycle
+from .cart import cart_store, cart_total
+from accounts.services import resolve_customer, resolve_customer_pk
 
 class OrderViewSet(viewsets.ModelViewSet):
     """
@@ -17,14 +19,19 @@ class OrderViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Allow filtering orders by customer_id"""
-        queryset = super().get_queryset()
+        queryset = OrderService.history_queryset()
         customer_id_param = self.request.query_params.get('customer_id')
         if customer_id_param:
-            queryset = queryset.filter(customer_id__user__username=customer_id_param) | \
-                       queryset.filter(customer_id__pk=customer_id_param) 
+            customer_pk = resolve_customer_pk(customer_id_param)
+            queryset = queryset.filter(customer_id=customer_pk) if customer_pk else queryset.none()
             
         return queryset
 
+    @staticmethod
+    def _resolve_customer(c_id):
+        """Customer by username, falling back to primary key."""
+        return resolve_customer(c_id)
+
     @decorators.action(detail=False, methods=['get', 'post'])
     def cart(self, request):
         """
@@ -38,98 +45,160 @@ class OrderViewSet(viewsets.ModelViewSet):
             return Response({'error': 'customer_id is required'}, status=status.HTTP_400_BAD_REQUEST)
 
 
-        try:
-            
-            customer = Customer.objects.get(user__username=c_id)
-        except (Customer.DoesNotExist, ValueError):
-            try:
-                
-                customer = Customer.objects.get(pk=c_id)
-            except Customer.DoesNotExist:
+        if request.method == 'GET':
+            customer = self._resolve_customer(c_id)
+            if customer is None:
                 return Response({'error': 'Customer not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        if request.method == 'GET':
-            success, msg, data = OrderService.validate_and_format_cart(customer.pk)
+            success, msg, data = OrderService.validate_and_format_cart(customer.pk, customer)
             if success:
                 return Response(data, status=status.HTTP_200_OK)
             return Response({'error': msg}, status=status.HTTP_404_NOT_FOUND)
 
         if request.method == 'POST':
+            # Adding only needs the pk; the cart itself lives in cart_store
+            customer_pk = resolve_customer_pk(c_id)
+            if customer_pk is None:
+                return Response({'error': 'Customer not found'}, status=status.HTTP_404_NOT_FOUND)
+
             dish_id = request.data.get('dish_id')
             if not dish_id:
                 return Response({'error': 'dish_id is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-            order, created = Order.objects.get_or_create(
-                customer_id=customer,
-                status='Pending',
-                defaults={'total': 0.0, 'subtotal': 0.0}
+            success, msg = OrderService.add_to_cart(customer_pk, dish_id)
+            if not success:
+                return Response({'error': msg}, status=status.HTTP_404_NOT_FOUND)
+            return Response({'message': msg, 'cart_total': cart_total(cart_store.get(customer_pk))}, status=status.HTTP_200_OK)
+
+    @decorators.action(detail=False, methods=['post'], url_path='cart/batch')
+    def cart_batch(self, request):
+        """
+        POST: Apply a list of add/update/remove operations to the pending cart
+        and return the recomputed cart once. If any operation fails, none is
+        applied and the 400 response lists per-operation results.
+        {"customer_id": ..., "operations": [{"op": "add", "dish_id": 3, "quantity": 2}, ...]}
+        """
+        c_id = request.data.get('customer_id')
+        if not c_id:
+            return Response({'error': 'customer_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        customer = self._resolve_customer(c_id)
+        if customer is None:
+            return Response({'error': 'Customer not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        success, msg, data = OrderService.apply_cart_operations(customer, request.data.get('operations'))
+        if not success:
+            return Response({'error': msg, **data}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data, status=status.HTTP_200_OK)
+
+    @decorators.action(detail=False, methods=['get'])
+    def history(self, request):
+        """
+        GET: A customer's past orders, newest first, one page at a time.
+        ?customer_id=&status=paid,completed&limit=50&cursor=<next_cursor from the previous page>
+        """
+        c_id = request.query_params.get('customer_id')
+        if not c_id:
+            return Response({'error': 'customer_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        customer = self._resolve_customer(c_id)
+        if customer is None:
+            return Response({'error': 'Customer not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        statuses = [s for s in request.query_params.get('status', '').split(',') if s]
+        success, msg, data = OrderService.order_history(
+            customer, statuses, request.query_params.get('cursor'), request.query_params.get('limit')
+        )
+        if not success:
+            return Response({'error': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(data['orders'], many=True)
+        return Response({'orders': serializer.data, 'next_cursor': data['next_cursor']}, status=status.HTTP_200_OK)
+
+    @decorators.action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        GET: Stream orders with their items for accounting, without building
+        the response in memory.
+        ?as=ndjson|csv&start=YYYY-MM-DD&end=YYYY-MM-DD&status=paid,completed&customer_id=
+        (`as` rather than `format`, which DRF reserves for content negotiation)
+        """
+        params = request.query_params
+        output = params.get('as', 'ndjson')
+        if output not in export.EXPORT_FORMATS:
+            return Response({'error': f"as must be one of: {', '.join(export.EXPORT_FORMATS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        customer_pk = None
+        if params.get('customer_id'):
+            customer_pk = resolve_customer_pk(params['customer_id'])
+            if customer_pk is None:
+                return Response({'error': 'Customer not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        statuses = [s for s in params.get('status', '').split(',') if s]
+        try:
+            queryset = export.export_queryset(params.get('start'), params.get('end'), statuses, customer_pk)
+        except ValueError:
+            return Response({'error': 'start and end must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if output == 'csv':
+            response = StreamingHttpResponse(export.csv_lines(queryset), content_type='text/csv')
+        else:
+            response = StreamingHttpResponse(export.ndjson_lines(queryset), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="orders.{output}"'
+        return response
+
+    @decorators.action(detail=True, methods=['post'])
+    def transition(self, request, pk=None):
+        """
+        POST: Move an order along its lifecycle, e.g. {"status": "delivering"}.
+        Only the moves in orders.lifecycle.TRANSITIONS are accepted.
+        """
+        to_status = request.data.get('status')
+        if not to_status:
+            return Response({'error': 'status is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        payload = {}
+        if to_status == Order.STATUS_ASSIGNED:
+            # {"status": "assigned", "bid_id": ..., "manager_id": ...}
+            valid, msg, payload = OrderService.assignment_payload(
+                pk, request.data.get('bid_id'), request.data.get('manager_id')
             )
+            if not valid:
+                return Response({'error': msg}, status=status.HTTP_400_BAD_REQUEST)
 
-            try:
-                dish = Dish.objects.get(pk=dish_id)
-                item, created = OrderItem.objects.get_or_create(
-                    order_id=order,
-                    dish_id=dish,
-                    defaults={'unit_price': dish.price, 'quantity': 0}
-                )
-                item.quantity += 1
-                item.unit_price = dish.price #Update the price in case it changed
-                item.save()
-
-                # Recalculate Totals (Simple version)
-                new_total = 0
-                for i in order.items.all():
-                    new_total += (i.unit_price * i.quantity)
-                order.subtotal = new_total
-                order.total = new_total
-                order.save()
-
-                return Response({'message': f"Added {dish.name}", 'cart_total': order.total}, status=status.HTTP_200_OK)
-            except Dish.DoesNotExist:
-                return Response({'error': 'Dish not found'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            event = lifecycle.transition(pk, to_status, actor=str(request.data.get('actor', '')), **payload)
+        except lifecycle.InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response({'order_id': pk, 'from_status': event.from_status, 'status': event.to_status},
+                        status=status.HTTP_200_OK)
 
     @decorators.action(detail=False, methods=['post'])
     def checkout(self, request):
         """
-        Finalize the order and run Promotion Rules.
+        Finalize the order: charge the customer and mark it paid.
         """
         #Validate Customer
         c_id = request.data.get('customer_id')
         if not c_id:
             return Response({'error': 'customer_id required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        #Get the Pending Order
-        order = Order.objects.filter(customer_id__user__username=c_id, status='Pending').first()
-        if not order:
-            order = Order.objects.filter(customer_id__pk=c_id, status='Pending').first()
-            
-        if not order or order.items.count() == 0:
-            return Response({'error': 'Cart is empty or not found'}, status=status.HTTP_400_BAD_REQUEST)
+        customer = self._resolve_customer(c_id)
+        if customer is None:
+            return Response({'error': 'Customer not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        #The promotion logic
-        customer = order.customer_id
-        promoted = False
-        
-        #Rule: Spend > $100 OR > 3 orders
-        past_orders = Order.objects.filter(customer_id=customer, status='Completed').count()
-        
-        if customer.status == 'regular':
-            if order.total > 100.00 or (past_orders >= 3 and customer.warnings == 0):
-                customer.status = 'vip'
-                customer.save()
-                promoted = True
-
-        if customer.balance >= order.total:
-            customer.balance -= order.total
-            customer.save()
-            order.status = 'Completed'
-            order.save()
-            
-            return Response({
-                'message': 'Order placed!',
-                'new_balance': customer.balance,
-                'promoted': promoted,
-                'new_status': customer.status
-            }, status=status.HTTP_200_OK)
-        else:
-            return Response({'error': 'Insufficient funds'}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        # Retries with the same key return the first result instead of charging twice
+        idempotency_key = request.headers.get('Idempotency-Key') or request.data.get('idempotency_key')
+
+        success, msg, data = OrderService.checkout(customer.pk, idempotency_key, customer=customer)
+        if not success:
+            return Response({'error': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Customer stats and VIP promotion are projected from the order's events
+        return Response({
+            'message': 'Order placed!' if not data.get('replayed') else msg,
+            'order_id': data['order_id'],
+            'new_balance': data['new_balance'],
+            'replayed': bool(data.get('replayed')),
+        }, status=status.HTTP_200_OK)
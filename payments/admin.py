@@ -1,4 +1,5 @@
 from django.contrib import admin
-from .models import Transactions
+from .models import Transactions, BalanceSnapshot
 
 admin.site.register(Transactions)
+admin.site.register(BalanceSnapshot)
@@ -0,0 +1,193 @@
+"""
+Customer balance ledger.
+
+Every balance change goes through post(): one conditional F() UPDATE of
+Customer.balance plus one append-only Transactions entry, in a single
+transaction. Deposits and charges on the same account therefore queue on
+the row lock for the length of one UPDATE instead of serializing on a
+Python-side read of the balance.
+
+The ledger is the source of truth. Customer.balance is a running
+BalanceSnapshot plus the signed sum of the entries after it;
+take_snapshots() rolls the snapshots forward from the ledger alone and
+verify() recomputes every balance as snapshot + delta in one query per
+chunk.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts.models import Customer
+from orders.models import Order
+from .models import BalanceSnapshot, Transactions
+
+CENT = Decimal('0.01')
+SNAPSHOT_CHUNK_SIZE = 500
+# Entries younger than this are left for the next snapshot, so a transaction
+# that took its id earlier but committed later is never skipped.
+SNAPSHOT_LAG = timedelta(minutes=5)
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+class InsufficientFunds(Exception):
+    """Raised by post() when a debit with require_funds would overdraw the account."""
+
+
+def signed_amount():
+    """Entry amount as it applies to the balance: credits positive, charges negative."""
+    return Case(
+        When(type__in=Transactions.CREDIT_TYPES, then=F('amount')),
+        default=-F('amount'),
+        output_field=MONEY,
+    )
+
+
+def post(customer_pk, entry_type, amount, order_pk=None, require_funds=False):
+    """
+    Applies one ledger entry and returns (entry, new balance). With
+    require_funds, a debit only succeeds if the balance covers it, else
+    InsufficientFunds is raised and nothing is written. Raises
+    Customer.DoesNotExist for unknown customers.
+    """
+    amount = Decimal(amount)
+    if amount <= 0:
+        raise ValueError("Ledger amounts must be positive.")
+    delta = amount if entry_type in Transactions.CREDIT_TYPES else -amount
+
+    with transaction.atomic():
+        account = Customer.objects.filter(pk=customer_pk)
+        guarded = account.filter(balance__gte=amount) if require_funds and delta < 0 else account
+        if not guarded.update(balance=F('balance') + delta):
+            if account.exists():
+                raise InsufficientFunds()
+            raise Customer.DoesNotExist(f"Customer {customer_pk} does not exist.")
+
+        entry = Transactions.objects.create(
+            customer_id_id=customer_pk, order_id_id=order_pk, type=entry_type, amount=amount
+        )
+        balance = account.values_list('balance', flat=True).get()
+    return entry, balance
+
+
+def refundable(order_pks) -> dict:
+    """
+    order pk -> (customer pk, charged less refunded) for the given orders.
+    Call it inside the transaction that posts the refund: the orders are
+    read with select_for_update (SQLite's IMMEDIATE transactions already
+    hold the write lock), so concurrent refunds on them queue instead of
+    both passing the cap.
+    """
+    owners = dict(Order.objects.select_for_update().filter(pk__in=order_pks).values_list('pk', 'customer_id'))
+    remaining = dict.fromkeys(owners, Decimal('0'))
+    sums = (Transactions.objects.filter(order_id__in=owners, type__in=[Transactions.TYPE_CHARGE, Transactions.TYPE_REFUND])
+            .values_list('order_id', 'type').annotate(total=Sum('amount')))
+    for order_pk, entry_type, total in sums:
+        remaining[order_pk] += total if entry_type == Transactions.TYPE_CHARGE else -total
+    return {pk: (owners[pk], remaining[pk].quantize(CENT)) for pk in owners}
+
+
+def post_many(entries) -> list:
+    """
+    Applies a batch of credit entries [(customer pk, type, amount, order pk)]
+    in one transaction: one bulk insert into the ledger and one UPDATE that
+    adds each customer's summed delta. Returns the created Transactions.
+    """
+    deltas = {}
+    rows = []
+    for customer_pk, entry_type, amount, order_pk in entries:
+        if entry_type not in Transactions.CREDIT_TYPES:
+            raise ValueError("post_many() only applies credits; debits go through post().")
+        if amount <= 0:
+            raise ValueError("Ledger amounts must be positive.")
+        deltas[customer_pk] = deltas.get(customer_pk, Decimal('0')) + amount
+        rows.append(Transactions(customer_id_id=customer_pk, order_id_id=order_pk, type=entry_type, amount=amount))
+    if not rows:
+        return []
+
+    with transaction.atomic():
+        created = Transactions.objects.bulk_create(rows)
+        Customer.objects.filter(pk__in=deltas).update(balance=Case(
+            *[When(pk=pk, then=F('balance') + Value(delta, output_field=MONEY)) for pk, delta in deltas.items()],
+            default=F('balance'), output_field=MONEY,
+        ))
+    return created
+
+
+def _ledger_delta(customer_ref, after, upto=None):
+    """Signed sum of a customer's entries with after < pk (<= upto)."""
+    entries = Transactions.objects.filter(customer_id=customer_ref, pk__gt=after)
+    if upto is not None:
+        entries = entries.filter(pk__lte=upto)
+    return Coalesce(
+        Subquery(entries.order_by().values('customer_id').annotate(total=Sum(signed_amount())).values('total')[:1]),
+        Value(Decimal('0')), output_field=MONEY,
+    )
+
+
+def with_ledger_balance(queryset):
+    """Annotates customers with ledger_balance = snapshot + later entries."""
+    return queryset.annotate(
+        ledger_balance=Coalesce(F('balance_snapshot__balance'), Value(Decimal('0')), output_field=MONEY)
+        + _ledger_delta(OuterRef('pk'), Coalesce(OuterRef('balance_snapshot__through_entry'), Value(0)))
+    )
+
+
+def verify(queryset=None, chunk_size=SNAPSHOT_CHUNK_SIZE):
+    """Yields (customer pk, stored balance, ledger balance) for every account that disagrees."""
+    queryset = with_ledger_balance(queryset if queryset is not None else Customer.objects.all()).order_by('pk')
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk).values_list('pk', 'balance', 'ledger_balance')[:chunk_size])
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        for pk, stored, expected in rows:
+            expected = Decimal(expected).quantize(CENT)
+            if stored != expected:
+                yield pk, stored, expected
+
+
+def repair(customer_pk, stored, expected) -> bool:
+    """Resets a drifted balance to the ledger's, unless it moved since it was read."""
+    return bool(Customer.objects.filter(pk=customer_pk, balance=stored).update(balance=expected))
+
+
+def take_snapshots(chunk_size=SNAPSHOT_CHUNK_SIZE, lag=SNAPSHOT_LAG) -> dict:
+    """
+    Rolls every snapshot forward to the newest entry older than `lag`,
+    computing the new balance from the previous snapshot and the ledger
+    only (never from Customer.balance, so drift is not baked in).
+    """
+    through = Transactions.objects.filter(created_at__lt=timezone.now() - lag).aggregate(last=Max('pk'))['last']
+    report = {'through_entry': through or 0, 'snapshots': 0}
+    if through is None:
+        return report
+
+    queryset = Customer.objects.annotate(
+        snapshot_balance=Coalesce(F('balance_snapshot__balance'), Value(Decimal('0')), output_field=MONEY),
+        delta=_ledger_delta(OuterRef('pk'), Coalesce(OuterRef('balance_snapshot__through_entry'), Value(0)), through),
+    ).exclude(balance_snapshot__through_entry__gte=through).order_by('pk')
+
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk).values_list('pk', 'snapshot_balance', 'delta')[:chunk_size])
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        snapshots = [
+            BalanceSnapshot(customer_id_id=pk, balance=(Decimal(base) + Decimal(delta)).quantize(CENT),
+                            through_entry=through, updated_at=timezone.now())
+            for pk, base, delta in rows
+        ]
+        BalanceSnapshot.objects.bulk_create(
+            snapshots, update_conflicts=True, unique_fields=['customer_id'],
+            update_fields=['balance', 'through_entry', 'updated_at'],
+        )
+        report['snapshots'] += len(snapshots)
+    return report
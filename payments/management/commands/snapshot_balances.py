@@ -0,0 +1,18 @@
+"""
+Rolls the per-customer balance snapshots forward from the ledger. Run it
+periodically (e.g. nightly) so verification only reads recent entries.
+
+    python manage.py snapshot_balances
+"""
+
+from django.core.management.base import BaseCommand
+
+from payments.services import PaymentService
+
+
+class Command(BaseCommand):
+    help = "Advance BalanceSnapshot rows to the latest settled Transactions entry."
+
+    def handle(self, *args, **options):
+        _, msg, _ = PaymentService.snapshot_balances()
+        self.stdout.write(self.style.SUCCESS(msg))
@@ -0,0 +1,29 @@
+"""
+Verifies every Customer.balance against the ledger (latest snapshot plus
+the Transactions entries after it).
+
+    python manage.py verify_balances        # report mismatches
+    python manage.py verify_balances --fix  # reset drifted balances to the ledger's
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.services import PaymentService
+
+
+class Command(BaseCommand):
+    help = "Recompute customer balances from the Transactions ledger and compare."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true')
+
+    def handle(self, *args, **options):
+        consistent, msg, data = PaymentService.verify_balances(fix=options['fix'])
+        for row in data['mismatches']:
+            self.stdout.write(f"Customer {row['customer_id']}: stored {row['stored']}, ledger {row['expected']}")
+        if consistent:
+            self.stdout.write(self.style.SUCCESS(msg))
+        elif options['fix']:
+            self.stdout.write(self.style.WARNING(msg))
+        else:
+            raise CommandError(msg)
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def open_balances(apps, schema_editor):
+    # Balances from before the ledger become each account's opening snapshot
+    Customer = apps.get_model('accounts', 'Customer')
+    Transactions = apps.get_model('payments', 'Transactions')
+    BalanceSnapshot = apps.get_model('payments', 'BalanceSnapshot')
+
+    through = Transactions.objects.aggregate(last=models.Max('pk'))['last'] or 0
+    BalanceSnapshot.objects.bulk_create([
+        BalanceSnapshot(customer_id_id=pk, balance=balance, through_entry=through)
+        for pk, balance in Customer.objects.values_list('pk', 'balance').iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_alter_customer_address'),
+        ('payments', '0002_alter_transactions_amount_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance_snapshot', serialize=False, to='accounts.customer')),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('through_entry', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
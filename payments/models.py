@@ -4,6 +4,10 @@ from accounts.models import Customer
 from orders.models import Order
 
 class Transactions(TimeStampedModel):
+    """
+    The balance ledger: one append-only entry per balance change, written
+    by payments.ledger.post() in the same transaction as the balance update.
+    """
     TYPE_DEPOSIT = "deposit"
     TYPE_CHARGE = "charge"
     TYPE_REFUND = "refund"
@@ -14,6 +18,9 @@ class Transactions(TimeStampedModel):
         (TYPE_REFUND, "Refund"),
     ]
 
+    # Types that add to the balance; the rest subtract
+    CREDIT_TYPES = (TYPE_DEPOSIT, TYPE_REFUND)
+
     customer_id = models.ForeignKey(Customer, on_delete=models.PROTECT)
     
     order_id = models.ForeignKey(Order, on_delete=models.PROTECT, null=True, blank=True)
@@ -21,5 +28,31 @@ class Transactions(TimeStampedModel):
     amount = models.DecimalField(max_digits=10, decimal_places=2, default=0) 
     type = models.CharField(max_length=10, choices=TYPE_CHOICES)
 
+    @property
+    def signed_amount(self):
+        return self.amount if self.type in self.CREDIT_TYPES else -self.amount
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Transactions rows are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Transactions rows are append-only.")
+
+    def __str__(self):
+        return f"{self.type.upper()} - ${self.amount} ({self.customer_id.user.username})"
+
+
+class BalanceSnapshot(TimeStampedModel):
+    """
+    Ledger checkpoint: the customer's balance after every Transactions entry
+    up to and including `through_entry`. Customer.balance must equal this
+    plus the signed sum of the customer's later entries (payments.ledger.verify).
+    """
+    customer_id = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='balance_snapshot')
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    through_entry = models.PositiveBigIntegerField(default=0)
+
     def __str__(self):
-        return f"{self.type.upper()} - ${self.amount} ({self.customer_id.user.username})"
\ No newline at end of file
+        return f"Snapshot({self.customer_id_id}: ${self.balance} through #{self.through_entry})"
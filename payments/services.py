@@ -1,39 +1,181 @@
-from decimal import Decimal
-from django.db import transaction
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Tuple
+from django.db import DatabaseError, transaction
 from .models import Transactions
+from . import ledger
 from accounts.models import Customer
+from accounts.services import resolve_customer_pk, resolve_customer_pks
 
 class PaymentService:
+    MAX_DEPOSIT = Decimal('100000')
+    BULK_TYPES = (Transactions.TYPE_DEPOSIT, Transactions.TYPE_REFUND)
+    MAX_BULK_ENTRIES = 10000
+    BULK_CHUNK_SIZE = 500
+
     @staticmethod
-    def process_deposit(customer_id, amount):
+    def _parse_amount(amount):
         try:
             amount = Decimal(str(amount))
-            if amount <= 0:
-                return False, "Deposit must be positive."
-            if amount >= 100000:
-                return False, "Deposit limit exceeded."
-        except (ValueError, TypeError):
-             return False, "Invalid amount."
+        except (InvalidOperation, ValueError, TypeError):
+            return None
+        return amount if amount.is_finite() else None
+
+    @classmethod
+    def process_deposit(cls, customer_id, amount):
+        amount = cls._parse_amount(amount)
+        if amount is None:
+            return False, "Invalid amount."
+        if amount <= 0:
+            return False, "Deposit must be positive."
+        if amount >= cls.MAX_DEPOSIT:
+            return False, "Deposit limit exceeded."
+
+        customer_pk = resolve_customer_pk(customer_id)
+        if customer_pk is None:
+            return False, f"Customer '{customer_id}' not found."
 
         try:
-            customer = Customer.objects.get(user__username=str(customer_id))
-        except Customer.DoesNotExist:
-            try:
-                customer = Customer.objects.get(pk=customer_id)
-            except (Customer.DoesNotExist, ValueError):
-                return False, f"Customer '{customer_id}' not found."
+            # One conditional UPDATE plus the ledger entry; never overwrites a concurrent debit
+            _, balance = ledger.post(customer_pk, Transactions.TYPE_DEPOSIT, amount)
+            return True, f"Deposited ${amount}. New Balance: ${balance}"
+        except Exception as e:
+            return False, f"Transaction failed: {str(e)}"
+
+    @classmethod
+    def process_refund(cls, customer_id, amount, order_id=None):
+        """Credits a refund, capped at what was charged for `order_id` less earlier refunds."""
+        amount = cls._parse_amount(amount)
+        if amount is None:
+            return False, "Invalid amount."
+        if amount <= 0:
+            return False, "Refund must be positive."
+        if order_id == '':
+            order_id = None
+        if order_id is not None:
+            if not str(order_id).isdigit():
+                return False, "Invalid order_id."
+            order_id = int(order_id)
+
+        customer_pk = resolve_customer_pk(customer_id)
+        if customer_pk is None:
+            return False, f"Customer '{customer_id}' not found."
 
         try:
+            # The cap is read and the refund posted under one lock, so concurrent refunds cannot both pass it
             with transaction.atomic():
-                customer.balance += amount
-                customer.save()
-
-                Transactions.objects.create(
-                    customer_id=customer,
-                    type=Transactions.TYPE_DEPOSIT,
-                    amount=amount
-                )
-                
-                return True, f"Deposited ${amount}. New Balance: ${customer.balance}"
+                if order_id is not None:
+                    owner, refundable = ledger.refundable([order_id]).get(order_id, (None, None))
+                    if owner != customer_pk:
+                        return False, "Order not found for this customer."
+                    if amount > refundable:
+                        return False, f"Refund exceeds the refundable ${refundable} for this order."
+                _, balance = ledger.post(customer_pk, Transactions.TYPE_REFUND, amount, order_pk=order_id)
+            return True, f"Refunded ${amount}. New Balance: ${balance}"
         except Exception as e:
-            return False, f"Transaction failed: {str(e)}"
\ No newline at end of file
+            return False, f"Transaction failed: {str(e)}"
+
+    @classmethod
+    def process_bulk(cls, entries) -> Tuple[bool, str, Dict]:
+        """
+        Applies a batch of deposits and refunds, e.g. a promotion crediting
+        many accounts. Each entry is {customer_id, amount, type, order_id?}
+        and gets its own outcome; invalid entries are reported and skipped.
+        Customers are resolved once for the whole batch; valid entries are
+        written BULK_CHUNK_SIZE at a time, each chunk in one transaction
+        that re-reads its orders' refund caps under lock and posts through
+        ledger.post_many().
+        """
+        if not isinstance(entries, list) or not entries:
+            return (False, "Entries must be a non-empty list.", {})
+        if len(entries) > cls.MAX_BULK_ENTRIES:
+            return (False, f"At most {cls.MAX_BULK_ENTRIES} entries per request.", {})
+
+        results: List[Dict] = [{'index': index, 'success': False} for index in range(len(entries))]
+        parsed = []
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                results[index]['error'] = "Entry must be an object."
+                continue
+            entry_type = entry.get('type', Transactions.TYPE_DEPOSIT)
+            amount = cls._parse_amount(entry.get('amount'))
+            order_id = entry.get('order_id')
+            if entry_type not in cls.BULK_TYPES:
+                results[index]['error'] = f"Type must be one of: {', '.join(cls.BULK_TYPES)}."
+            elif amount is None:
+                results[index]['error'] = "Invalid amount."
+            elif amount <= 0:
+                results[index]['error'] = "Amount must be positive."
+            elif entry_type == Transactions.TYPE_DEPOSIT and amount >= cls.MAX_DEPOSIT:
+                results[index]['error'] = "Deposit limit exceeded."
+            elif order_id is not None and (entry_type != Transactions.TYPE_REFUND or not str(order_id).isdigit()):
+                results[index]['error'] = "order_id must be an order number on a refund."
+            else:
+                order_pk = int(order_id) if order_id is not None else None
+                parsed.append((index, entry.get('customer_id'), entry_type, amount, order_pk))
+
+        customers = resolve_customer_pks(customer_id for _, customer_id, _, _, _ in parsed)
+
+        valid = []
+        for index, customer_id, entry_type, amount, order_pk in parsed:
+            customer_pk = customers.get(str(customer_id)) if customer_id not in (None, '') else None
+            if customer_pk is None:
+                results[index]['error'] = f"Customer '{customer_id}' not found."
+                continue
+            valid.append((index, customer_pk, entry_type, amount, order_pk))
+
+        applied = 0
+        for start in range(0, len(valid), cls.BULK_CHUNK_SIZE):
+            chunk = valid[start:start + cls.BULK_CHUNK_SIZE]
+            try:
+                # Refund caps are read under the same lock the chunk is posted with, as in process_refund()
+                with transaction.atomic():
+                    caps = ledger.refundable({order_pk for *_, order_pk in chunk if order_pk is not None})
+                    accepted = []
+                    for index, customer_pk, entry_type, amount, order_pk in chunk:
+                        if order_pk is not None:
+                            owner, remaining = caps.get(order_pk, (None, None))
+                            if owner != customer_pk:
+                                results[index]['error'] = "Order not found for this customer."
+                                continue
+                            if amount > remaining:
+                                results[index]['error'] = f"Refund exceeds the refundable ${remaining} for this order."
+                                continue
+                            # Later entries in the chunk see this refund
+                            caps[order_pk] = (owner, remaining - amount)
+                        accepted.append((index, customer_pk, entry_type, amount, order_pk))
+                    created = ledger.post_many([row[1:] for row in accepted])
+            except DatabaseError as e:
+                for index, *_ in chunk:
+                    results[index]['error'] = f"Transaction failed: {str(e)}"
+                continue
+            for (index, customer_pk, entry_type, amount, _), entry in zip(accepted, created):
+                results[index].update(success=True, customer_id=customer_pk, type=entry_type,
+                                      amount=str(amount.quantize(ledger.CENT)), transaction_id=entry.pk)
+            applied += len(accepted)
+
+        failed = len(entries) - applied
+        data = {'applied': applied, 'failed': failed, 'results': results}
+        return (failed == 0, f"Applied {applied} of {len(entries)} entries.", data)
+
+    @staticmethod
+    def verify_balances(fix: bool = False) -> Tuple[bool, str, Dict]:
+        """
+        Recomputes every balance from its snapshot and the ledger entries
+        after it. With fix=True, drifted balances are reset to the ledger's.
+        """
+        mismatches = []
+        for customer_pk, stored, expected in ledger.verify():
+            mismatches.append({'customer_id': customer_pk, 'stored': stored, 'expected': expected})
+            if fix:
+                ledger.repair(customer_pk, stored, expected)
+
+        if not mismatches:
+            return (True, "All balances match the ledger.", {'mismatches': []})
+        action = "Repaired" if fix else "Found"
+        return (False, f"{action} {len(mismatches)} balances that disagree with the ledger.", {'mismatches': mismatches})
+
+    @staticmethod
+    def snapshot_balances() -> Tuple[bool, str, Dict]:
+        """Rolls the balance snapshots forward so later verifications read fewer entries."""
+        report = ledger.take_snapshots()
+        return (True, f"Snapshotted {report['snapshots']} balances through entry #{report['through_entry']}.", report)
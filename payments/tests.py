@@ -1,3 +1,207 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from accounts.models import Customer
+from accounts.services import customer_resolver
+from common.models import User
+from orders.models import Order
+from . import ledger
+from .models import BalanceSnapshot, Transactions
+from .services import PaymentService
+
+
+def run_parallel(*targets):
+    """Runs the callables in threads released together and returns their results."""
+    barrier = threading.Barrier(len(targets))
+    results = [None] * len(targets)
+
+    def worker(i):
+        try:
+            barrier.wait()
+            results[i] = targets[i]()
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(targets))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        customer_resolver.clear()
+        self.customer = Customer.objects.create(user=User.objects.create(username='alice'))
+
+    def balance(self):
+        return Customer.objects.values_list('balance', flat=True).get(pk=self.customer.pk)
+
+    def test_post_applies_signed_entries(self):
+        ledger.post(self.customer.pk, Transactions.TYPE_DEPOSIT, '30.00')
+        entry, balance = ledger.post(self.customer.pk, Transactions.TYPE_CHARGE, Decimal('12.50'), require_funds=True)
+
+        self.assertEqual(balance, Decimal('17.50'))
+        self.assertEqual(entry.signed_amount, Decimal('-12.50'))
+        self.assertEqual(self.balance(), Decimal('17.50'))
+
+    def test_post_rejects_overdraft_and_bad_input_without_writing(self):
+        with self.assertRaises(ledger.InsufficientFunds):
+            ledger.post(self.customer.pk, Transactions.TYPE_CHARGE, '1.00', require_funds=True)
+        with self.assertRaises(ValueError):
+            ledger.post(self.customer.pk, Transactions.TYPE_DEPOSIT, '0')
+        with self.assertRaises(Customer.DoesNotExist):
+            ledger.post(self.customer.pk + 1, Transactions.TYPE_DEPOSIT, '1.00')
+
+        self.assertEqual(self.balance(), Decimal('0'))
+        self.assertFalse(Transactions.objects.exists())
+
+    def test_verify_finds_and_repairs_drift(self):
+        ledger.post(self.customer.pk, Transactions.TYPE_DEPOSIT, '10.00')
+        self.assertEqual(list(ledger.verify()), [])
+
+        Customer.objects.filter(pk=self.customer.pk).update(balance=Decimal('99.00'))
+        success, _, data = PaymentService.verify_balances(fix=True)
+
+        self.assertFalse(success)
+        self.assertEqual(data['mismatches'], [
+            {'customer_id': self.customer.pk, 'stored': Decimal('99.00'), 'expected': Decimal('10.00')}
+        ])
+        self.assertEqual(self.balance(), Decimal('10.00'))
+        self.assertTrue(PaymentService.verify_balances()[0])
+
+    def test_snapshots_roll_forward_from_the_ledger_only(self):
+        ledger.post(self.customer.pk, Transactions.TYPE_DEPOSIT, '10.00')
+        entry, _ = ledger.post(self.customer.pk, Transactions.TYPE_CHARGE, '4.00')
+        Customer.objects.filter(pk=self.customer.pk).update(balance=Decimal('50.00'))  # drift
+
+        report = ledger.take_snapshots(lag=timedelta(0))
+
+        self.assertEqual(report, {'through_entry': entry.pk, 'snapshots': 1})
+        snapshot = BalanceSnapshot.objects.get(customer_id=self.customer)
+        self.assertEqual((snapshot.balance, snapshot.through_entry), (Decimal('6.00'), entry.pk))
+
+        # Later entries are added on top of the snapshot, and the drift is still reported
+        ledger.post(self.customer.pk, Transactions.TYPE_DEPOSIT, '1.00')
+        self.assertEqual(list(ledger.verify()), [(self.customer.pk, Decimal('51.00'), Decimal('7.00'))])
+        self.assertEqual(ledger.take_snapshots(lag=timedelta(hours=1))['snapshots'], 0)
+
+
+class RefundCapTests(TestCase):
+    def setUp(self):
+        customer_resolver.clear()
+        self.customer = Customer.objects.create(user=User.objects.create(username='alice'))
+        self.order = Order.objects.create(customer_id=self.customer, status=Order.STATUS_PAID, total=Decimal('15.00'))
+        ledger.post(self.customer.pk, Transactions.TYPE_DEPOSIT, '20.00')
+        ledger.post(self.customer.pk, Transactions.TYPE_CHARGE, '15.00', order_pk=self.order.pk)
+
+    def test_refunds_are_capped_at_the_charge(self):
+        self.assertTrue(PaymentService.process_refund('alice', '10.00', self.order.pk)[0])
+        success, msg = PaymentService.process_refund('alice', '5.01', self.order.pk)
+        self.assertFalse(success)
+        self.assertIn('$5.00', msg)
+        self.assertTrue(PaymentService.process_refund('alice', '5.00', str(self.order.pk))[0])
+        self.assertEqual(Customer.objects.get(pk=self.customer.pk).balance, Decimal('20.00'))
+
+    def test_refund_for_another_customers_order_is_rejected(self):
+        Customer.objects.create(user=User.objects.create(username='bob'))
+        self.assertEqual(PaymentService.process_refund('bob', '1.00', self.order.pk),
+                         (False, "Order not found for this customer."))
+
+    def test_malformed_order_id_is_a_bad_request(self):
+        response = self.client.post('/payments/transactions/refund/',
+                                    {'customer_id': 'alice', 'amount': '1.00', 'order_id': 'abc'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Invalid order_id.'})
+
+
+class ConcurrentRefundTests(TransactionTestCase):
+    THREADS = 6
+
+    def setUp(self):
+        customer_resolver.clear()
+        self.customer = Customer.objects.create(user=User.objects.create(username='alice'))
+        self.order = Order.objects.create(customer_id=self.customer, status=Order.STATUS_PAID, total=Decimal('10.00'))
+        ledger.post(self.customer.pk, Transactions.TYPE_DEPOSIT, '10.00')
+        ledger.post(self.customer.pk, Transactions.TYPE_CHARGE, '10.00', order_pk=self.order.pk)
+
+    def refunded(self):
+        return sum(Transactions.objects.filter(type=Transactions.TYPE_REFUND).values_list('amount', flat=True))
+
+    def test_parallel_refunds_never_exceed_the_charge(self):
+        results = run_parallel(*[
+            lambda: PaymentService.process_refund(self.customer.pk, '4.00', self.order.pk)
+        ] * self.THREADS)
+
+        self.assertEqual(sum(1 for success, _ in results if success), 2, results)
+        self.assertEqual(self.refunded(), Decimal('8.00'))
+        self.assertEqual(list(ledger.verify()), [])
+
+    def test_bulk_refunds_racing_single_refunds_never_exceed_the_charge(self):
+        entry = {'customer_id': 'alice', 'amount': '6.00', 'type': 'refund', 'order_id': self.order.pk}
+        results = run_parallel(
+            lambda: PaymentService.process_bulk([entry]),
+            lambda: PaymentService.process_bulk([entry]),
+            lambda: PaymentService.process_refund('alice', '6.00', self.order.pk),
+        )
+
+        self.assertEqual(sum(1 for result in results if result[0]), 1, results)
+        self.assertEqual(self.refunded(), Decimal('6.00'))
+        self.assertEqual(list(ledger.verify()), [])
+
+
+class BulkTests(TestCase):
+    def setUp(self):
+        customer_resolver.clear()
+        self.alice = Customer.objects.create(user=User.objects.create(username='alice'))
+        self.bob = Customer.objects.create(user=User.objects.create(username='bob'))
+        self.order = Order.objects.create(customer_id=self.alice, status=Order.STATUS_PAID, total=Decimal('15.00'))
+        ledger.post(self.alice.pk, Transactions.TYPE_DEPOSIT, '20.00')
+        ledger.post(self.alice.pk, Transactions.TYPE_CHARGE, '15.00', order_pk=self.order.pk)
+
+    def test_per_row_outcomes(self):
+        entries = [
+            {'customer_id': 'alice', 'amount': '5'},
+            {'customer_id': str(self.bob.pk), 'amount': '7.50', 'type': 'deposit'},
+            {'customer_id': 'nobody', 'amount': '1'},
+            {'customer_id': 'bob', 'amount': 'x'},
+            {'customer_id': 'bob', 'amount': '1', 'type': 'charge'},
+            {'customer_id': 'alice', 'amount': '10', 'type': 'refund', 'order_id': self.order.pk},
+            {'customer_id': 'alice', 'amount': '6', 'type': 'refund', 'order_id': self.order.pk},
+            {'customer_id': 'bob', 'amount': '1', 'type': 'refund', 'order_id': self.order.pk},
+            'junk',
+        ]
+        PaymentService.BULK_CHUNK_SIZE = 2
+        try:
+            success, msg, data = PaymentService.process_bulk(entries)
+        finally:
+            PaymentService.BULK_CHUNK_SIZE = 500
+
+        self.assertFalse(success)
+        self.assertEqual((data['applied'], data['failed']), (3, 6))
+        self.assertEqual([r['success'] for r in data['results']],
+                         [True, True, False, False, False, True, False, False, False])
+        self.assertEqual(data['results'][6]['error'], "Refund exceeds the refundable $5.00 for this order.")
+        self.assertEqual(data['results'][7]['error'], "Order not found for this customer.")
+        self.assertEqual(data['results'][1]['amount'], '7.50')
+        self.assertEqual(Customer.objects.get(pk=self.alice.pk).balance, Decimal('20.00'))
+        self.assertEqual(Customer.objects.get(pk=self.bob.pk).balance, Decimal('7.50'))
+        self.assertEqual(list(ledger.verify()), [])
+
+    def test_status_codes(self):
+        url = '/payments/transactions/bulk/'
+        good = {'customer_id': 'bob', 'amount': '10'}
+        bad = {'customer_id': 'nobody', 'amount': '1'}
+
+        response = self.client.post(url, {'entries': [good]}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['amount'], '10.00')
+        self.assertEqual(self.client.post(url, {'entries': [good, bad]}, content_type='application/json').status_code, 207)
+        self.assertEqual(self.client.post(url, {'entries': [bad]}, content_type='application/json').status_code, 422)
+        self.assertEqual(self.client.post(url, {'entries': 'x'}, content_type='application/json').status_code, 400)
@@ -3,8 +3,13 @@ from rest_framework.response import Response
 from .models import Transactions
 from .serializers import TransactionSerializer
 from .services import PaymentService
+from accounts.services import resolve_customer_pk
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Balance ledger. Entries are append-only and only written through the
+    deposit/refund actions (and checkout), never created or edited directly.
+    """
     queryset = Transactions.objects.all().order_by('-created_at')
     serializer_class = TransactionSerializer
     permission_classes = [permissions.AllowAny] # Open access for demo
@@ -14,10 +19,8 @@ class PaymentViewSet(viewsets.ModelViewSet):
         customer_param = self.request.query_params.get('customer_id')
         
         if customer_param:
-            if not customer_param.isdigit():
-                queryset = queryset.filter(customer_id__user__username=customer_param)
-            else:
-                queryset = queryset.filter(customer_id__pk=customer_param)
+            customer_pk = resolve_customer_pk(customer_param)
+            queryset = queryset.filter(customer_id=customer_pk) if customer_pk else queryset.none()
                 
         return queryset
 
@@ -33,4 +36,39 @@ class PaymentViewSet(viewsets.ModelViewSet):
         
         if success:
             return Response({'message': msg}, status=status.HTTP_200_OK)
-        return Response({'error': msg}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response({'error': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+    @decorators.action(detail=False, methods=['post'])
+    def refund(self, request):
+        customer_id = request.data.get('customer_id')
+        amount = request.data.get('amount')
+
+        if not customer_id or not amount:
+            return Response({'error': 'Missing customer_id or amount'}, status=status.HTTP_400_BAD_REQUEST)
+
+        success, msg = PaymentService.process_refund(customer_id, amount, request.data.get('order_id'))
+
+        if success:
+            return Response({'message': msg}, status=status.HTTP_200_OK)
+        return Response({'error': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+    @decorators.action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        POST {"entries": [{"customer_id", "amount", "type": "deposit"|"refund", "order_id"?}, ...]}
+        Returns one outcome per entry: 200 when all were applied, 207 when
+        only some were, 422 when none were.
+        """
+        entries = request.data.get('entries')
+        if not isinstance(entries, list) or not entries:
+            return Response({'error': 'entries must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+
+        success, msg, data = PaymentService.process_bulk(entries)
+
+        if success:
+            return Response({'message': msg, **data}, status=status.HTTP_200_OK)
+        if not data:
+            return Response({'error': msg}, status=status.HTTP_400_BAD_REQUEST)
+        if not data['applied']:
+            return Response({'error': msg, **data}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        return Response({'error': msg, **data}, status=status.HTTP_207_MULTI_STATUS)
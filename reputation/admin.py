@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import WarningLog,Feedback
+from .models import WarningLog,Feedback,DishRatingAggregate
 
 admin.site.register(WarningLog)
-admin.site.register(Feedback)
\ No newline at end of file
+admin.site.register(Feedback)
+admin.site.register(DishRatingAggregate)
\ No newline at end of file
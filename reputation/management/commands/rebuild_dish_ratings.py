@@ -0,0 +1,21 @@
+"""
+Backfills or repairs DishRatingAggregate from the FoodRating table.
+
+    python manage.py rebuild_dish_ratings            # every dish
+    python manage.py rebuild_dish_ratings --dish 12  # selected dishes
+"""
+
+from django.core.management.base import BaseCommand
+
+from reputation.services import ReputationService
+
+
+class Command(BaseCommand):
+    help = "Recompute per-dish rating aggregates from FoodRating."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dish', type=int, action='append', dest='dish_ids')
+
+    def handle(self, *args, **options):
+        written = ReputationService.rebuild_dish_rating_aggregates(options['dish_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregates for {written} dishes."))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0005_dish_picture_variants'),
+        ('reputation', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DishRatingAggregate',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('dish_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_aggregate', serialize=False, to='menu.dish')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total_stars', models.PositiveIntegerField(default=0)),
+                ('stars_1', models.PositiveIntegerField(default=0)),
+                ('stars_2', models.PositiveIntegerField(default=0)),
+                ('stars_3', models.PositiveIntegerField(default=0)),
+                ('stars_4', models.PositiveIntegerField(default=0)),
+                ('stars_5', models.PositiveIntegerField(default=0)),
+                ('recent_stars', models.JSONField(default=list)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0005_dish_picture_variants'),
+        ('reputation', '0002_dishratingaggregate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DishPopularity',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('dish_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='menu.dish')),
+                ('order_score', models.FloatField(default=0)),
+                ('rating_score', models.FloatField(default=0)),
+                ('score_ts', models.FloatField(default=0)),
+                ('orders_total', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
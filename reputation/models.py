@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Power
 from django.conf import settings
 from common.models import TimeStampedModel
 from accounts.models import Customer
@@ -69,6 +70,68 @@ class FoodRating(TimeStampedModel):
     order_id = models.ForeignKey(Order, on_delete=models.PROTECT, related_name="food_ratings")
     stars = models.PositiveSmallIntegerField()  # 1–5
 
+class DishRatingAggregate(TimeStampedModel):
+    """
+    Running FoodRating totals per dish, updated in the same transaction as
+    each rating insert (ReputationService.submit_food_rating). Rebuild with
+    `manage.py rebuild_dish_ratings`.
+    """
+    RECENT_WINDOW = 20
+
+    dish_id = models.OneToOneField(Dish, on_delete=models.CASCADE, primary_key=True, related_name="rating_aggregate")
+    count = models.PositiveIntegerField(default=0)
+    total_stars = models.PositiveIntegerField(default=0)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    recent_stars = models.JSONField(default=list)  # oldest first, at most RECENT_WINDOW
+
+    @property
+    def average(self):
+        return round(self.total_stars / self.count, 2) if self.count else None
+
+    @property
+    def histogram(self):
+        return {n: getattr(self, f'stars_{n}') for n in range(1, 6)}
+
+    @property
+    def recent_average(self):
+        return round(sum(self.recent_stars) / len(self.recent_stars), 2) if self.recent_stars else None
+
+class DishPopularity(TimeStampedModel):
+    """
+    Time-decayed popularity per dish for the "popular now" menu section.
+    Both scores are stored as of `score_ts` (unix seconds) and halve every
+    POPULARITY_HALF_LIFE_HOURS; rank_expression() decays them to "now" in SQL.
+    """
+    ORDER_WEIGHT = 1.0
+    RATING_WEIGHT = 0.5
+
+    dish_id = models.OneToOneField(Dish, on_delete=models.CASCADE, primary_key=True, related_name="popularity")
+    order_score = models.FloatField(default=0)   # decayed units ordered
+    rating_score = models.FloatField(default=0)  # decayed sum of (stars - 3)
+    score_ts = models.FloatField(default=0)
+    orders_total = models.PositiveIntegerField(default=0)
+
+    @staticmethod
+    def half_life_seconds():
+        return getattr(settings, 'POPULARITY_HALF_LIFE_HOURS', 72) * 3600
+
+    @classmethod
+    def rank_expression(cls, now_ts, prefix=''):
+        """Current decayed score, usable in annotate(); `prefix` walks from another model (e.g. 'popularity__')."""
+        raw = (
+            models.F(f'{prefix}order_score') * cls.ORDER_WEIGHT +
+            models.F(f'{prefix}rating_score') * cls.RATING_WEIGHT
+        )
+        decay = Power(
+            models.Value(2.0),
+            (models.F(f'{prefix}score_ts') - models.Value(now_ts)) / models.Value(float(cls.half_life_seconds()))
+        )
+        return models.ExpressionWrapper(raw * decay, output_field=models.FloatField())
+
 class DeliveryRating(TimeStampedModel):
     customer_id = models.ForeignKey(Customer, on_delete=models.PROTECT, related_name="delivery_ratings")
     driver_id = models.ForeignKey(Driver, on_delete=models.PROTECT, related_name="ratings")
@@ -1,14 +1,19 @@
+import time
 from typing import Tuple, Optional, Dict, List
 from django.db import transaction
-from django.db.models import F, Q
+from django.db.models import F, Q, Count, Sum
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
 
-from .models import FoodRating, Feedback 
+from .models import FoodRating, Feedback, DishRatingAggregate, DishPopularity
 from accounts.models import Customer
 from menu.models import Chef
 from delivery.models import Driver 
+from menu import cache as menu_cache
+from orders.models import OrderItem
+from payments import ledger
+from payments.models import Transactions
 
 User = get_user_model()
 
@@ -24,16 +29,111 @@ class ReputationService:
             stars = int(stars)
             if not (1 <= stars <= 5): return False, "Stars must be between 1 and 5"
 
-            FoodRating.objects.create(
-                customer_id_id=customer_id,
-                dish_id_id=dish_id,
-                order_id_id=order_id,
-                stars=stars
-            )
+            with transaction.atomic():
+                FoodRating.objects.create(
+                    customer_id_id=customer_id,
+                    dish_id_id=dish_id,
+                    order_id_id=order_id,
+                    stars=stars
+                )
+                ReputationService._record_dish_rating(dish_id, stars)
+                ReputationService._bump_popularity(dish_id, time.time(), rating=stars - 3)
             return True, "Rating submitted"
         except Exception as e:
             return False, f"Error: {str(e)}"
 
+    @staticmethod
+    def _record_dish_rating(dish_id, stars: int):
+        """Applies one new rating to the dish's running aggregate (row-locked)."""
+        aggregate, _ = DishRatingAggregate.objects.select_for_update().get_or_create(dish_id_id=dish_id)
+        field = f'stars_{stars}'
+        DishRatingAggregate.objects.filter(pk=aggregate.pk).update(**{
+            'count': F('count') + 1,
+            'total_stars': F('total_stars') + stars,
+            field: F(field) + 1,
+            'recent_stars': (aggregate.recent_stars + [stars])[-DishRatingAggregate.RECENT_WINDOW:],
+            'updated_at': timezone.now(),
+        })
+        # Served menus merge ratings in at read time (menu.cache)
+        menu_cache.bump_ratings_version_on_commit()
+
+    @staticmethod
+    def record_dish_orders(order) -> None:
+        """Feeds a checked-out order's items into the dishes' popularity scores."""
+        quantities = {}
+        for dish_id, quantity in OrderItem.objects.filter(order_id=order).values_list('dish_id', 'quantity'):
+            quantities[dish_id] = quantities.get(dish_id, 0) + quantity
+
+        now_ts = time.time()
+        with transaction.atomic():
+            for dish_id, quantity in quantities.items():
+                ReputationService._bump_popularity(dish_id, now_ts, orders=quantity)
+
+    @staticmethod
+    def _bump_popularity(dish_id, now_ts: float, orders: int = 0, rating: float = 0.0):
+        """Decays a dish's stored scores to now_ts and adds the new contribution (row-locked)."""
+        row, _ = DishPopularity.objects.select_for_update().get_or_create(dish_id_id=dish_id)
+        decay = 0.0
+        if row.score_ts:
+            decay = min(1.0, 2 ** ((row.score_ts - now_ts) / DishPopularity.half_life_seconds()))
+        DishPopularity.objects.filter(pk=row.pk).update(
+            order_score=row.order_score * decay + orders,
+            rating_score=row.rating_score * decay + rating,
+            score_ts=now_ts,
+            orders_total=F('orders_total') + orders,
+            updated_at=timezone.now(),
+        )
+
+    @staticmethod
+    def rebuild_dish_rating_aggregates(dish_ids=None) -> int:
+        """
+        Recomputes DishRatingAggregate rows from FoodRating (backfill/repair).
+        Returns the number of dishes written.
+        """
+        ratings = FoodRating.objects.all()
+        if dish_ids is not None:
+            ratings = ratings.filter(dish_id__in=dish_ids)
+
+        totals = ratings.values('dish_id').annotate(
+            count=Count('id'),
+            total_stars=Sum('stars'),
+            **{f'stars_{n}': Count('id', filter=Q(stars=n)) for n in range(1, 6)}
+        )
+
+        recent = {}
+        window = DishRatingAggregate.RECENT_WINDOW
+        for dish_id, stars in ratings.order_by('dish_id', '-created_at', '-id').values_list('dish_id', 'stars').iterator(chunk_size=2000):
+            bucket = recent.setdefault(dish_id, [])
+            if len(bucket) < window:
+                bucket.append(stars)
+
+        aggregates = [
+            DishRatingAggregate(
+                dish_id_id=row['dish_id'],
+                count=row['count'],
+                total_stars=row['total_stars'],
+                recent_stars=recent.get(row['dish_id'], [])[::-1],
+                **{f'stars_{n}': row[f'stars_{n}'] for n in range(1, 6)}
+            )
+            for row in totals
+        ]
+
+        with transaction.atomic():
+            stale = DishRatingAggregate.objects.all()
+            if dish_ids is not None:
+                stale = stale.filter(dish_id__in=dish_ids)
+            stale.exclude(dish_id__in=[a.dish_id_id for a in aggregates]).delete()
+            DishRatingAggregate.objects.bulk_create(
+                aggregates,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['dish_id'],
+                update_fields=['count', 'total_stars', 'stars_1', 'stars_2', 'stars_3',
+                               'stars_4', 'stars_5', 'recent_stars', 'updated_at'],
+            )
+            menu_cache.bump_ratings_version_on_commit()
+        return len(aggregates)
+
     @staticmethod
     def file_feedback(filer_id, target_type, target_id, message, category: str):
         """
@@ -219,13 +319,14 @@ class ReputationService:
             user_to_kick = Customer.objects.get(pk=customer_id)
             
             user_to_kick.is_blacklisted = True
-            
-            user_to_kick.balance = 0 
-            
 
             user_to_kick.status = Customer.STATUS_DEACTIVATED 
-            
-            user_to_kick.save()
+
+            with transaction.atomic():
+                user_to_kick.save()
+                # The remaining balance is forfeited through the ledger, which owns Customer.balance
+                if user_to_kick.balance > 0:
+                    ledger.post(user_to_kick.pk, Transactions.TYPE_CHARGE, user_to_kick.balance)
             return True, "Customer kicked out and blacklisted."
             
         except Customer.DoesNotExist:
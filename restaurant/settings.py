@@ -44,10 +44,12 @@ INSTALLED_APPS = [
     'delivery',
     'forms',
     'hr',
+    'kitchen',
     'menu',
     'orders',
     'payments',
     'reputation',
+    'sales',
 ]
 
 AUTH_USER_MODEL = 'common.User'
@@ -89,9 +91,66 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Every transaction (not only checkout) starts with BEGIN IMMEDIATE.
+        # SQLite cannot upgrade a read transaction to a write one after another
+        # connection wrote; it fails with "database is locked" at once instead of
+        # waiting. Taking the write lock at BEGIN makes concurrent writers
+        # (checkouts, deposits, refunds, cart flushes, projections) queue on the
+        # busy timeout instead. It also makes each atomic() block a critical
+        # section, which the ledger and checkout rely on for
+        # read-then-write checks such as refund caps. The cost: any atomic()
+        # block, even a read-only one, holds the single write lock until it
+        # ends, so keep them short. Autocommit reads are unaffected.
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # File-backed so the checkout concurrency tests can use real threads
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    }
+}
+
+
+# Caches
+# Menu snapshots (menu/cache.py) are versioned through this cache. LocMem keeps
+# one version per process, which is only correct with a single worker: with
+# several, use a shared backend (Redis/Memcached) so they agree on the version.
+# `manage.py check --deploy` fails on LocMem (menu.E001); silence that check
+# for single-process deployments.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+MENU_CACHE_TIMEOUT = 300
+SAFE_MENU_CACHE_TIMEOUT = 3600
+
+# Pending carts (orders/cart.py) are cached and written to the DB behind the
+# request. None keeps carts in a per-process LRU; name a shared alias from
+# CACHES to let workers read the same carts. Either way a flush only writes the
+# lines its cart changed, so workers editing one cart at once lose nothing but
+# a simultaneous edit of the same line (last write wins for that line).
+CART_CACHE_ALIAS = None
+CART_CACHE_MAX_ENTRIES = 10000
+
+# Abandoned-cart reaper (orders/reaper.py): pending carts idle this long are
+# deleted, or cancelled with their items kept when CART_REAPER_ARCHIVE is set.
+# A sweep is queued at most once per CART_REAPER_INTERVAL seconds.
+CART_ABANDON_TTL_HOURS = 72
+CART_REAPER_CHUNK_SIZE = 500
+CART_REAPER_ARCHIVE = False
+CART_REAPER_INTERVAL = 3600
+
+# username/pk -> customer pk lookups (accounts/services.py CustomerResolver)
+CUSTOMER_RESOLVER_CACHE_SIZE = 4096
+
+# "Popular now" scores (reputation.DishPopularity) halve over this period
+POPULARITY_HALF_LIFE_HOURS = 72
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -129,6 +188,15 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+
+# Background jobs (common/tasks.py)
+
+BACKGROUND_WORKERS = 4
+BACKGROUND_TASKS_EAGER = False
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -21,10 +21,12 @@ urlpatterns = [
     path('ai_assist/', include('ai_assist.urls')),
     path('delivery/', include('delivery.urls')),
     path('hr/', include('hr.urls')),
+    path('kitchen/', include('kitchen.urls')),
     path('menu/', include('menu.urls')),
     path('orders/', include('orders.urls')),
     path('payments/', include('payments.urls')),
     path('reputation/', include('reputation.urls')),
+    path('sales/', include('sales.urls')),
     path("ai/chat/", ai_chat_redirect, name="ai_chat"),
     path("discussion/", discussion_redirect, name="discussion"),
     path('allergy/', allergy_redirect, name="allergy"),
@@ -0,0 +1,5 @@
+from django.contrib import admin
+from .models import DailySales, DailyDishSales
+
+admin.site.register(DailySales)
+admin.site.register(DailyDishSales)
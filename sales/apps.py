@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class SalesConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'sales'
+
+    def ready(self):
+        from . import projections  # noqa: F401
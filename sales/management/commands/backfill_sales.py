@@ -0,0 +1,33 @@
+"""
+Rebuilds the daily sales rollups from order history, several day windows
+in parallel. Days in the range are replaced, so it is safe to re-run.
+
+    python manage.py backfill_sales                                  # first order .. today
+    python manage.py backfill_sales --start 2025-01-01 --end 2025-03-31 --chunk-days 7 --workers 4
+"""
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.services import SalesService
+
+
+class Command(BaseCommand):
+    help = "Recompute DailySales/DailyDishSales from Order and OrderItem history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat)
+        parser.add_argument('--end', type=date.fromisoformat)
+        parser.add_argument('--chunk-days', type=int, dest='chunk_days')
+        parser.add_argument('--workers', type=int)
+
+    def handle(self, *args, **options):
+        success, msg, data = SalesService.backfill(
+            options['start'], options['end'], options['chunk_days'], options['workers']
+        )
+        if not success:
+            raise CommandError(msg)
+        self.stdout.write(self.style.SUCCESS(
+            f"{msg} {data['orders']} orders, {data['rows']} rows, {data['chunks']} chunks."
+        ))
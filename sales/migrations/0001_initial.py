@@ -0,0 +1,53 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('menu', '0005_dish_picture_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('day', models.DateField()),
+                ('stage', models.CharField(choices=[('paid', 'Paid'), ('completed', 'Completed')], max_length=20)),
+                ('tier', models.CharField(choices=[('registered', 'Registered'), ('vip', 'VIP')], max_length=20)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('discount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('stage', 'day', 'tier'), name='unique_daily_sales')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyDishSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('day', models.DateField()),
+                ('stage', models.CharField(choices=[('paid', 'Paid'), ('completed', 'Completed')], max_length=20)),
+                ('tier', models.CharField(choices=[('registered', 'Registered'), ('vip', 'VIP')], max_length=20)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('chef_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='menu.chef')),
+                ('dish_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='menu.dish')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('stage', 'day', 'tier', 'dish_id', 'chef_id'), name='unique_daily_dish_sales')],
+            },
+        ),
+    ]
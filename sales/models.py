@@ -0,0 +1,62 @@
+from django.db import models
+from accounts.models import Customer
+from common.models import TimeStampedModel
+from menu.models import Chef, Dish
+from orders.models import Order
+
+
+class DailySales(TimeStampedModel):
+    """
+    Orders and revenue per day, stage and customer tier. Maintained by the
+    sales projections as orders become paid/completed, and rebuilt per day
+    by `manage.py backfill_sales`.
+    """
+    STAGE_PAID = Order.STATUS_PAID
+    STAGE_COMPLETED = Order.STATUS_COMPLETED
+    STAGE_CHOICES = [
+        (STAGE_PAID, "Paid"),
+        (STAGE_COMPLETED, "Completed"),
+    ]
+
+    day = models.DateField()
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES)
+    # Customer tier at checkout (Order.vip_discount_applied)
+    tier = models.CharField(max_length=20, choices=Customer.STATUS_CHOICES)
+    orders = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    discount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Order totals: subtotal - discount + delivery fees
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index for (stage, day range) report queries
+            models.UniqueConstraint(fields=['stage', 'day', 'tier'], name='unique_daily_sales'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.stage}/{self.tier}: {self.orders} orders, ${self.revenue}"
+
+
+class DailyDishSales(TimeStampedModel):
+    """
+    Units and item revenue (before discount) per day, stage, tier and dish.
+    The dish's chef is recorded with the sale, so per-chef reports are a
+    GROUP BY over this table.
+    """
+    day = models.DateField()
+    stage = models.CharField(max_length=20, choices=DailySales.STAGE_CHOICES)
+    tier = models.CharField(max_length=20, choices=Customer.STATUS_CHOICES)
+    dish_id = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name='daily_sales')
+    chef_id = models.ForeignKey(Chef, on_delete=models.CASCADE, related_name='daily_sales')
+    orders = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['stage', 'day', 'tier', 'dish_id', 'chef_id'], name='unique_daily_dish_sales'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.stage}/{self.tier} dish {self.dish_id_id}: {self.quantity} sold, ${self.revenue}"
@@ -0,0 +1,12 @@
+"""Adds paid and completed orders to the daily sales rollups (see orders/lifecycle.py)."""
+
+from orders.lifecycle import projection
+from orders.models import Order
+from .services import SalesService
+
+
+@projection(Order.STATUS_PAID, Order.STATUS_COMPLETED)
+def daily_sales(event):
+    # The increments are not idempotent by themselves; dispatch() commits them
+    # together with this projection's checkpoint, so each event counts once
+    SalesService.record_event(event)
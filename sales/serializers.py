@@ -0,0 +1,9 @@
+from rest_framework import serializers
+from .models import DailySales
+
+
+class DailySalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailySales
+        fields = ['id', 'day', 'stage', 'tier', 'orders', 'subtotal', 'discount', 'revenue']
+        read_only_fields = fields
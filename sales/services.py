@@ -0,0 +1,245 @@
+"""
+Sales Services - daily revenue rollups for the manager.
+
+DailySales (per day, stage and tier) and DailyDishSales (per day, stage,
+tier, dish and chef) are maintained incrementally: when an order becomes
+paid or completed, the projection adds it to that day's rows with F()
+increments. backfill() rebuilds whole days from Order/OrderItem history
+instead, splitting the range into day windows that worker threads
+rebuild in parallel (each window is replaced in one transaction, so
+windows never contend for the same rows). Reports only read the rollups.
+"""
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, F, Min, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from accounts.models import Customer
+from orders.models import Order, OrderEvent, OrderItem
+from orders.totals import CENT, line_total
+from .models import DailySales, DailyDishSales
+
+# Statuses an order can be in once it has passed through each stage
+STAGE_STATUSES = {
+    DailySales.STAGE_PAID: [Order.STATUS_PAID, Order.STATUS_ASSIGNED, Order.STATUS_DELIVERING, Order.STATUS_COMPLETED],
+    DailySales.STAGE_COMPLETED: [Order.STATUS_COMPLETED],
+}
+
+
+class SalesService:
+    REPORT_GROUPS = ('day', 'tier', 'dish', 'chef')
+    DEFAULT_REPORT_DAYS = 30
+    BACKFILL_CHUNK_DAYS = 7
+    BACKFILL_WORKERS = 4
+
+    # =========================================================================
+    #  Incremental maintenance
+    # =========================================================================
+
+    @staticmethod
+    def tier_for(order: Order) -> str:
+        return Customer.STATUS_VIP if order.vip_discount_applied else Customer.STATUS_REGISTERED
+
+    @classmethod
+    def record_event(cls, event: OrderEvent) -> None:
+        """
+        Adds the event's order to the rollups for its stage and day. Each call
+        adds again: run it through the daily_sales projection, whose
+        checkpoint applies it once per event.
+        """
+        cls.record_order(event.order_id, event.to_status, timezone.localdate(event.created_at))
+
+    @classmethod
+    def record_order(cls, order: Order, stage: str, day: date) -> None:
+        tier = cls.tier_for(order)
+        dishes = defaultdict(lambda: [0, Decimal('0')])
+        rows = OrderItem.objects.filter(order_id=order).values_list('dish_id', 'dish_id__chef_id', 'quantity', 'unit_price')
+        for dish_id, chef_id, quantity, unit_price in rows:
+            dishes[dish_id, chef_id][0] += quantity
+            dishes[dish_id, chef_id][1] += line_total(unit_price, quantity)
+
+        with transaction.atomic():
+            cls._add(DailySales, {'stage': stage, 'day': day, 'tier': tier},
+                     orders=1, subtotal=order.subtotal, discount=order.discount_amount, revenue=order.total)
+            for (dish_id, chef_id), (quantity, revenue) in dishes.items():
+                cls._add(DailyDishSales,
+                         {'stage': stage, 'day': day, 'tier': tier, 'dish_id_id': dish_id, 'chef_id_id': chef_id},
+                         orders=1, quantity=quantity, revenue=revenue)
+
+    @staticmethod
+    def _add(model, key: Dict, **amounts) -> None:
+        """Increments the rollup row for `key`, creating it on first use."""
+        increments = {field: F(field) + value for field, value in amounts.items()}
+        if model.objects.filter(**key).update(**increments, updated_at=timezone.now()):
+            return
+        try:
+            with transaction.atomic():
+                model.objects.create(**key, **amounts)
+        except IntegrityError:
+            # Another worker created the row first
+            model.objects.filter(**key).update(**increments, updated_at=timezone.now())
+
+    # =========================================================================
+    #  Backfill
+    # =========================================================================
+
+    @staticmethod
+    def _stage_orders(stage: str, first: date, last: date):
+        """Orders that reached `stage` on a day in [first, last], annotated with sale_day and tier."""
+        reached_at = Subquery(
+            OrderEvent.objects.filter(order_id=OuterRef('pk'), to_status=stage)
+            .order_by('created_at').values('created_at')[:1]
+        )
+        # Orders from before the event log fall back to their own timestamps
+        fallback = 'created_at' if stage == DailySales.STAGE_PAID else 'updated_at'
+        return (Order.objects
+                .filter(status__in=STAGE_STATUSES[stage])
+                .annotate(sale_day=TruncDate(Coalesce(reached_at, fallback)))
+                .filter(sale_day__range=(first, last))
+                .annotate(tier=Case(When(vip_discount_applied=True, then=Value(Customer.STATUS_VIP)),
+                                    default=Value(Customer.STATUS_REGISTERED))))
+
+    @classmethod
+    def rebuild_days(cls, first: date, last: date) -> Dict:
+        """Recomputes every rollup row for days [first, last] from order history."""
+        sales, dish_sales = [], []
+        order_count = 0
+        for stage in STAGE_STATUSES:
+            orders = cls._stage_orders(stage, first, last)
+            keys = {}
+            by_tier = defaultdict(lambda: [0, Decimal('0'), Decimal('0'), Decimal('0')])
+            rows = orders.values_list('pk', 'sale_day', 'tier', 'subtotal', 'discount_amount', 'total')
+            for pk, day, tier, subtotal, discount, total in rows.iterator(chunk_size=2000):
+                keys[pk] = (day, tier)
+                bucket = by_tier[day, tier]
+                bucket[0] += 1
+                bucket[1] += subtotal
+                bucket[2] += discount
+                bucket[3] += total
+            order_count += len(keys)
+
+            by_dish = defaultdict(lambda: [0, 0, Decimal('0')])
+            items = OrderItem.objects.filter(order_id__in=orders.values('pk')).values_list(
+                'order_id', 'dish_id', 'dish_id__chef_id', 'quantity', 'unit_price'
+            )
+            for order_id, dish_id, chef_id, quantity, unit_price in items.iterator(chunk_size=2000):
+                if order_id not in keys:
+                    continue  # reached the stage after the orders were read
+                bucket = by_dish[keys[order_id] + (dish_id, chef_id)]
+                bucket[0] += 1
+                bucket[1] += quantity
+                bucket[2] += line_total(unit_price, quantity)
+
+            sales += [
+                DailySales(stage=stage, day=day, tier=tier, orders=n, subtotal=subtotal.quantize(CENT),
+                           discount=discount.quantize(CENT), revenue=revenue.quantize(CENT))
+                for (day, tier), (n, subtotal, discount, revenue) in by_tier.items()
+            ]
+            dish_sales += [
+                DailyDishSales(stage=stage, day=day, tier=tier, dish_id_id=dish_id, chef_id_id=chef_id,
+                               orders=n, quantity=quantity, revenue=revenue.quantize(CENT))
+                for (day, tier, dish_id, chef_id), (n, quantity, revenue) in by_dish.items()
+            ]
+
+        with transaction.atomic():
+            DailySales.objects.filter(day__range=(first, last)).delete()
+            DailyDishSales.objects.filter(day__range=(first, last)).delete()
+            DailySales.objects.bulk_create(sales)
+            DailyDishSales.objects.bulk_create(dish_sales)
+        return {'orders': order_count, 'rows': len(sales) + len(dish_sales)}
+
+    @classmethod
+    def _rebuild_window(cls, window) -> Dict:
+        try:
+            return cls.rebuild_days(*window)
+        finally:
+            # Worker threads hold their own DB connection
+            connection.close()
+
+    @classmethod
+    def backfill(cls, first: Optional[date] = None, last: Optional[date] = None,
+                 chunk_days: Optional[int] = None, workers: Optional[int] = None) -> Tuple[bool, str, Dict]:
+        """
+        Rebuilds the rollups for [first, last] (default: first order to today)
+        in windows of `chunk_days`, `workers` windows at a time. Days are
+        replaced wholesale, so prefer closed days while orders are coming in.
+        """
+        if first is None:
+            first_order = Order.objects.aggregate(first=Min('created_at'))['first']
+            first = timezone.localdate(first_order) if first_order else timezone.localdate()
+        last = last or timezone.localdate()
+        if first > last:
+            return (False, "Start date is after end date.", {})
+        chunk_days = max(1, chunk_days or cls.BACKFILL_CHUNK_DAYS)
+
+        windows = []
+        start = first
+        while start <= last:
+            end = min(start + timedelta(days=chunk_days - 1), last)
+            windows.append((start, end))
+            start = end + timedelta(days=1)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers or cls.BACKFILL_WORKERS)) as pool:
+            results = list(pool.map(cls._rebuild_window, windows))
+
+        data = {
+            'days': (last - first).days + 1,
+            'chunks': len(windows),
+            'orders': sum(r['orders'] for r in results),
+            'rows': sum(r['rows'] for r in results),
+        }
+        return (True, f"Rebuilt sales rollups for {data['days']} days.", data)
+
+    # =========================================================================
+    #  Reporting
+    # =========================================================================
+
+    @classmethod
+    def report(cls, start=None, end=None, group_by: str = 'day',
+               stage: str = DailySales.STAGE_PAID) -> Tuple[bool, str, Dict]:
+        """
+        Revenue for a date range, grouped by day, tier, dish or chef.
+        Reads only the rollup tables.
+        """
+        try:
+            end = date.fromisoformat(end) if end else timezone.localdate()
+            start = date.fromisoformat(start) if start else end - timedelta(days=cls.DEFAULT_REPORT_DAYS - 1)
+        except (TypeError, ValueError):
+            return (False, "Dates must be YYYY-MM-DD.", {})
+        if start > end:
+            return (False, "Start date is after end date.", {})
+        if group_by not in cls.REPORT_GROUPS:
+            return (False, f"group_by must be one of: {', '.join(cls.REPORT_GROUPS)}.", {})
+        if stage not in STAGE_STATUSES:
+            return (False, f"stage must be one of: {', '.join(STAGE_STATUSES)}.", {})
+
+        sales = DailySales.objects.filter(stage=stage, day__range=(start, end))
+        totals = sales.aggregate(orders=Sum('orders'), subtotal=Sum('subtotal'),
+                                 discount=Sum('discount'), revenue=Sum('revenue'))
+
+        if group_by in ('day', 'tier'):
+            rows = sales.values(group_by).annotate(
+                sum_orders=Sum('orders'), sum_subtotal=Sum('subtotal'), sum_discount=Sum('discount'), sum_revenue=Sum('revenue')
+            ).order_by(group_by)
+            rows = [{group_by: row[group_by], 'orders': row['sum_orders'], 'subtotal': row['sum_subtotal'],
+                     'discount': row['sum_discount'], 'revenue': row['sum_revenue']} for row in rows]
+        else:
+            key, name = ('dish_id', 'dish_id__name') if group_by == 'dish' else ('chef_id', 'chef_id__name')
+            rows = DailyDishSales.objects.filter(stage=stage, day__range=(start, end)).values(key, name).annotate(
+                sum_orders=Sum('orders'), sum_quantity=Sum('quantity'), sum_revenue=Sum('revenue')
+            ).order_by('-sum_revenue', key)
+            rows = [{key: row[key], 'name': row[name], 'orders': row['sum_orders'], 'quantity': row['sum_quantity'],
+                     'revenue': row['sum_revenue']} for row in rows]
+
+        return (True, "Sales report.", {
+            'start': start, 'end': end, 'stage': stage, 'group_by': group_by,
+            'totals': {field: value or 0 for field, value in totals.items()},
+            'rows': rows,
+        })
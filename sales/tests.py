@@ -0,0 +1,93 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import Customer
+from common.models import User
+from menu.models import Chef, Dish
+from orders import lifecycle
+from orders.models import Order, OrderItem
+from .models import DailySales, DailyDishSales
+from .services import SalesService
+
+
+class SalesTests(TestCase):
+    def setUp(self):
+        self.chef = Chef.objects.create(user=User.objects.create(username='chef'), name='Chef')
+        self.soup = Dish.objects.create(chef=self.chef, name='Soup', price=Decimal('4.00'))
+        self.stew = Dish.objects.create(chef=self.chef, name='Stew', price=Decimal('6.00'))
+        self.customer = Customer.objects.create(user=User.objects.create(username='alice'))
+        self.today = timezone.localdate()
+
+    def paid_order(self, vip=False):
+        order = Order.objects.create(
+            customer_id=self.customer, subtotal=Decimal('14.00'), discount_amount=Decimal('0.70') if vip else 0,
+            total=Decimal('13.30') if vip else Decimal('14.00'), vip_discount_applied=vip,
+        )
+        OrderItem.objects.create(order_id=order, dish_id=self.soup, quantity=2, unit_price=Decimal('4.00'))
+        OrderItem.objects.create(order_id=order, dish_id=self.stew, quantity=1, unit_price=Decimal('6.00'))
+        event = lifecycle.transition(order.pk, Order.STATUS_PAID)
+        lifecycle.dispatch(event.pk)
+        return order, event
+
+    def rows(self):
+        return (
+            sorted(DailySales.objects.values_list('stage', 'day', 'tier', 'orders', 'subtotal', 'discount', 'revenue')),
+            sorted(DailyDishSales.objects.values_list('stage', 'day', 'tier', 'dish_id', 'orders', 'quantity', 'revenue')),
+        )
+
+    def test_record_order_adds_order_and_dish_totals(self):
+        self.paid_order()
+        self.paid_order(vip=True)
+
+        sales, dish_sales = self.rows()
+        self.assertEqual(sales, [
+            ('paid', self.today, 'registered', 1, Decimal('14.00'), Decimal('0.00'), Decimal('14.00')),
+            ('paid', self.today, 'vip', 1, Decimal('14.00'), Decimal('0.70'), Decimal('13.30')),
+        ])
+        self.assertIn(('paid', self.today, 'vip', self.soup.pk, 1, 2, Decimal('8.00')), dish_sales)
+
+    def test_redispatching_an_event_does_not_double_count(self):
+        _, event = self.paid_order()
+        lifecycle.dispatch(event.pk)
+
+        self.assertEqual(DailySales.objects.get().orders, 1)
+        self.assertEqual(DailyDishSales.objects.get(dish_id=self.soup).quantity, 2)
+
+    def test_rebuild_days_matches_the_incremental_rollups(self):
+        self.paid_order()
+        self.paid_order(vip=True)
+        incremental = self.rows()
+        DailySales.objects.all().delete()
+        DailyDishSales.objects.all().delete()
+
+        result = SalesService.rebuild_days(self.today - timedelta(days=1), self.today)
+
+        self.assertEqual(result, {'orders': 2, 'rows': 2 + 4})
+        self.assertEqual(self.rows(), incremental)
+
+    def test_report_groups_and_validates(self):
+        self.paid_order()
+        self.paid_order(vip=True)
+
+        success, _, data = SalesService.report(group_by='tier')
+        self.assertTrue(success)
+        self.assertEqual(data['totals']['orders'], 2)
+        self.assertEqual(data['totals']['revenue'], Decimal('27.30'))
+        self.assertEqual([(row['tier'], row['orders']) for row in data['rows']], [('registered', 1), ('vip', 1)])
+
+        success, _, data = SalesService.report(group_by='dish')
+        self.assertEqual([(row['name'], row['quantity'], row['revenue']) for row in data['rows']],
+                         [('Soup', 4, Decimal('16.00')), ('Stew', 2, Decimal('12.00'))])
+
+        self.assertFalse(SalesService.report(start='notadate')[0])
+        self.assertFalse(SalesService.report(group_by='week')[0])
+        self.assertFalse(SalesService.report(start='2026-02-01', end='2026-01-01')[0])
+
+    def test_bad_dates_are_bad_requests(self):
+        self.assertEqual(self.client.get('/sales/daily/?start=notadate').status_code, 400)
+        self.assertEqual(self.client.get('/sales/daily/?end=2026-13-01').status_code, 400)
+        self.assertEqual(self.client.get('/sales/daily/report/?start=notadate').status_code, 400)
+        self.assertEqual(self.client.get(f'/sales/daily/?start={self.today}&end={self.today}').status_code, 200)
@@ -0,0 +1,46 @@
+from datetime import date
+
+from rest_framework import viewsets, status, permissions, decorators
+from rest_framework.exceptions import ParseError
+from rest_framework.response import Response
+from .models import DailySales
+from .serializers import DailySalesSerializer
+from .services import SalesService
+
+
+class DailySalesViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Manager sales reporting, served from the daily rollup tables.
+    """
+    queryset = DailySales.objects.order_by('-day', 'stage', 'tier')
+    serializer_class = DailySalesSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        """Allow filtering rollup rows by stage and day range (?start=&end=)"""
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        if params.get('stage'):
+            queryset = queryset.filter(stage=params['stage'])
+        try:
+            if params.get('start'):
+                queryset = queryset.filter(day__gte=date.fromisoformat(params['start']))
+            if params.get('end'):
+                queryset = queryset.filter(day__lte=date.fromisoformat(params['end']))
+        except ValueError:
+            raise ParseError('start and end must be YYYY-MM-DD')
+        return queryset
+
+    @decorators.action(detail=False, methods=['get'])
+    def report(self, request):
+        """
+        GET: Revenue for a date range.
+        ?start=YYYY-MM-DD&end=YYYY-MM-DD&group_by=day|tier|dish|chef&stage=paid|completed
+        """
+        params = request.query_params
+        success, msg, data = SalesService.report(
+            params.get('start'), params.get('end'), params.get('group_by', 'day'), params.get('stage', 'paid')
+        )
+        if not success:
+            return Response({'error': msg}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data, status=status.HTTP_200_OK)